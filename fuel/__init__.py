@@ -1,15 +1,30 @@
 import os.path
-from pkg_resources import get_distribution, DistributionNotFound
+import sys
 
 from fuel.config_parser import config  # noqa
 
-try:
-    DIST = get_distribution('fuel')
-    DIST_LOC = os.path.normcase(DIST.location)
-    HERE = os.path.normcase(__file__)
-    if not HERE.startswith(os.path.join(DIST_LOC, 'fuel')):
-        raise DistributionNotFound
-except DistributionNotFound:
-    __version__ = 'not installed'
+
+def _get_version():
+    from pkg_resources import get_distribution, DistributionNotFound
+    try:
+        dist = get_distribution('fuel')
+        dist_loc = os.path.normcase(dist.location)
+        here = os.path.normcase(__file__)
+        if not here.startswith(os.path.join(dist_loc, 'fuel')):
+            raise DistributionNotFound
+    except DistributionNotFound:
+        return 'not installed'
+    return dist.version
+
+
+if sys.version_info >= (3, 7):
+    # Importing pkg_resources takes longer than importing the rest of
+    # Fuel, so the version is only looked up when it is accessed
+    def __getattr__(name):
+        if name == '__version__':
+            globals()['__version__'] = _get_version()
+            return globals()['__version__']
+        raise AttributeError("module 'fuel' has no attribute '{}'"
+                             .format(name))
 else:
-    __version__ = DIST.version
+    __version__ = _get_version()
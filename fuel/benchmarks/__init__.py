@@ -0,0 +1,6 @@
+"""Benchmarks for Fuel data pipelines.
+
+Every benchmark submodule can be run as a script (e.g. ``python -m
+fuel.benchmarks.fusion``) and prints its results.
+
+"""
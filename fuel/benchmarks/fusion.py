@@ -0,0 +1,82 @@
+"""Benchmark the fusion of sourcewise transformers.
+
+Compares a ``Cast`` -> ``ScaleAndShift`` -> ``ForceFloatX`` -> ``Flatten``
+chain on CIFAR-sized batches with the same chain collapsed by
+:func:`~fuel.transformers.fuse`, reporting the time and the peak memory
+allocated per batch.
+
+"""
+from __future__ import print_function
+import timeit
+
+import numpy
+
+from fuel.datasets import IndexableDataset
+from fuel.schemes import SequentialScheme
+from fuel.streams import DataStream
+from fuel.transformers import Cast, Flatten, ForceFloatX, ScaleAndShift, fuse
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def cifar_stream(num_batches=20, batch_size=128):
+    """A stream of CIFAR-sized batches of random uint8 images."""
+    rng = numpy.random.RandomState(1)
+    features = rng.randint(256, size=(num_batches * batch_size, 3, 32, 32))
+    dataset = IndexableDataset({'features': features.astype('uint8')})
+    return DataStream(dataset, iteration_scheme=SequentialScheme(
+        dataset.num_examples, batch_size))
+
+
+def standard_chain(stream):
+    """The chain of elementwise transformers being benchmarked."""
+    return Flatten(ForceFloatX(ScaleAndShift(
+        Cast(stream, 'floatX'), 1 / 255., -0.5)))
+
+
+def peak_allocation(stream):
+    """Returns the peak memory allocated while reading a batch."""
+    if tracemalloc is None:
+        return float('nan')
+    iterator = stream.get_epoch_iterator()
+    tracemalloc.start()
+    next(iterator)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def time_epoch(stream, repeat=5):
+    """Returns the time it takes to read a batch, in seconds."""
+    num_batches = sum(1 for _ in stream.get_epoch_iterator())
+    return min(timeit.repeat(lambda: list(stream.get_epoch_iterator()),
+                             number=1, repeat=repeat)) / num_batches
+
+
+def run(num_batches=20, batch_size=128):
+    """Run the benchmark.
+
+    Returns
+    -------
+    results : dict
+        Maps ``'unfused'`` and ``'fused'`` to dictionaries with the time
+        per batch (``seconds``) and the peak bytes allocated per batch
+        (``peak_bytes``).
+
+    """
+    results = {}
+    for name, wrap in (('unfused', standard_chain),
+                       ('fused', lambda s: fuse(standard_chain(s)))):
+        stream = wrap(cifar_stream(num_batches, batch_size))
+        results[name] = {'seconds': time_epoch(stream),
+                         'peak_bytes': peak_allocation(stream)}
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in sorted(run().items()):
+        print('{:8} {:8.3f} ms/batch {:10d} peak bytes/batch'.format(
+            name, 1000 * result['seconds'], result['peak_bytes']))
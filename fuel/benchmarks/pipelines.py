@@ -0,0 +1,399 @@
+"""Throughput benchmarks of standard Fuel pipelines.
+
+Each benchmark builds a data stream on synthetic data and reads it for a
+number of epochs, measuring the throughput in examples and megabytes
+per second, the latency of each batch, and the peak resident memory.
+The HDF5 benchmarks read from a file created with
+:func:`~fuel.converters.base.fill_hdf5_file`, whose size, chunking and
+compression are configurable.
+
+The results are returned as dictionaries which can be dumped to JSON
+(the ``fuel-bench`` script does this), so that runs on different
+commits can be compared.
+
+"""
+from __future__ import division
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from functools import partial
+
+import h5py
+import numpy
+
+from fuel.converters.base import fill_hdf5_file, fill_numberized_text
+from fuel.datasets import (H5PYDataset, IndexableDataset, IterableDataset,
+                           NumberizedText, TextFile)
+from fuel.schemes import ConstantScheme, SequentialScheme, ShuffledScheme
+from fuel.server import start_server
+from fuel.streams import DataStream, ServerDataStream
+from fuel.transformers import (Batch, Cast, Mapping, MultiProcessing,
+                               Padding, ScaleAndShift)
+from fuel.transformers.image import (RandomCropFlipNormalize,
+                                     RandomFixedSizeCrop)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#: The default settings of the benchmarks
+DEFAULTS = OrderedDict([
+    ('num_examples', 10000),
+    ('batch_size', 128),
+    ('example_shape', (3, 32, 32)),
+    ('chunk_size', None),
+    ('compression', None),
+    ('epochs', 2),
+    ('seed', 1),
+    ('port', 5571)])
+
+#: Maps benchmark names to functions that build the data stream
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """Registers a function as the benchmark `name`.
+
+    The function is given the settings and the path of the HDF5 file,
+    and must return the data stream to read and a function that cleans
+    up after the benchmark (or ``None``).
+
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def create_hdf5_file(path, num_examples, example_shape, chunk_size=None,
+                     compression=None, seed=1, **kwargs):
+    """Creates an HDF5 file with random images and targets.
+
+    The file has a single ``train`` split, with a ``features`` source of
+    uint8 images of shape `example_shape` and a ``targets`` source of
+    labels.
+
+    Parameters
+    ----------
+    path : str
+        Where to create the file.
+    num_examples : int
+        The number of examples.
+    example_shape : tuple of int
+        The shape of a single image.
+    chunk_size : int, optional
+        The number of examples per HDF5 chunk. By default the data isn't
+        chunked.
+    compression : str, optional
+        The HDF5 compression filter to use, e.g. ``'gzip'`` or
+        ``'lzf'``. Requires chunking, which h5py enables automatically if
+        `chunk_size` isn't given. By default the data isn't compressed.
+    seed : int, optional
+        The seed used to generate the data.
+
+    """
+    rng = numpy.random.RandomState(seed)
+    features = rng.randint(
+        256, size=(num_examples,) + tuple(example_shape)).astype('uint8')
+    targets = rng.randint(10, size=(num_examples, 1)).astype('uint8')
+    dataset_kwargs = {}
+    for name, data in (('features', features), ('targets', targets)):
+        dataset_kwargs[name] = {'compression': compression}
+        if chunk_size:
+            dataset_kwargs[name]['chunks'] = (
+                (min(chunk_size, num_examples),) + data.shape[1:])
+    with h5py.File(path, mode='w') as h5file:
+        fill_hdf5_file(h5file, (('train', 'features', features),
+                                ('train', 'targets', targets)),
+                       dataset_kwargs=dataset_kwargs)
+
+
+def hdf5_stream(path, settings, shuffled=False):
+    """A batch stream over the HDF5 file created by the benchmarks."""
+    dataset = H5PYDataset(path, which_sets=('train',))
+    if shuffled:
+        scheme = ShuffledScheme(
+            dataset.num_examples, settings['batch_size'],
+            rng=numpy.random.RandomState(settings['seed']))
+    else:
+        scheme = SequentialScheme(dataset.num_examples,
+                                  settings['batch_size'])
+    return DataStream(dataset, iteration_scheme=scheme)
+
+
+@benchmark('h5py_sequential')
+def h5py_sequential(settings, path):
+    return hdf5_stream(path, settings), None
+
+
+@benchmark('h5py_shuffled')
+def h5py_shuffled(settings, path):
+    return hdf5_stream(path, settings, shuffled=True), None
+
+
+@benchmark('text_padding')
+def text_padding(settings, path):
+    rng = numpy.random.RandomState(settings['seed'])
+    lengths = rng.poisson(20, size=settings['num_examples']) + 1
+    sentences = [rng.randint(10000, size=length).astype('int32')
+                 for length in lengths]
+    stream = Batch(DataStream(IterableDataset({'words': sentences})),
+                   ConstantScheme(settings['batch_size']))
+    return Padding(stream), None
+
+
+def text_corpus(settings, path):
+    """Writes a text file of random sentences, and returns a dictionary."""
+    rng = numpy.random.RandomState(settings['seed'])
+    lengths = rng.poisson(20, size=settings['num_examples']) + 1
+    with open(path, 'w') as f:
+        for length in lengths:
+            f.write(' '.join('w{}'.format(word)
+                             for word in rng.randint(10000, size=length)))
+            f.write('\n')
+    # Half of the words are out of the vocabulary
+    dictionary = dict(('w{}'.format(word), word) for word in range(5000))
+    dictionary.update({'<UNK>': 5000, '<S>': 5001, '</S>': 5002})
+    return dictionary
+
+
+@benchmark('text_file')
+def text_file(settings, path):
+    text_path = os.path.join(os.path.dirname(path), 'benchmark.txt')
+    dictionary = text_corpus(settings, text_path)
+    stream = Batch(DataStream(TextFile([text_path], dictionary)),
+                   ConstantScheme(settings['batch_size']))
+    return Padding(stream), None
+
+
+@benchmark('text_file_shuffled')
+def text_file_shuffled(settings, path):
+    text_path = os.path.join(os.path.dirname(path), 'benchmark.txt')
+    dictionary = text_corpus(settings, text_path)
+    dataset = TextFile([text_path], dictionary)
+    scheme = ShuffledScheme(dataset.num_examples, settings['batch_size'],
+                            rng=numpy.random.RandomState(settings['seed']))
+    return Padding(DataStream(dataset, iteration_scheme=scheme)), None
+
+
+@benchmark('numberized_text_shuffled')
+def numberized_text_shuffled(settings, path):
+    text_path = os.path.join(os.path.dirname(path), 'benchmark.txt')
+    dictionary = text_corpus(settings, text_path)
+    numberized_path = os.path.join(os.path.dirname(path),
+                                   'benchmark_numberized.hdf5')
+    with h5py.File(numberized_path, mode='w') as h5file:
+        fill_numberized_text(h5file, TextFile([text_path], dictionary))
+    dataset = NumberizedText(numberized_path)
+    scheme = ShuffledScheme(dataset.num_examples, settings['batch_size'],
+                            rng=numpy.random.RandomState(settings['seed']))
+    return Padding(DataStream(dataset, iteration_scheme=scheme)), None
+
+
+def image_stream(settings):
+    """A batch stream of random uint8 images, and a window shape."""
+    rng = numpy.random.RandomState(settings['seed'])
+    shape = tuple(settings['example_shape'])
+    images = rng.randint(256, size=(settings['num_examples'],) + shape)
+    dataset = IndexableDataset(
+        {'features': images.astype('uint8')},
+        axis_labels={'features': ('batch', 'channel', 'height', 'width')})
+    stream = DataStream(dataset, iteration_scheme=SequentialScheme(
+        dataset.num_examples, settings['batch_size']))
+    window_shape = tuple(max(1, size * 3 // 4) for size in shape[-2:])
+    return stream, window_shape
+
+
+def flip_images(data, rng):
+    images, = data
+    flips = rng.uniform(size=len(images)) < 0.5
+    images[flips] = images[flips, :, :, ::-1]
+    return images,
+
+
+@benchmark('image_crops')
+def image_crops(settings, path):
+    stream, window_shape = image_stream(settings)
+    return RandomFixedSizeCrop(stream, window_shape,
+                               which_sources=('features',)), None
+
+
+@benchmark('image_augmentation')
+def image_augmentation(settings, path):
+    stream, window_shape = image_stream(settings)
+    stream = RandomFixedSizeCrop(stream, window_shape,
+                                 which_sources=('features',))
+    stream = Mapping(stream, partial(
+        flip_images, rng=numpy.random.RandomState(settings['seed'])))
+    stream = ScaleAndShift(stream, 1 / 64., -2, which_sources=('features',))
+    return Cast(stream, 'float32', which_sources=('features',)), None
+
+
+@benchmark('image_augmentation_fused')
+def image_augmentation_fused(settings, path):
+    stream, window_shape = image_stream(settings)
+    return RandomCropFlipNormalize(stream, window_shape, mean=128, std=64,
+                                   dtype='float32',
+                                   which_sources=('features',)), None
+
+
+@benchmark('multiprocessing')
+def multiprocessing_(settings, path):
+    stream = MultiProcessing(hdf5_stream(path, settings))
+    return stream, stream.proc.terminate
+
+
+@benchmark('server')
+def server(settings, path):
+    process = multiprocessing.Process(
+        target=start_server,
+        args=(hdf5_stream(path, settings),),
+        kwargs={'port': settings['port']})
+    process.start()
+    stream = ServerDataStream(('features', 'targets'), False,
+                              port=settings['port'])
+    return stream, process.terminate
+
+
+def peak_rss():
+    """Returns the peak resident memory of this process, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    return peak if sys.platform == 'darwin' else 1024 * peak
+
+
+def measure(stream, epochs):
+    """Reads a data stream and measures its throughput.
+
+    Parameters
+    ----------
+    stream : :class:`.AbstractDataStream`
+        A data stream that produces batches.
+    epochs : int
+        The number of epochs to read.
+
+    Returns
+    -------
+    results : dict
+        The number of batches and examples read, the throughput in
+        examples and megabytes per second, the percentiles of the time
+        taken to produce a batch in milliseconds, and the peak resident
+        memory in megabytes.
+
+    """
+    latencies = []
+    num_examples = num_bytes = 0
+    start = time.time()
+    for _ in range(epochs):
+        iterator = stream.get_epoch_iterator()
+        while True:
+            batch_start = time.time()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                break
+            latencies.append(time.time() - batch_start)
+            num_examples += len(batch[0])
+            num_bytes += sum(numpy.asarray(source_data).nbytes
+                             for source_data in batch)
+    duration = time.time() - start
+    num_batches = len(latencies)
+    latencies = 1000 * numpy.array(latencies or [numpy.nan])
+    rss = peak_rss()
+    return OrderedDict([
+        ('batches', num_batches),
+        ('examples', num_examples),
+        ('seconds', duration),
+        ('examples_per_second', num_examples / duration),
+        ('megabytes_per_second', num_bytes / duration / 1e6),
+        ('latency_ms', OrderedDict(
+            ('p{}'.format(q), numpy.percentile(latencies, q))
+            for q in (50, 90, 99, 100))),
+        ('peak_rss_mb', rss / 1e6 if rss is not None else None)])
+
+
+def run_benchmark(name, settings, path):
+    """Runs a single benchmark in the current process."""
+    stream, cleanup = BENCHMARKS[name](settings, path)
+    try:
+        return measure(stream, settings['epochs'])
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+
+def _run_in_child(name, settings, path, results):
+    try:
+        results.put(run_benchmark(name, settings, path))
+    except Exception as e:
+        results.put(OrderedDict([('error', repr(e))]))
+
+
+def run_isolated(name, settings, path):
+    """Runs a single benchmark in a new process.
+
+    This way the peak resident memory that is reported only includes
+    the memory used by this benchmark.
+
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run_in_child, args=(name, settings, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def run(names=None, isolate=True, **settings):
+    r"""Runs benchmarks and returns their results.
+
+    Parameters
+    ----------
+    names : list of str, optional
+        The benchmarks to run, by default all of them (see
+        :data:`BENCHMARKS`).
+    isolate : bool, optional
+        Whether to run each benchmark in a separate process. Defaults to
+        ``True``.
+    \*\*settings
+        Overrides of the :data:`DEFAULTS`.
+
+    Returns
+    -------
+    report : dict
+        The settings, information about the environment, and the results
+        of each benchmark under ``'results'``.
+
+    """
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError('unknown settings: {}'.format(sorted(unknown)))
+    settings = OrderedDict(DEFAULTS, **settings)
+    names = list(BENCHMARKS) if names is None else names
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'benchmark.hdf5')
+        create_hdf5_file(path, **settings)
+        results = OrderedDict(
+            (name, (run_isolated if isolate else run_benchmark)(
+                name, settings, path))
+            for name in names)
+    finally:
+        shutil.rmtree(directory)
+    return OrderedDict([
+        ('settings', settings),
+        ('environment', OrderedDict([
+            ('python', platform.python_version()),
+            ('numpy', numpy.__version__),
+            ('h5py', h5py.__version__),
+            ('platform', platform.platform())])),
+        ('results', results)])
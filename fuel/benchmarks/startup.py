@@ -0,0 +1,88 @@
+"""Benchmark the time it takes to import Fuel.
+
+Every worker process and command line tool imports Fuel, so importing it
+should be fast. Each import is timed in a fresh interpreter, which also
+reports which of the slow optional backends got imported. These should
+only be imported when the classes that need them are used.
+
+"""
+from __future__ import print_function
+import json
+import os
+import subprocess
+import sys
+
+import fuel
+
+#: Modules which should not be imported by ``import fuel`` or its main
+#: subpackages. Deferring the import of h5py relies on module-level
+#: ``__getattr__``, which requires Python 3.7.
+HEAVY_MODULES = ('tables', 'zmq', 'PIL', 'fuel.transformers._image',
+                 'fuel.server', 'yaml') + (
+    ('h5py',) if sys.version_info >= (3, 7) else ())
+
+#: The modules whose imports are timed by default
+MODULES = ('fuel', 'fuel.streams', 'fuel.datasets', 'fuel.transformers')
+
+_TIMER = """
+import json, sys, time
+start = time.time()
+import {module}
+seconds = time.time() - start
+print(json.dumps({{'seconds': seconds, 'heavy_modules': [
+    name for name in {heavy_modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module, repeat=5):
+    """Times the import of a module in new interpreters.
+
+    Parameters
+    ----------
+    module : str
+        The name of the module to import.
+    repeat : int, optional
+        The number of times to import the module. Defaults to 5.
+
+    Returns
+    -------
+    result : dict
+        The fastest time taken by the import statement (``seconds``),
+        and the modules of :data:`HEAVY_MODULES` that it imported
+        (``heavy_modules``).
+
+    """
+    env = dict(os.environ)
+    # Import this copy of Fuel, even if it isn't installed
+    path = os.path.dirname(os.path.dirname(os.path.abspath(fuel.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    code = _TIMER.format(module=module, heavy_modules=HEAVY_MODULES)
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=path, env=env)
+        results.append(json.loads(output.decode('utf-8')))
+    return {'seconds': min(result['seconds'] for result in results),
+            'heavy_modules': results[-1]['heavy_modules']}
+
+
+def run(modules=MODULES, repeat=5):
+    """Run the benchmark.
+
+    Returns
+    -------
+    results : dict
+        Maps the names of the modules to the results of
+        :func:`measure_import`.
+
+    """
+    return dict((module, measure_import(module, repeat))
+                for module in modules)
+
+
+if __name__ == "__main__":
+    for module, result in sorted(run().items()):
+        print('{:20} {:8.1f} ms {}'.format(
+            module, 1000 * result['seconds'],
+            ', '.join(result['heavy_modules'])))
@@ -59,8 +59,6 @@ The following configurations are supported:
 import logging
 import os
 
-import yaml
-
 from .exceptions import ConfigurationError
 
 logger = logging.getLogger(__name__)
@@ -78,6 +76,7 @@ class Configuration(object):
         else:
             yaml_file = os.path.expanduser('~/.fuelrc')
         if os.path.isfile(yaml_file):
+            import yaml
             with open(yaml_file) as f:
                 for key, value in yaml.safe_load(f).items():
                     if key not in self.config:
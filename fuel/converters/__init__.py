@@ -16,6 +16,7 @@ from fuel.converters import cifar10
 from fuel.converters import cifar100
 from fuel.converters import iris
 from fuel.converters import mnist
+from fuel.converters import one_billion_word
 from fuel.converters import svhn
 
 __version__ = '0.2'
@@ -26,4 +27,5 @@ all_converters = (
     ('cifar100', cifar100.fill_subparser),
     ('iris', iris.fill_subparser),
     ('mnist', mnist.fill_subparser),
+    ('one_billion_word', one_billion_word.fill_subparser),
     ('svhn', svhn.fill_subparser))
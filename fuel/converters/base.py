@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from contextlib import contextmanager
 from functools import wraps
 
@@ -7,6 +8,7 @@ import numpy
 from progressbar import (ProgressBar, Percentage, Bar, ETA)
 
 from fuel.datasets import H5PYDataset
+from fuel.datasets.text import dictionary_digest
 from ..exceptions import MissingInputFiles
 
 
@@ -47,7 +49,7 @@ def check_exists(required_files):
     return function_wrapper
 
 
-def fill_hdf5_file(h5file, data):
+def fill_hdf5_file(h5file, data, dataset_kwargs=None):
     """Fills an HDF5 file in a H5PYDataset-compatible manner.
 
     Parameters
@@ -65,6 +67,10 @@ def fill_hdf5_file(h5file, data):
         * 'comment' is a comment string for the split/source pair
 
         The 'comment' element can optionally be omitted.
+    dataset_kwargs : dict, optional
+        Maps source names to dictionaries of keyword arguments that are
+        passed to :meth:`h5py.Group.create_dataset` when creating the
+        dataset of that source, e.g. to set `chunks` or `compression`.
 
     """
     # Check that all sources for a split have the same length
@@ -93,7 +99,8 @@ def fill_hdf5_file(h5file, data):
                              "vary in shapes")
         dataset = h5file.create_dataset(
             name, (sum(len(s[2]) for s in splits),) + splits[0][2].shape[1:],
-            dtype=splits[0][2].dtype)
+            dtype=splits[0][2].dtype,
+            **(dataset_kwargs or {}).get(name, {}))
         dataset[...] = numpy.concatenate([s[2] for s in splits], axis=0)
         for i, j, s in zip(indices[:-1], indices[1:], splits):
             if len(s) == 4:
@@ -103,6 +110,98 @@ def fill_hdf5_file(h5file, data):
     h5file.attrs['split'] = H5PYDataset.create_split_array(split_dict)
 
 
+def add_image_index(h5file, source, chunk_size=1024):
+    """Stores the sizes and modes of a source of encoded images.
+
+    The index is read from the headers of the images, without decoding
+    them (see :func:`~fuel.transformers.image.image_index`), and stored
+    in the dataset ``<source>_image_index``, from where
+    :meth:`.H5PYDataset.get_image_index` reads it.
+
+    Parameters
+    ----------
+    h5file : :class:`h5py.File`
+        File handle for an HDF5 file, opened for writing.
+    source : str
+        The name of a source of encoded images, e.g. a variable-length
+        source of `uint8`.
+    chunk_size : int, optional
+        The number of images read at a time. Defaults to 1024.
+
+    """
+    from fuel.transformers.image import image_index, IMAGE_INDEX_DTYPE
+    images = h5file[source]
+    index = h5file.create_dataset(
+        H5PYDataset.image_index_name.format(source), (len(images),),
+        dtype=IMAGE_INDEX_DTYPE)
+    for start in range(0, len(images), chunk_size):
+        stop = min(start + chunk_size, len(images))
+        index[start:stop] = image_index(images[start:stop])
+
+
+def fill_numberized_text(h5file, text_file, chunk_size=2 ** 24):
+    """Numberizes the sentences of a text file dataset into an HDF5 file.
+
+    The numbers of the tokens of all sentences, including the BOS and
+    EOS markers, are stored in the `int32` dataset ``tokens``, and the
+    offset of each sentence in ``offsets``, which has an additional last
+    element: the total number of tokens. Both datasets are contiguous, so
+    that :class:`~fuel.datasets.text.NumberizedText` can memory-map
+    them.
+
+    The level, the BOS, EOS and unknown tokens (the markers which are
+    ``None`` are left out) and a digest of the dictionary are stored as
+    attributes of the file, so that
+    :class:`~fuel.datasets.text.NumberizedText` can check them. The
+    preprocessing can't be recorded.
+
+    Parameters
+    ----------
+    h5file : :class:`h5py.File`
+        File handle for an HDF5 file, opened for writing.
+    text_file : :class:`~fuel.datasets.text.TextFile`
+        The dataset whose sentences to numberize, with the dictionary,
+        markers, level and preprocessing to apply.
+    chunk_size : int, optional
+        The number of tokens copied into the file at a time. Defaults
+        to 2 ** 24.
+
+    """
+    state = text_file.open()
+    lengths = []
+    # The number of tokens is only known at the end, but contiguous
+    # datasets can't be resized, so the tokens are buffered on disk
+    with tempfile.TemporaryFile() as buffer_file:
+        while True:
+            try:
+                block = state.read_block()
+            except StopIteration:
+                break
+            state.sentences.clear()
+            sentences = text_file.numberize(block)
+            if sentences:
+                buffer_file.write(numpy.concatenate(sentences).tobytes())
+                lengths.append(numpy.fromiter(map(len, sentences), dtype=int,
+                                              count=len(sentences)))
+        offsets = numpy.zeros(sum(map(len, lengths)) + 1, dtype='int64')
+        if lengths:
+            numpy.cumsum(numpy.concatenate(lengths), out=offsets[1:])
+        tokens = h5file.create_dataset('tokens', (offsets[-1],),
+                                       dtype='int32')
+        buffer_file.seek(0)
+        for start in range(0, offsets[-1], chunk_size):
+            stop = min(start + chunk_size, offsets[-1])
+            tokens[start:stop] = numpy.frombuffer(
+                buffer_file.read(4 * (stop - start)), dtype='int32')
+    h5file.create_dataset('offsets', data=offsets)
+    h5file.attrs['level'] = text_file.level
+    for name in ('bos_token', 'eos_token', 'unk_token'):
+        if getattr(text_file, name) is not None:
+            h5file.attrs[name] = getattr(text_file, name)
+    h5file.attrs['dictionary_digest'] = dictionary_digest(
+        text_file.dictionary)
+
+
 @contextmanager
 def progress_bar(name, maxval, prefix='Converting'):
     """Manages a progress bar for a conversion.
@@ -0,0 +1,102 @@
+import os
+
+import h5py
+
+from fuel.converters.base import fill_numberized_text
+from fuel.datasets import TextFile
+from fuel.datasets.billion import partition_files
+from fuel.exceptions import MissingInputFiles
+
+
+def convert_one_billion_word(which_set, which_partitions, dictionary,
+                             directory, output_directory,
+                             output_filename=None, level='word',
+                             lowercase=False):
+    """Numberizes partitions of the One Billion Word benchmark.
+
+    Numberizes the sentences once, so that they can be read by
+    :class:`~fuel.datasets.text.NumberizedText` without tokenizing them
+    again every epoch. The partitions are read like
+    :class:`fuel.datasets.OneBillionWord` does, from the
+    ``training-monolingual.tokenized.shuffled`` or
+    ``heldout-monolingual.tokenized.shuffled`` directory.
+
+    Parameters
+    ----------
+    which_set : 'training' or 'heldout'
+        Which set to convert.
+    which_partitions : list of ints
+        The partitions to convert, see
+        :class:`fuel.datasets.OneBillionWord`.
+    dictionary : str or dict
+        The dictionary, or the path to a pickled dictionary, mapping
+        tokens to integers. It must contain the tokens ``<S>``, ``</S>``
+        and ``<UNK>``.
+    directory : str
+        Directory in which input files reside.
+    output_directory : str
+        Directory in which to save the converted dataset.
+    output_filename : str, optional
+        Name of the saved dataset. Defaults to
+        'one_billion_word_training.hdf5' or
+        'one_billion_word_heldout.hdf5', depending on `which_set`.
+    level : 'word' or 'character', optional
+        Whether to numberize words or characters. Defaults to 'word'.
+    lowercase : bool, optional
+        Whether to lowercase the sentences before numberizing them.
+        Defaults to ``False``.
+
+    Returns
+    -------
+    output_paths : tuple of str
+        Single-element tuple containing the path to the converted dataset.
+
+    """
+    files = partition_files(which_set, which_partitions)
+    missing = [filename for filename in files
+               if not os.path.isfile(os.path.join(directory, filename))]
+    if missing:
+        raise MissingInputFiles('Required files missing', missing)
+    if not output_filename:
+        output_filename = 'one_billion_word_{}.hdf5'.format(which_set)
+    text_file = TextFile(
+        [os.path.join(directory, filename) for filename in files],
+        dictionary, level=level, preprocess=lower if lowercase else None)
+
+    output_path = os.path.join(output_directory, output_filename)
+    h5file = h5py.File(output_path, mode='w')
+    fill_numberized_text(h5file, text_file)
+    h5file.flush()
+    h5file.close()
+
+    return (output_path,)
+
+
+def lower(sentence):
+    return sentence.lower()
+
+
+def fill_subparser(subparser):
+    """Sets up a subparser to convert the One Billion Word dataset files.
+
+    Parameters
+    ----------
+    subparser : :class:`argparse.ArgumentParser`
+        Subparser handling the `one_billion_word` command.
+
+    """
+    subparser.add_argument(
+        "which_set", help="which set to convert",
+        choices=('training', 'heldout'))
+    subparser.add_argument(
+        "which_partitions", help="which partitions to convert", type=int,
+        nargs='+')
+    subparser.add_argument(
+        "--dictionary", help="path to a pickled dictionary", type=str,
+        required=True)
+    subparser.add_argument(
+        "--level", help="whether to numberize words or characters",
+        choices=('word', 'character'), default='word')
+    subparser.add_argument(
+        "--lowercase", help="lowercase the sentences", action='store_true')
+    subparser.set_defaults(func=convert_one_billion_word)
@@ -1,14 +1,44 @@
 # flake8: noqa
-from fuel.datasets.base import (Dataset, IterableDataset,
+import importlib
+import sys
+
+from fuel.datasets.base import (Dataset, IterableDataset, CachedDataset,
                                 IndexableDataset)
 
-from fuel.datasets.hdf5 import H5PYDataset
-from fuel.datasets.binarized_mnist import BinarizedMNIST
-from fuel.datasets.cifar10 import CIFAR10
-from fuel.datasets.cifar100 import CIFAR100
-from fuel.datasets.caltech101_silhouettes import CalTech101Silhouettes
-from fuel.datasets.iris import Iris
-from fuel.datasets.mnist import MNIST
-from fuel.datasets.svhn import SVHN
-from fuel.datasets.text import TextFile
+from fuel.datasets.text import TextFile, NumberizedText
 from fuel.datasets.billion import OneBillionWord
+
+#: Maps the datasets which need h5py to their modules
+_H5PY_DATASETS = {
+    'H5PYDataset': 'hdf5',
+    'BinarizedMNIST': 'binarized_mnist',
+    'CIFAR10': 'cifar10',
+    'CIFAR100': 'cifar100',
+    'CalTech101Silhouettes': 'caltech101_silhouettes',
+    'Iris': 'iris',
+    'MNIST': 'mnist',
+    'SVHN': 'svhn'}
+
+if sys.version_info >= (3, 7):
+    # Importing h5py takes longer than importing the rest of Fuel, so the
+    # datasets which need it are only imported when they are accessed
+    def __getattr__(name):
+        if name in _H5PY_DATASETS:
+            module = importlib.import_module(
+                'fuel.datasets.' + _H5PY_DATASETS[name])
+            globals()[name] = getattr(module, name)
+            return globals()[name]
+        raise AttributeError("module 'fuel.datasets' has no attribute '{}'"
+                             .format(name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(_H5PY_DATASETS))
+else:
+    from fuel.datasets.hdf5 import H5PYDataset
+    from fuel.datasets.binarized_mnist import BinarizedMNIST
+    from fuel.datasets.cifar10 import CIFAR10
+    from fuel.datasets.cifar100 import CIFAR100
+    from fuel.datasets.caltech101_silhouettes import CalTech101Silhouettes
+    from fuel.datasets.iris import Iris
+    from fuel.datasets.mnist import MNIST
+    from fuel.datasets.svhn import SVHN
@@ -0,0 +1,209 @@
+cimport cython
+from libc.string cimport memchr, memcmp
+
+import numpy
+
+
+ctypedef unsigned long long uint64
+
+
+cdef inline Py_ssize_t space_length(const unsigned char *text,
+                                    Py_ssize_t position,
+                                    Py_ssize_t size) nogil:
+    """The length of the UTF-8 encoded whitespace at a position, if any.
+
+    Whitespace is what :meth:`str.split` splits at.
+
+    """
+    cdef unsigned char byte = text[position]
+    if byte == 32 or 9 <= byte <= 13 or 28 <= byte <= 31:
+        return 1
+    if byte < 0xc2 or byte > 0xe3 or position + 1 >= size:
+        return 0
+    cdef unsigned char second = text[position + 1]
+    if byte == 0xc2:
+        return 2 if second == 0x85 or second == 0xa0 else 0
+    if position + 2 >= size:
+        return 0
+    cdef unsigned char third = text[position + 2]
+    if ((byte == 0xe1 and second == 0x9a and third == 0x80) or
+            (byte == 0xe2 and second == 0x80 and
+             (0x80 <= third <= 0x8a or third == 0xa8 or third == 0xa9 or
+              third == 0xaf)) or
+            (byte == 0xe2 and second == 0x81 and third == 0x9f) or
+            (byte == 0xe3 and second == 0x80 and third == 0x80)):
+        return 3
+    return 0
+
+
+cdef inline uint64 fnv1a(const unsigned char *data, Py_ssize_t length) nogil:
+    cdef uint64 hash_ = 14695981039346656037ULL
+    cdef Py_ssize_t i
+    for i in range(length):
+        hash_ = (hash_ ^ data[i]) * 1099511628211ULL
+    return hash_
+
+
+def build_vocabulary(list tokens, list numbers):
+    """build_vocabulary(tokens, numbers)
+
+    Build an open-addressing hash table of encoded tokens.
+
+    Parameters
+    ----------
+    tokens : list of bytes
+        The encoded tokens, which must be unique.
+    numbers : list of int
+        The number of each token.
+
+    Returns
+    -------
+    vocabulary : tuple of ndarrays
+        The hash table, to be passed to :func:`numberize_words`. It
+        consists of the slots (the index of the token in each slot, or -1
+        if it is empty), the offsets of the tokens in the concatenated
+        tokens, the concatenated tokens, and the numbers of the tokens.
+
+    """
+    cdef Py_ssize_t num_slots = 8
+    while num_slots < 2 * len(tokens):
+        num_slots *= 2
+    cdef long long[:] slots = numpy.full(num_slots, -1, dtype='int64')
+    offsets = numpy.zeros(len(tokens) + 1, dtype='int64')
+    offsets[1:] = numpy.cumsum([len(token) for token in tokens])
+    data = numpy.frombuffer(b''.join(tokens) + b'\0', dtype='uint8')
+    cdef const unsigned char[:] data_view = data
+    cdef long long[:] offsets_view = offsets
+    cdef Py_ssize_t index, slot
+    cdef Py_ssize_t mask = num_slots - 1
+    for index in range(len(tokens)):
+        slot = fnv1a(&data_view[offsets_view[index]],
+                     offsets_view[index + 1] - offsets_view[index]) & mask
+        while slots[slot] != -1:
+            slot = (slot + 1) & mask
+        slots[slot] = index
+    return (numpy.asarray(slots), offsets, data,
+            numpy.array(numbers, dtype='int32'))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def numberize_words(bytes block, long long[:] slots, long long[:] offsets,
+                    const unsigned char[:] data, int[:] numbers,
+                    int unk):
+    """numberize_words(block, slots, offsets, data, numbers, unk)
+
+    Split the lines of a block of text into words, and numberize them.
+
+    Parameters
+    ----------
+    block : bytes
+        Lines of UTF-8 encoded text, separated by ``\\n``. Words are
+        separated by whitespace, like :meth:`str.split` does.
+    slots, offsets, data, numbers : ndarray
+        A vocabulary, as returned by :func:`build_vocabulary`.
+    unk : int
+        The number of words which aren't in the vocabulary.
+
+    Returns
+    -------
+    tokens : ndarray
+        The `int32` numbers of the words of all lines.
+    lengths : ndarray
+        The number of words of each line. A final ``\\n`` doesn't start
+        a new line.
+
+    """
+    cdef const unsigned char *text = block
+    cdef Py_ssize_t size = len(block)
+    tokens = numpy.empty(size // 2 + 1, dtype='int32')
+    lengths = numpy.empty(block.count(b'\n') + 1, dtype='int64')
+    cdef int[:] tokens_view = tokens
+    cdef long long[:] lengths_view = lengths
+    cdef Py_ssize_t mask = slots.shape[0] - 1
+    cdef Py_ssize_t position = 0, start, slot, index, line_start = 0
+    cdef Py_ssize_t length
+    cdef Py_ssize_t num_tokens = 0, num_lines = 0
+    cdef int number
+    with nogil:
+        while position < size:
+            if text[position] == 10:
+                lengths_view[num_lines] = num_tokens - line_start
+                num_lines += 1
+                line_start = num_tokens
+                position += 1
+            else:
+                length = space_length(text, position, size)
+                if length:
+                    position += length
+                    continue
+                start = position
+                while (position < size and
+                       not space_length(text, position, size)):
+                    position += 1
+                slot = fnv1a(&text[start], position - start) & mask
+                number = unk
+                while slots[slot] != -1:
+                    index = slots[slot]
+                    if (offsets[index + 1] - offsets[index] ==
+                            position - start and
+                            memcmp(&data[offsets[index]], &text[start],
+                                   position - start) == 0):
+                        number = numbers[index]
+                        break
+                    slot = (slot + 1) & mask
+                tokens_view[num_tokens] = number
+                num_tokens += 1
+        if size and text[size - 1] != 10:
+            lengths_view[num_lines] = num_tokens - line_start
+            num_lines += 1
+    return tokens[:num_tokens], lengths[:num_lines]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def line_offsets(const unsigned char[:] text):
+    """line_offsets(text)
+
+    Find the offsets at which the lines of a text start.
+
+    Parameters
+    ----------
+    text : buffer
+        The text, e.g. a memory-mapped file. Lines are separated by
+        ``\\n``.
+
+    Returns
+    -------
+    offsets : ndarray
+        The `int64` offsets of the lines, followed by the size of the
+        text. A final ``\\n`` doesn't start a new line.
+
+    """
+    cdef Py_ssize_t size = text.shape[0]
+    if not size:
+        return numpy.zeros(1, dtype='int64')
+    cdef const unsigned char *start = &text[0]
+    cdef const unsigned char *end = start + size
+    cdef const unsigned char *newline = start
+    cdef Py_ssize_t num_lines = 0
+    with nogil:
+        while True:
+            newline = <const unsigned char *>memchr(newline, 10,
+                                                    end - newline)
+            if newline == NULL or newline + 1 == end:
+                break
+            newline += 1
+            num_lines += 1
+    offsets = numpy.empty(num_lines + 2, dtype='int64')
+    cdef long long[:] offsets_view = offsets
+    cdef Py_ssize_t line = 0
+    newline = start
+    offsets_view[0] = 0
+    with nogil:
+        for line in range(1, num_lines + 1):
+            newline = <const unsigned char *>memchr(newline, 10,
+                                                    end - newline) + 1
+            offsets_view[line] = newline - start
+        offsets_view[num_lines + 1] = size
+    return offsets
@@ -1,13 +1,15 @@
 import collections
+import sys
 from abc import ABCMeta, abstractmethod
 
+import numpy
 from six import add_metaclass
 
 from picklable_itertools import iter_, izip
 
 from fuel.schemes import SequentialExampleScheme
 from fuel.streams import DataStream
-from fuel.utils import iterable_fancy_indexing
+from fuel.utils import do_not_pickle_attributes, iterable_fancy_indexing
 
 
 @add_metaclass(ABCMeta)
@@ -333,6 +335,9 @@ class IndexableDataset(Dataset):
     This dataset also uses the source names to create properties that
     provide easy access to the data.
 
+    Requests can be single indices, lists or NumPy arrays of indices, or
+    slices. Slices and arrays are passed on to indexables as-is.
+
     """
     def __init__(self, indexables, start=None, stop=None, **kwargs):
         if isinstance(indexables, dict):
@@ -375,8 +380,176 @@ class IndexableDataset(Dataset):
     def get_data(self, state=None, request=None):
         if state is not None or request is None:
             raise ValueError
-        if isinstance(request, collections.Iterable):
+        if isinstance(request, (slice, collections.Iterable)):
             return tuple(iterable_fancy_indexing(indexable, request)
                          for indexable in self.indexables)
         else:
             return tuple(indexable[request] for indexable in self.indexables)
+
+
+def _num_bytes(example):
+    return sum(getattr(source_example, 'nbytes', None) or
+               sys.getsizeof(source_example) for source_example in example)
+
+
+@do_not_pickle_attributes('cache', 'num_bytes')
+class CachedDataset(Dataset):
+    """Keeps recently requested examples of a dataset in memory.
+
+    Wraps a dataset which accepts indexable requests (single indices,
+    lists or arrays of indices, or slices), e.g. an out-of-memory
+    :class:`.H5PYDataset`, and caches the examples it returns, evicting
+    the least recently used ones when the cache exceeds a memory budget.
+    Each request is split into examples that are in the cache and
+    examples that aren't, and the latter are read from the wrapped
+    dataset with a single sorted request.
+
+    Parameters
+    ----------
+    dataset : :class:`Dataset`
+        The wrapped dataset.
+    max_bytes : int
+        The maximum number of bytes of data to keep in the cache.
+
+    Attributes
+    ----------
+    hits : int
+        The number of requested examples that were found in the cache.
+        An example requested more than once in a request counts once.
+    misses : int
+        The number of requested examples that were read from the wrapped
+        dataset, counted like `hits`.
+    num_bytes : int
+        The number of bytes of data in the cache.
+
+    Notes
+    -----
+    The cache isn't pickled, so that it starts out empty again after
+    unpickling.
+
+    """
+    def __init__(self, dataset, max_bytes, **kwargs):
+        self.provides_sources = dataset.sources
+        kwargs.setdefault('axis_labels', dataset.axis_labels)
+        super(CachedDataset, self).__init__(**kwargs)
+        self.dataset = dataset
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # The dtypes of the batches returned by the wrapped dataset, which
+        # are used to assemble batches from cached examples
+        self.dtypes = None
+
+    def load(self):
+        self.cache = collections.OrderedDict()
+        self.num_bytes = 0
+
+    @property
+    def num_examples(self):
+        return self.dataset.num_examples
+
+    @property
+    def example_iteration_scheme(self):
+        return self.dataset.example_iteration_scheme
+
+    @property
+    def hit_rate(self):
+        """The fraction of requested examples found in the cache."""
+        requested = self.hits + self.misses
+        return self.hits / float(requested) if requested else float('nan')
+
+    def open(self):
+        return self.dataset.open()
+
+    def reset(self, state):
+        return self.dataset.reset(state)
+
+    def next_epoch(self, state):
+        return self.dataset.next_epoch(state)
+
+    def close(self, state):
+        self.dataset.close(state)
+
+    def get_data(self, state=None, request=None):
+        if request is None:
+            raise ValueError
+        if isinstance(request, slice):
+            indices = list(range(*request.indices(self.num_examples)))
+        elif isinstance(request, collections.Iterable):
+            indices = [int(index) for index in request]
+        else:
+            indices = [int(request)]
+        if not indices:
+            # Nothing may have been read yet, so the dtypes can be unknown
+            return self.filter_sources(tuple(
+                self._stack([], dtype) for dtype in
+                self.dtypes or [None] * len(self.provides_sources)))
+        examples = self._get_examples(state, indices)
+        if isinstance(request, (slice, collections.Iterable)):
+            data = tuple(self._stack([examples[index][i] for index in indices],
+                                     dtype)
+                         for i, dtype in enumerate(self.dtypes))
+        else:
+            # Copies, so that callers modifying their data in place (e.g.
+            # transformers that own their buffers) can't alter the cache
+            data = tuple(numpy.array(example)
+                         if isinstance(example, numpy.ndarray) else example
+                         for example in examples[indices[0]])
+        return self.filter_sources(data)
+
+    def clear(self):
+        """Empties the cache."""
+        self.load()
+
+    def _get_examples(self, state, indices):
+        examples = {}
+        misses = set()
+        for index in indices:
+            if index in examples or index in misses:
+                continue
+            if index in self.cache:
+                # Move the example to the end of the LRU order
+                examples[index] = self.cache[index] = self.cache.pop(index)
+            else:
+                misses.add(index)
+        # Indices requested more than once are only counted once
+        self.hits += len(examples)
+        self.misses += len(misses)
+        if not misses:
+            return examples
+        misses = sorted(misses)
+        batch = self.dataset.get_data(state, misses)
+        if self.dtypes is None:
+            self.dtypes = [source_batch.dtype
+                           if isinstance(source_batch, numpy.ndarray)
+                           else None for source_batch in batch]
+        for i, index in enumerate(misses):
+            # Copies, so that the batch can be freed
+            example = tuple(numpy.array(source_batch[i])
+                            if isinstance(source_batch, numpy.ndarray) and
+                            source_batch.dtype != object
+                            else source_batch[i] for source_batch in batch)
+            examples[index] = example
+            self._add(index, example)
+        return examples
+
+    def _add(self, index, example):
+        num_bytes = _num_bytes(example)
+        if num_bytes > self.max_bytes:
+            return
+        self.cache[index] = example
+        self.num_bytes += num_bytes
+        while self.num_bytes > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.num_bytes -= _num_bytes(evicted)
+
+    @staticmethod
+    def _stack(examples, dtype):
+        if dtype is None:
+            return examples
+        if dtype == object:
+            batch = numpy.empty(len(examples), dtype=object)
+            for i, example in enumerate(examples):
+                batch[i] = example
+            return batch
+        return numpy.array(examples, dtype=dtype)
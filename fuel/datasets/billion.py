@@ -40,22 +40,40 @@ class OneBillionWord(TextFile):
 
     """
     def __init__(self, which_set, which_partitions, dictionary, **kwargs):
-        if which_set not in ('training', 'heldout'):
+        files = [find_in_data_path(os.path.join('1-billion-word', filename))
+                 for filename in partition_files(which_set,
+                                                 which_partitions)]
+        super(OneBillionWord, self).__init__(files, dictionary, **kwargs)
+
+
+def partition_files(which_set, which_partitions):
+    """The names of the files of partitions of the One Billion Word data.
+
+    Parameters
+    ----------
+    which_set : 'training' or 'heldout'
+        The set the partitions belong to.
+    which_partitions : list of ints
+        The partitions, see :class:`OneBillionWord`.
+
+    Returns
+    -------
+    files : list of str
+        The paths of the files, relative to the ``1-billion-word``
+        directory.
+
+    """
+    if which_set not in ('training', 'heldout'):
+        raise ValueError
+    if which_set == 'training':
+        if not all(partition in range(1, 100)
+                   for partition in which_partitions):
             raise ValueError
-        if which_set == 'training':
-            if not all(partition in range(1, 100)
-                       for partition in which_partitions):
-                raise ValueError
-            files = [find_in_data_path(os.path.join(
-                '1-billion-word', 'training-monolingual.tokenized.shuffled',
-                'news.en-{:05d}-of-00100'.format(partition)))
-                for partition in which_partitions]
-        else:
-            if not all(partition in range(50)
-                       for partition in which_partitions):
-                raise ValueError
-            files = [find_in_data_path(os.path.join(
-                '1-billion-word', 'heldout-monolingual.tokenized.shuffled',
-                'news.en.heldout-{:05d}-of-00050'.format(partition)))
+        return [os.path.join('training-monolingual.tokenized.shuffled',
+                             'news.en-{:05d}-of-00100'.format(partition))
                 for partition in which_partitions]
-        super(OneBillionWord, self).__init__(files, dictionary, **kwargs)
+    if not all(partition in range(50) for partition in which_partitions):
+        raise ValueError
+    return [os.path.join('heldout-monolingual.tokenized.shuffled',
+                         'news.en.heldout-{:05d}-of-00050'.format(partition))
+            for partition in which_partitions]
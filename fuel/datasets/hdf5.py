@@ -4,10 +4,10 @@ from collections import defaultdict
 import h5py
 import numpy
 import six
-import tables
 from six.moves import zip, range
 
 from fuel.datasets import Dataset
+from fuel.schemes import range_parameters, shard_indices
 from fuel.utils import do_not_pickle_attributes, iterable_fancy_indexing
 
 
@@ -53,6 +53,8 @@ class PytablesDataset(Dataset):
         super(PytablesDataset, self).__init__(self.provides_sources)
 
     def open_file(self, path):
+        # PyTables is slow to import, so only do so when it is needed
+        import tables
         self.h5file = tables.open_file(path, mode="r")
         node = self.h5file.get_node('/', self.data_node)
 
@@ -79,8 +81,8 @@ class PytablesDataset(Dataset):
             request = slice(request.start + self.start,
                             request.stop + self.start, request.step)
             data = [node[request] for node in self.nodes]
-        elif isinstance(request, list):
-            request = [index + self.start for index in request]
+        elif isinstance(request, (list, numpy.ndarray)):
+            request = numpy.asarray(request) + self.start
             data = [node[request, ...] for node in self.nodes]
         else:
             raise ValueError
@@ -88,7 +90,7 @@ class PytablesDataset(Dataset):
 
 
 @do_not_pickle_attributes('data_sources', 'external_file_handle',
-                          'source_shapes', 'subsets')
+                          'image_indexes', 'source_shapes', 'subsets')
 class H5PYDataset(Dataset):
     """An h5py-fueled HDF5 dataset.
 
@@ -142,6 +144,17 @@ class H5PYDataset(Dataset):
         performance, set this flag to `False`. Note that in that case,
         it is the user's responsibility to make sure that indices are
         ordered.
+    num_shards : int, optional
+        If given, the examples (within the context of the split and
+        `subset`) are split into this many contiguous shards of which
+        only one is used, e.g. by each worker of a data-parallel job.
+        Only that shard is read, or loaded in memory. Defaults to 1.
+    shard_index : int, optional
+        The shard to use, from 0 to ``num_shards - 1``. Defaults to 0.
+    equal_shards : bool, optional
+        If `True`, the remaining examples are dropped so that all shards
+        have the same size. Defaults to `False`. See
+        :func:`.shard_indices`.
 
     Attributes
     ----------
@@ -160,11 +173,14 @@ class H5PYDataset(Dataset):
 
     """
     interface_version = '0.3'
+    #: The name of the dataset with the image index of a source
+    image_index_name = '{}_image_index'
     _ref_counts = defaultdict(int)
     _file_handles = {}
 
     def __init__(self, file_or_path, which_sets, subset=None,
                  load_in_memory=False, driver=None, sort_indices=True,
+                 num_shards=1, shard_index=0, equal_shards=False,
                  **kwargs):
         if isinstance(file_or_path, h5py.File):
             self.path = file_or_path.filename
@@ -182,6 +198,12 @@ class H5PYDataset(Dataset):
         self.load_in_memory = load_in_memory
         self.driver = driver
         self.sort_indices = sort_indices
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('shard_index must be between 0 and '
+                             'num_shards - 1')
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.equal_shards = equal_shards
 
         self._parse_dataset_info()
 
@@ -468,17 +490,20 @@ class H5PYDataset(Dataset):
 
         Parameters
         ----------
-        request : list of int
+        request : list or array of int
             Unsorted list of example indices.
         indexable : any fancy-indexable object
             Indexable we'd like to do unsorted fancy indexing on.
 
         """
         if len(request) > 1:
+            request = numpy.asarray(request)
+            if (request[1:] > request[:-1]).all():
+                return indexable[request, ...]
             indices = numpy.argsort(request)
             data = numpy.empty(shape=(len(request),) + indexable.shape[1:],
                                dtype=indexable.dtype)
-            data[indices] = indexable[numpy.array(request)[indices], ...]
+            data[indices] = indexable[request[indices], ...]
         else:
             data = indexable[request]
         return data
@@ -545,7 +570,17 @@ class H5PYDataset(Dataset):
                 num_examples = subset_num_examples
             if num_examples != subset_num_examples:
                 raise ValueError("sources have different lengths")
+        if self.num_shards > 1:
+            shard = shard_indices(range(num_examples), self.num_shards,
+                                  self.shard_index, equal=self.equal_shards)
+            first, _, shard_size = range_parameters(shard)
+            subsets = [slice(subset.start + first,
+                             subset.start + first + shard_size, subset.step)
+                       if hasattr(subset, 'step')
+                       else subset[first:first + shard_size]
+                       for subset in subsets]
         self.subsets = subsets
+        self.image_indexes = {}
 
         # Load data sources and source shapes
         if self.load_in_memory:
@@ -570,6 +605,56 @@ class H5PYDataset(Dataset):
 
         self._out_of_memory_close()
 
+    def get_image_index(self, source_name, chunk_size=1024):
+        """Returns the sizes and modes of a source of encoded images.
+
+        The index is read from the dataset ``<source>_image_index`` if the
+        file has one (see :func:`.add_image_index`). Otherwise it is built
+        from the headers of the images, which reads the encoded images
+        but doesn't decode them. Either way, it is cached.
+
+        Parameters
+        ----------
+        source_name : str
+            The name of a source of encoded images.
+        chunk_size : int, optional
+            The number of images read at a time when building the index.
+            Defaults to 1024.
+
+        Returns
+        -------
+        index : ndarray
+            A structured array with the `height`, `width`, `mode` and
+            `num_bytes` of each example of this dataset, as returned by
+            :func:`~fuel.transformers.image.image_index`.
+
+        """
+        if source_name in self.image_indexes:
+            return self.image_indexes[source_name]
+        if source_name not in self.sources:
+            raise ValueError("unknown source '{}'".format(source_name))
+        subset = self.subsets[self.sources.index(source_name)]
+        if hasattr(subset, 'step'):
+            subset = numpy.arange(subset.start, subset.stop, subset.step)
+        self._out_of_memory_open()
+        try:
+            handle = self._file_handle
+            index_name = self.image_index_name.format(source_name)
+            if index_name in handle:
+                index = handle[index_name][...][subset]
+            else:
+                from fuel.transformers.image import image_index
+                images = handle[source_name]
+                index = numpy.concatenate([
+                    image_index(images[list(subset[start:start +
+                                                   chunk_size])])
+                    for start in range(0, len(subset), chunk_size)] +
+                    [image_index([])])
+        finally:
+            self._out_of_memory_close()
+        self.image_indexes[source_name] = index
+        return index
+
     @property
     def num_examples(self):
         if hasattr(self.subsets[0], 'step'):
@@ -629,7 +714,7 @@ class H5PYDataset(Dataset):
         return data, shapes
 
     def _out_of_memory_get_data(self, state=None, request=None):
-        if not isinstance(request, (slice, list)):
+        if not isinstance(request, (slice, list, numpy.ndarray)):
             raise ValueError()
         data = []
         shapes = []
@@ -640,7 +725,7 @@ class H5PYDataset(Dataset):
                     req = slice(request.start + subset.start,
                                 request.stop + subset.start, request.step)
                 else:
-                    req = [index + subset.start for index in request]
+                    req = numpy.asarray(request) + subset.start
             else:
                 req = iterable_fancy_indexing(subset, request)
             if hasattr(req, 'step'):
@@ -1,8 +1,23 @@
-from picklable_itertools import iter_, chain
+import codecs
+import hashlib
+import locale
+import mmap
+import os
+from collections import deque
+from itertools import chain, repeat
+
+import numpy
+import six
+from six.moves import cPickle, map
 
 from fuel.datasets import Dataset
+from fuel.datasets._text import (build_vocabulary, line_offsets,
+                                 numberize_words)
+from fuel.schemes import SequentialExampleScheme
+from fuel.utils import do_not_pickle_attributes
 
 
+@do_not_pickle_attributes('mapped_files', 'file_offsets', 'line_offsets')
 class TextFile(Dataset):
     r"""Reads text files and numberizes them given a dictionary.
 
@@ -29,14 +44,43 @@ class TextFile(Dataset):
         If 'word' the dictionary is expected to contain full words. The
         sentences in the text file will be split at the spaces, and each
         word replaced with its number as given by the dictionary, resulting
-        in each example being a single list of numbers. If 'character' the
-        dictionary is expected to contain single letters as keys. A single
-        example will be a list of character numbers, starting with the
-        first non-whitespace character and finishing with the last one.
+        in each example being a single array of numbers. If 'character'
+        the dictionary is expected to contain single letters as keys. A
+        single example will be an array of character numbers, starting
+        with the first non-whitespace character and finishing with the
+        last one.
     preprocess : function, optional
         A function which takes a sentence (string) as an input and returns
         a modified string. For example ``str.lower`` in order to lowercase
         the sentence before numberizing.
+    block_size : int, optional
+        The number of bytes read from the files at a time. All the
+        sentences of a block are numberized at once. Defaults to 1 MB.
+
+    Notes
+    -----
+    Each example is an `int32` array. The sentences of a whole block are
+    numberized at once, without running Python code per word or
+    character. Without `preprocess`, words of UTF-8 encoded files are
+    split and looked up in a hash table of the encoded dictionary by
+    compiled code, without decoding the block. Otherwise the block is
+    decoded and split into lines (calling `preprocess` on each) and
+    words, which are looked up in the dictionary in a single pass.
+    Characters are numberized through a lookup table indexed by their
+    code points.
+
+    The files are decoded with the locale's preferred encoding, like
+    :func:`open` does. Lines are separated by ``\n`` or ``\r\n``.
+
+    Sentences can also be requested by their index in the files, e.g. by
+    :class:`~fuel.schemes.ShuffledExampleScheme` or
+    :class:`~fuel.schemes.ShuffledScheme`, which request a single
+    sentence or a list of them. On the first request the files are
+    memory-mapped, and the offsets of their lines are found and kept in
+    memory (but not pickled), which takes a scan of the files. The
+    requested lines are then read from the memory-mapped files and
+    numberized together. The files are closed when a data stream closes
+    the dataset, or by :meth:`close_files`.
 
     Examples
     --------
@@ -51,9 +95,9 @@ class TextFile(Dataset):
     ...                      preprocess=lower)
     >>> from fuel.streams import DataStream
     >>> for data in DataStream(text_data).get_epoch_iterator():
-    ...     print(data)
-    ([2, 0, 3, 0, 1],)
-    ([2, 0, 4, 1],)
+    ...     print(data[0].tolist())
+    [2, 0, 3, 0, 1]
+    [2, 0, 4, 1]
 
     .. doctest::
        :hide:
@@ -66,8 +110,12 @@ class TextFile(Dataset):
     example_iteration_scheme = None
 
     def __init__(self, files, dictionary, bos_token='<S>', eos_token='</S>',
-                 unk_token='<UNK>', level='word', preprocess=None):
+                 unk_token='<UNK>', level='word', preprocess=None,
+                 block_size=2 ** 20):
         self.files = files
+        if isinstance(dictionary, six.string_types):
+            with open(dictionary, 'rb') as f:
+                dictionary = cPickle.load(f)
         self.dictionary = dictionary
         if bos_token is not None and bos_token not in dictionary:
             raise ValueError
@@ -82,26 +130,443 @@ class TextFile(Dataset):
             raise ValueError
         self.level = level
         self.preprocess = preprocess
+        self.block_size = block_size
+        if level == 'word':
+            tokens, numbers = [], []
+            for token, number in dictionary.items():
+                # Tokens with whitespace can't match a word
+                if token.split() == [token]:
+                    tokens.append(token.encode('utf-8')
+                                  if isinstance(token, six.text_type)
+                                  else token)
+                    numbers.append(number)
+            self.vocabulary = build_vocabulary(tokens, numbers)
+        else:
+            self.character_table = character_table(dictionary, unk_token)
         super(TextFile, self).__init__()
 
     def open(self):
-        return chain(*[iter_(open(f)) for f in self.files])
+        return TextBlocks(self.files, self.block_size)
+
+    def load(self):
+        self.mapped_files = []
+        for filename in self.files:
+            with open(filename, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    mapped_file = mmap.mmap(f.fileno(), 0,
+                                            access=mmap.ACCESS_READ)
+                else:
+                    # Empty files can't be memory-mapped
+                    mapped_file = b''
+            self.mapped_files.append(mapped_file)
+        if hasattr(self, '_line_offsets'):
+            # The index is kept when the files are closed
+            return
+        offsets = [line_offsets(mapped_file)
+                   for mapped_file in self.mapped_files]
+        # The offsets of the files and lines when the files are
+        # concatenated
+        sizes = [len(mapped_file) for mapped_file in self.mapped_files]
+        self.file_offsets = numpy.cumsum([0] + sizes)
+        self.line_offsets = numpy.concatenate(
+            [file_offset + file_line_offsets[:-1] for file_offset,
+             file_line_offsets in zip(self.file_offsets, offsets)] +
+            [self.file_offsets[-1:]])
+
+    def close(self, state):
+        self.close_files()
+
+    def close_files(self):
+        """Closes the memory-mapped files.
+
+        They are mapped again by the next index request.
+
+        """
+        for mapped_file in self.__dict__.pop('_mapped_files', ()):
+            if isinstance(mapped_file, mmap.mmap):
+                mapped_file.close()
+
+    def __del__(self):
+        self.close_files()
+
+    @property
+    def num_examples(self):
+        return len(self.line_offsets) - 1
 
     def get_data(self, state=None, request=None):
         if request is not None:
-            raise ValueError
-        sentence = next(state)
+            return (self.read_sentences(request),)
+        while not state.examples:
+            state.examples.extend(self.numberize(state.read_block()))
+        state.sentences.popleft()
+        return (state.examples.popleft(),)
+
+    def read_sentences(self, request):
+        """Reads and numberizes sentences by their index.
+
+        Parameters
+        ----------
+        request : int, list or array of ints, or slice
+            The indices of the sentences in the files.
+
+        Returns
+        -------
+        sentences : ndarray or list of ndarrays
+            The numberized sentence, or a list of sentences if `request`
+            isn't a single index.
+
+        """
+        starts = self.line_offsets[:-1][request]
+        stops = self.line_offsets[1:][request]
+        single = not numpy.ndim(starts)
+        starts, stops = numpy.atleast_1d(starts, stops)
+        file_indices = numpy.searchsorted(self.file_offsets, starts,
+                                          side='right') - 1
+        starts = starts - self.file_offsets[file_indices]
+        stops = stops - self.file_offsets[file_indices]
+        lines = [self.mapped_files[file_index][start:stop]
+                 for file_index, start, stop in zip(
+                     file_indices.tolist(), starts.tolist(), stops.tolist())]
+        # The last lines of files can lack a line ending
+        sentences = self.numberize(b''.join(
+            line if line.endswith(b'\n') else line + b'\n'
+            for line in lines))
+        return sentences[0] if single else sentences
+
+    def numberize(self, block):
+        """Numberizes sentences.
+
+        Parameters
+        ----------
+        block : bytes
+            The encoded sentences, one per line.
+
+        Returns
+        -------
+        sentences : list of ndarrays
+            An `int32` array for each sentence, including the BOS and EOS
+            tokens. The arrays are views of a single array.
+
+        """
+        unk = self.dictionary[self.unk_token]
+        if (self.level == 'word' and self.preprocess is None and
+                codecs.lookup(locale.getpreferredencoding(False)).name ==
+                'utf-8'):
+            tokens, lengths = numberize_words(block, *self.vocabulary,
+                                              unk=unk)
+            return add_markers(
+                tokens, lengths,
+                self.dictionary[self.bos_token] if self.bos_token else None,
+                self.dictionary[self.eos_token] if self.eos_token else None)
+        lines = decode_lines(block)
         if self.preprocess is not None:
-            sentence = self.preprocess(sentence)
-        data = [self.dictionary[self.bos_token]] if self.bos_token else []
+            lines = [self.preprocess(line) for line in lines]
         if self.level == 'word':
-            data.extend(self.dictionary.get(word,
-                                            self.dictionary[self.unk_token])
-                        for word in sentence.split())
+            words = [line.split() for line in lines]
+            lengths = numpy.fromiter(map(len, words), dtype=int,
+                                     count=len(words))
+            # Looks up all words without running Python code per word
+            tokens = numpy.fromiter(
+                map(self.dictionary.get, chain.from_iterable(words),
+                    repeat(unk)), dtype='int32', count=lengths.sum())
+        else:
+            characters = [line.strip() for line in lines]
+            lengths = numpy.fromiter(map(len, characters), dtype=int,
+                                     count=len(characters))
+            tokens = lookup_characters(''.join(characters),
+                                       self.character_table)
+        return add_markers(
+            tokens, lengths,
+            self.dictionary[self.bos_token] if self.bos_token else None,
+            self.dictionary[self.eos_token] if self.eos_token else None)
+
+
+class TextBlocks(object):
+    """The state of an epoch over the lines of text files.
+
+    Reads the files in blocks of whole lines. The numberized sentences of
+    a block are queued in `examples`, and the file position at which each
+    of them starts in `sentences`, so that the state can be pickled
+    without the queued sentences, which are read again from their
+    position on unpickling.
+
+    Parameters
+    ----------
+    files : list of str
+        The names of the files.
+    block_size : int
+        The number of bytes to read at a time. Blocks are extended to the
+        end of their last line.
+
+    """
+    def __init__(self, files, block_size):
+        self.files = files
+        self.block_size = block_size
+        self.file_index = 0
+        self.position = 0
+        self.sentences = deque()
+        self.examples = deque()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.sentences:
+            state['file_index'], state['position'] = self.sentences[0]
+        state['sentences'] = deque()
+        state['examples'] = deque()
+        return state
+
+    def read_block(self):
+        """Reads the lines of the next block.
+
+        Returns
+        -------
+        block : bytes
+            The lines of the block, including their line endings. Their
+            positions are appended to :attr:`sentences`, and
+            :attr:`examples` is extended by the caller.
+
+        Raises
+        ------
+        StopIteration
+            When all files have been read.
+
+        """
+        while self.file_index < len(self.files):
+            with open(self.files[self.file_index], 'rb') as f:
+                f.seek(self.position)
+                block = f.read(self.block_size)
+                while block and not block.endswith(b'\n'):
+                    end = block.rfind(b'\n') + 1
+                    if end:
+                        block = block[:end]
+                        break
+                    more = f.read(self.block_size)
+                    if not more:
+                        break
+                    block += more
+            if block:
+                break
+            self.file_index += 1
+            self.position = 0
         else:
-            data.extend(self.dictionary.get(char,
-                                            self.dictionary[self.unk_token])
-                        for char in sentence.strip())
-        if self.eos_token:
-            data.append(self.dictionary[self.eos_token])
-        return (data,)
+            raise StopIteration
+        # Where each line of the block starts
+        starts = self.position + numpy.concatenate([[0], numpy.flatnonzero(
+            numpy.frombuffer(block, dtype='uint8') == ord('\n')) + 1])
+        if block.endswith(b'\n'):
+            starts = starts[:-1]
+        self.sentences.extend(zip(repeat(self.file_index), starts.tolist()))
+        self.position += len(block)
+        return block
+
+
+@do_not_pickle_attributes('tokens', 'offsets')
+class NumberizedText(Dataset):
+    """Sentences which were numberized ahead of time.
+
+    Reads the sentences stored by
+    :func:`~fuel.converters.base.fill_numberized_text`, e.g. the One
+    Billion Word sentences converted by ``fuel-convert
+    one_billion_word``. The tokens are memory-mapped, so sentences are
+    served without reading or parsing the whole corpus, and can be
+    requested in any order.
+
+    Parameters
+    ----------
+    path : str
+        The path of the HDF5 file.
+    dictionary : str or dict, optional
+        The dictionary, or the path to a pickled dictionary, the
+        sentences are expected to be numberized with. If given, it is
+        checked against the digest of the dictionary recorded in the
+        file.
+    bos_token : str or None, optional
+        The expected BOS token, ``<S>`` by default, see
+        :class:`TextFile`.
+    eos_token : str or None, optional
+        The expected EOS token, ``</S>`` by default.
+    unk_token : str, optional
+        The expected unknown token, ``<UNK>`` by default.
+    level : 'word' or 'character', optional
+        The expected level, 'word' by default.
+
+    Raises
+    ------
+    ValueError
+        If the settings recorded in the file differ from the expected
+        ones.
+
+    Notes
+    -----
+    Requests can be single indices, lists or arrays of indices, or
+    slices, so e.g. :class:`~fuel.schemes.ShuffledExampleScheme` or
+    :class:`~fuel.schemes.ShuffledScheme` iterate over the sentences in
+    a random order. A sentence is a read-only `int32` array, and a batch
+    a list of them.
+
+    """
+    provides_sources = ('features',)
+
+    def __init__(self, path, dictionary=None, bos_token='<S>',
+                 eos_token='</S>', unk_token='<UNK>', level='word',
+                 **kwargs):
+        self.path = path
+        if isinstance(dictionary, six.string_types):
+            with open(dictionary, 'rb') as f:
+                dictionary = cPickle.load(f)
+        expected = {'bos_token': bos_token, 'eos_token': eos_token,
+                    'unk_token': unk_token, 'level': level}
+        if dictionary is not None:
+            expected['dictionary_digest'] = dictionary_digest(dictionary)
+        # h5py is slow to import, so only do so when it is needed
+        import h5py
+        with h5py.File(path, 'r') as h5file:
+            if 'level' not in h5file.attrs:
+                raise ValueError('{} does not record how its sentences were '
+                                 'numberized'.format(path))
+            for name, value in sorted(expected.items()):
+                recorded = h5file.attrs.get(name)
+                if recorded != value:
+                    raise ValueError('{} was numberized with {} {!r}, not '
+                                     '{!r}'.format(path, name, recorded,
+                                                   value))
+        super(NumberizedText, self).__init__(**kwargs)
+        self.example_iteration_scheme = SequentialExampleScheme(
+            self.num_examples)
+
+    def load(self):
+        # h5py is slow to import, so only do so when it is needed
+        import h5py
+        with h5py.File(self.path, 'r') as h5file:
+            self.tokens = memory_map(h5file['tokens'])
+            self.offsets = memory_map(h5file['offsets'])
+
+    @property
+    def num_examples(self):
+        return len(self.offsets) - 1
+
+    def get_data(self, state=None, request=None):
+        if state is not None or request is None:
+            raise ValueError
+        starts = self.offsets[:-1][request]
+        stops = self.offsets[1:][request]
+        if not numpy.ndim(starts):
+            return (self.tokens[starts:stops],)
+        return ([self.tokens[start:stop]
+                 for start, stop in zip(starts.tolist(), stops.tolist())],)
+
+
+def dictionary_digest(dictionary):
+    """Returns a digest of a dictionary mapping tokens to integers.
+
+    The digest is recorded by
+    :func:`~fuel.converters.base.fill_numberized_text` instead of the
+    dictionary itself, which can be too large for an HDF5 attribute.
+
+    """
+    items = sorted((token.encode('utf-8')
+                    if isinstance(token, six.text_type) else token, number)
+                   for token, number in dictionary.items())
+    digest = hashlib.sha1()
+    for token, number in items:
+        digest.update('{} {} '.format(len(token), number).encode('ascii'))
+        digest.update(token)
+    return digest.hexdigest()
+
+
+def memory_map(dataset):
+    """Memory-maps a contiguous HDF5 dataset.
+
+    Datasets which can't be memory-mapped, because they are chunked or
+    empty, are read into memory instead.
+
+    """
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return dataset[...]
+    return numpy.asarray(numpy.memmap(
+        dataset.file.filename, dtype=dataset.dtype, mode='r',
+        offset=offset, shape=dataset.shape))
+
+
+def decode_lines(block):
+    """Decodes a block of lines like a file opened in text mode.
+
+    Returns the lines including their line endings, converting ``\r\n``
+    to ``\n``.
+
+    """
+    if six.PY3:
+        block = block.decode(locale.getpreferredencoding(False))
+    lines = block.replace('\r\n', '\n').split('\n')
+    if not block or block.endswith('\n'):
+        lines.pop()
+        return [line + '\n' for line in lines]
+    return [line + '\n' for line in lines[:-1]] + lines[-1:]
+
+
+def character_table(dictionary, unk_token):
+    """Maps code points to the numbers of the characters in a dictionary.
+
+    Characters which aren't in the dictionary, and code points beyond
+    the end of the table, are mapped to the number of `unk_token`.
+
+    """
+    unk = dictionary[unk_token]
+    characters = [(ord(token), number)
+                  for token, number in dictionary.items() if len(token) == 1]
+    code_points, numbers = (zip(*characters) if characters else ((), ()))
+    table = numpy.empty(max(code_points + (0,)) + 2, dtype='int32')
+    table[:] = unk
+    table[list(code_points)] = numbers
+    return table
+
+
+def lookup_characters(text, table):
+    """Numberizes the characters of a string with a lookup table."""
+    if isinstance(text, six.text_type):
+        code_points = numpy.frombuffer(text.encode('utf-32-le'),
+                                       dtype='<u4')
+    else:
+        code_points = numpy.frombuffer(text, dtype='uint8')
+    return table[numpy.minimum(code_points, len(table) - 1)]
+
+
+def add_markers(tokens, lengths, bos=None, eos=None):
+    """Splits tokens into sentences, adding BOS and EOS markers.
+
+    Parameters
+    ----------
+    tokens : ndarray
+        The tokens of all sentences.
+    lengths : ndarray
+        The number of tokens of each sentence.
+    bos : int, optional
+        The number of the BOS token. If not given, no BOS markers are
+        added.
+    eos : int, optional
+        The number of the EOS token. If not given, no EOS markers are
+        added.
+
+    Returns
+    -------
+    sentences : list of ndarrays
+        The sentences, as views of a single array.
+
+    """
+    if not len(lengths):
+        return []
+    num_markers = (bos is not None) + (eos is not None)
+    ends = numpy.cumsum(lengths + num_markers)
+    starts = ends - lengths - num_markers
+    out = numpy.empty(len(tokens) + num_markers * len(lengths),
+                      dtype=tokens.dtype)
+    # Shift the tokens of each sentence to make room for the markers
+    shifts = starts + (bos is not None) - (numpy.cumsum(lengths) - lengths)
+    out[numpy.arange(len(tokens)) + numpy.repeat(shifts, lengths)] = tokens
+    if bos is not None:
+        out[starts] = bos
+    if eos is not None:
+        out[ends - 1] = eos
+    return [out[start:end]
+            for start, end in zip(starts.tolist(), ends.tolist())]
@@ -1,5 +1,7 @@
 import six
 
+from fuel.schemes import skip_requests
+
 
 class DataIterator(six.Iterator):
     """An iterator over data, representing a single epoch.
@@ -15,12 +17,24 @@ class DataIterator(six.Iterator):
         If `True`, return dictionaries mapping source names to data
         from each source. If `False` (default), return tuples in the
         same order as `data_stream.sources`.
+    scheme_state : dict, optional
+        The state of the data stream's iteration scheme before
+        `request_iterator` was created, which is needed to resume the
+        epoch with :meth:`set_state`.
+
+    Attributes
+    ----------
+    position : int
+        The number of examples or batches returned so far.
 
     """
-    def __init__(self, data_stream, request_iterator=None, as_dict=False):
+    def __init__(self, data_stream, request_iterator=None, as_dict=False,
+                 scheme_state=None):
         self.data_stream = data_stream
         self.request_iterator = request_iterator
         self.as_dict = as_dict
+        self.scheme_state = scheme_state
+        self.position = 0
 
     def __iter__(self):
         return self
@@ -30,7 +44,62 @@ class DataIterator(six.Iterator):
             data = self.data_stream.get_data(next(self.request_iterator))
         else:
             data = self.data_stream.get_data()
+        self.position += 1
         if self.as_dict:
             return dict(zip(self.data_stream.sources, data))
         else:
             return data
+
+    def get_state(self):
+        """Returns the state of this epoch.
+
+        The state consists of the position in the epoch, the state of the
+        iteration scheme at the start of the epoch, and the state of the
+        data stream (see :meth:`.AbstractDataStream.get_state`). It
+        doesn't contain any data besides small buffers, so it is cheap
+        to store in a checkpoint.
+
+        Returns
+        -------
+        state : dict
+            A picklable dictionary, to be passed to :meth:`set_state`.
+
+        Examples
+        --------
+        >>> from fuel.datasets import IndexableDataset
+        >>> from fuel.schemes import ShuffledScheme
+        >>> from fuel.streams import DataStream
+        >>> stream = DataStream(IndexableDataset(list(range(10))),
+        ...                     iteration_scheme=ShuffledScheme(10, 2))
+        >>> iterator = stream.get_epoch_iterator()
+        >>> _ = next(iterator)
+        >>> state = iterator.get_state()
+        >>> expected = list(iterator)
+        >>> resumed = stream.get_epoch_iterator()
+        >>> resumed.set_state(state)
+        >>> list(resumed) == expected
+        True
+
+        """
+        return {'position': self.position, 'scheme': self.scheme_state,
+                'data_stream': self.data_stream.get_state()}
+
+    def set_state(self, state):
+        """Resumes the epoch from a state returned by :meth:`get_state`.
+
+        This must be called on a new epoch iterator of a data stream set
+        up in the same way as the one the state was taken from. Requests
+        are skipped without reading any data.
+
+        """
+        if self.position:
+            raise ValueError('the state can only be restored before the '
+                             'epoch iterator is used')
+        if state['scheme'] is not None:
+            iteration_scheme = self.data_stream.iteration_scheme
+            iteration_scheme.set_state(state['scheme'])
+            self.scheme_state = state['scheme']
+            self.request_iterator = skip_requests(
+                iteration_scheme.get_request_iterator(), state['position'])
+        self.data_stream.set_state(state['data_stream'])
+        self.position = state['position']
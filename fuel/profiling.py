@@ -0,0 +1,275 @@
+"""Profiling of data stream graphs.
+
+A :class:`Profiler` attaches to a data stream and to everything it
+wraps (transformers, data streams and datasets) and records how much
+time and memory each of them spends on producing data. Nothing is
+instrumented outside of the ``with`` block, so a pipeline that is not
+being profiled runs at full speed.
+
+"""
+from __future__ import division
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+#: Attributes through which data streams and datasets refer to the
+#: objects they read data from
+CHILD_ATTRIBUTES = ('data_stream', 'data_streams', 'dataset')
+
+
+class ProfileNode(object):
+    """Statistics of a single data stream or dataset.
+
+    Parameters
+    ----------
+    name : str
+        The name of the profiled object, e.g. its class name.
+
+    Attributes
+    ----------
+    children : list of :class:`ProfileNode`
+        The nodes of the objects this object reads data from.
+    calls : int
+        The number of times data was returned.
+    wall_time : float
+        The total time spent producing data, in seconds, including
+        calls that ended the epoch.
+    exclusive_time : float
+        The part of `wall_time` that was not spent in any of the
+        children.
+    bytes : int
+        The total size of the NumPy arrays produced, in bytes.
+    peak_allocation : int
+        The largest amount of memory allocated during a single call, in
+        bytes. Only recorded when memory tracking is enabled.
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.children = []
+        self.calls = 0
+        self.wall_time = 0.
+        self.exclusive_time = 0.
+        self.bytes = 0
+        self.peak_allocation = 0
+
+    def to_dict(self):
+        """Returns the statistics of this node and its children."""
+        return OrderedDict([
+            ('name', self.name), ('calls', self.calls),
+            ('wall_time', self.wall_time),
+            ('exclusive_time', self.exclusive_time), ('bytes', self.bytes),
+            ('peak_allocation', self.peak_allocation),
+            ('children', [child.to_dict() for child in self.children])])
+
+
+class Profiler(object):
+    """Records the time and memory spent in each node of a stream graph.
+
+    The graph is discovered by following the ``data_stream``,
+    ``data_streams`` and ``dataset`` attributes, starting from the given
+    data stream. Within the ``with`` block, every ``get_data`` (and
+    ``get_block``) call of these objects is timed, and the total size of
+    the arrays it returns is recorded.
+
+    Parameters
+    ----------
+    data_stream : :class:`.AbstractDataStream`
+        The outermost data stream of the graph to profile.
+    track_memory : bool, optional
+        If ``True``, use :mod:`tracemalloc` to record the peak memory
+        allocated by each node. This slows down all allocations, so the
+        time measurements become less accurate. Requires Python 3.9 or
+        later. Defaults to ``False``.
+    trace : bool, optional
+        If ``True`` (default), every call is recorded as well, so that it
+        can be exported with :meth:`chrome_trace`.
+
+    Notes
+    -----
+    Profiling is per process: data read in the background process of a
+    :class:`.MultiProcessing` transformer or by a data server is not
+    attributed to the nodes that produced it. Data streams cannot be
+    pickled while they are being profiled.
+
+    Examples
+    --------
+    >>> from fuel.datasets import IndexableDataset
+    >>> from fuel.schemes import SequentialScheme
+    >>> from fuel.streams import DataStream
+    >>> from fuel.transformers import ScaleAndShift
+    >>> dataset = IndexableDataset({'features': numpy.ones((100, 10))})
+    >>> stream = ScaleAndShift(DataStream(
+    ...     dataset, iteration_scheme=SequentialScheme(100, 10)), 2, 1)
+    >>> with Profiler(stream) as profiler:
+    ...     for batch in stream.get_epoch_iterator():
+    ...         pass
+    >>> profiler.root.name, profiler.root.calls
+    ('ScaleAndShift', 10)
+    >>> [node.name for node in profiler.root.children]
+    ['DataStream']
+
+    """
+    def __init__(self, data_stream, track_memory=False, trace=True):
+        if track_memory and not hasattr(tracemalloc, 'reset_peak'):
+            raise ValueError('memory tracking requires Python 3.9 or later')
+        self.data_stream = data_stream
+        self.track_memory = track_memory
+        self.trace = trace
+        self.events = []
+        self._local = threading.local()
+        self._instrumented = []
+        self._nodes = {}
+        self.root = self._build_graph(data_stream)
+
+    def _build_graph(self, obj):
+        if id(obj) in self._nodes:
+            return self._nodes[id(obj)][0]
+        node = ProfileNode(type(obj).__name__)
+        self._nodes[id(obj)] = (node, obj)
+        for attribute in CHILD_ATTRIBUTES:
+            children = getattr(obj, attribute, None)
+            if children is None:
+                continue
+            if attribute != 'data_streams':
+                children = [children]
+            node.children.extend(self._build_graph(child)
+                                 for child in children)
+        return node
+
+    def __enter__(self):
+        self._start = time.time()
+        if self.track_memory:
+            self._tracing_memory = not tracemalloc.is_tracing()
+            if self._tracing_memory:
+                tracemalloc.start()
+        for node, obj in self._nodes.values():
+            for method_name in ('get_data', 'get_block'):
+                if hasattr(obj, method_name):
+                    self._instrument(obj, method_name, node)
+        return self
+
+    def __exit__(self, *exc_info):
+        for obj, method_name, method in self._instrumented:
+            if method is None:
+                delattr(obj, method_name)
+            else:
+                setattr(obj, method_name, method)
+        self._instrumented = []
+        if self.track_memory and self._tracing_memory:
+            tracemalloc.stop()
+
+    def _instrument(self, obj, method_name, node):
+        method = getattr(obj, method_name)
+
+        def profiled(*args, **kwargs):
+            return self._call(node, method, args, kwargs)
+        # Remember methods set on the instance, e.g. by another profiler
+        self._instrumented.append(
+            (obj, method_name, obj.__dict__.get(method_name)))
+        setattr(obj, method_name, profiled)
+
+    def _call(self, node, method, args, kwargs):
+        stack = self._local.__dict__.setdefault('stack', [])
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][2] = max(stack[-1][2], peak)
+            tracemalloc.reset_peak()
+            frame = [node, 0., current, current]
+        else:
+            frame = [node, 0., 0, 0]
+        stack.append(frame)
+        start = time.time()
+        try:
+            data = method(*args, **kwargs)
+        finally:
+            wall_time = time.time() - start
+            stack.pop()
+            node.wall_time += wall_time
+            node.exclusive_time += wall_time - frame[1]
+            if stack:
+                stack[-1][1] += wall_time
+            if self.track_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                frame[2] = max(frame[2], peak)
+                node.peak_allocation = max(node.peak_allocation,
+                                           frame[2] - frame[3])
+                if stack:
+                    stack[-1][2] = max(stack[-1][2], frame[2])
+        num_bytes = _num_bytes(data)
+        node.calls += 1
+        node.bytes += num_bytes
+        if self.trace:
+            self.events.append((node.name, start - self._start, wall_time,
+                                threading.current_thread().ident,
+                                num_bytes))
+        return data
+
+    def report(self):
+        """Returns a table with the statistics of each node as a string.
+
+        Children are indented below the node that reads from them. Times
+        are given in milliseconds per call, and sizes in megabytes.
+
+        """
+        columns = ('calls', 'wall (ms)', 'excl (ms)', 'MB out', 'peak MB')
+        lines = [('{:<40}' + '{:>11}' * len(columns)).format(
+            'node', *columns)]
+
+        def add_lines(node, depth):
+            calls = max(node.calls, 1)
+            name = '  ' * depth + node.name
+            lines.append(
+                '{:<40}{:>11}{:>11.3f}{:>11.3f}{:>11.2f}{:>11.2f}'.format(
+                    name[:40], node.calls, 1000 * node.wall_time / calls,
+                    1000 * node.exclusive_time / calls, node.bytes / 1e6,
+                    node.peak_allocation / 1e6))
+            for child in node.children:
+                add_lines(child, depth + 1)
+        add_lines(self.root, 0)
+        return '\n'.join(lines)
+
+    def chrome_trace(self, filename=None):
+        """Returns the recorded calls in the Chrome trace event format.
+
+        The result can be loaded in ``chrome://tracing`` or Perfetto.
+
+        Parameters
+        ----------
+        filename : str, optional
+            If given, the trace is written to this file as JSON.
+
+        Returns
+        -------
+        trace : dict
+            The trace, which can be serialized with :func:`json.dump`.
+
+        """
+        trace = {'traceEvents': [
+            {'name': name, 'ph': 'X', 'ts': 1e6 * start,
+             'dur': 1e6 * duration, 'pid': 0, 'tid': thread,
+             'args': {'bytes': num_bytes}}
+            for name, start, duration, thread, num_bytes in self.events]}
+        if filename is not None:
+            with open(filename, 'w') as f:
+                json.dump(trace, f)
+        return trace
+
+
+def _num_bytes(data):
+    """Returns the total size of the NumPy arrays in `data`."""
+    if isinstance(data, numpy.ndarray):
+        return data.nbytes
+    if isinstance(data, (tuple, list)):
+        return sum(source_data.nbytes for source_data in data
+                   if isinstance(source_data, numpy.ndarray))
+    return 0
@@ -1,9 +1,11 @@
 from abc import ABCMeta, abstractmethod
 from collections import Iterable
+from itertools import islice
 
 import numpy
 from picklable_itertools import chain, repeat, imap, iter_
 from picklable_itertools.extras import partition_all
+import six
 from six import add_metaclass
 from six.moves import xrange
 
@@ -34,6 +36,11 @@ class IterationScheme(object):
     different data streams, because it would make experiments harder to
     reproduce.
 
+    The state of a scheme (see :meth:`get_state`) determines the request
+    iterator it returns next. Together with the number of requests taken
+    from that iterator, it is enough to resume an epoch (see
+    :meth:`.DataIterator.get_state`).
+
     .. _iterator protocol:
        https://docs.python.org/3.3/library/stdtypes.html#iterator-types
 
@@ -42,6 +49,70 @@ class IterationScheme(object):
     def get_request_iterator(self):
         """Returns an iterator type."""
 
+    def get_state(self):
+        """Returns the state of the scheme.
+
+        Returns
+        -------
+        state : dict
+            A small, picklable dictionary. For schemes with a random
+            number generator `rng`, this contains the state of the
+            generator.
+
+        """
+        rng = getattr(self, 'rng', None)
+        if rng is None:
+            return {}
+        return {'rng': rng.get_state()}
+
+    def set_state(self, state):
+        """Restores a state returned by :meth:`get_state`."""
+        if 'rng' in state:
+            self.rng.set_state(state['rng'])
+
+
+class Shardable(object):
+    """Mixin for schemes whose indices can be split across workers.
+
+    For data-parallel training, each worker creates the same scheme (with
+    the same seed, if it is shuffled) with a different `shard_index`. All
+    workers then iterate over the same order of indices, e.g. the same
+    permutation, and each keeps a disjoint piece of it (see
+    :func:`shard_indices`).
+
+    Parameters
+    ----------
+    num_shards : int, optional
+        The number of shards. Defaults to 1, i.e. no sharding.
+    shard_index : int, optional
+        The shard to iterate over, from 0 to ``num_shards - 1``. Defaults
+        to 0.
+    strided_shards : bool, optional
+        If `True`, shards take every `num_shards`-th index instead of a
+        contiguous piece. Defaults to `False`.
+    equal_shards : bool, optional
+        If `True`, the remaining indices are dropped so that all shards
+        have the same number of indices, and hence of batches. Defaults
+        to `False`, in which case shard sizes differ by at most one.
+
+    """
+    def _init_shards(self, num_shards, shard_index, strided_shards,
+                     equal_shards):
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('shard_index must be between 0 and '
+                             'num_shards - 1')
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.strided_shards = strided_shards
+        self.equal_shards = equal_shards
+
+    def shard(self, indices):
+        """Returns this scheme's shard of `indices`."""
+        if self.num_shards == 1:
+            return indices
+        return shard_indices(indices, self.num_shards, self.shard_index,
+                             self.strided_shards, self.equal_shards)
+
 
 @add_metaclass(ABCMeta)
 class BatchSizeScheme(IterationScheme):
@@ -57,7 +128,7 @@ class BatchSizeScheme(IterationScheme):
 
 
 @add_metaclass(ABCMeta)
-class BatchScheme(IterationScheme):
+class BatchScheme(IterationScheme, Shardable):
     """Iteration schemes that return slices or indices for batches.
 
     For datasets where the number of examples is known and easily
@@ -80,16 +151,29 @@ class BatchScheme(IterationScheme):
         smaller than `batch_size`. If you want to ensure all batches are
         of equal size, then ensure len(`examples`) or `examples` is a
         multiple of `batch_size`.
+    array_requests : bool, optional
+        If `True`, batches are requested as NumPy arrays of indices, or as
+        slices when the indices of a batch are contiguous, instead of as
+        lists. This avoids converting requests back and forth between lists
+        and arrays. Defaults to `False`.
+    num_shards, shard_index, strided_shards, equal_shards : optional
+        Iterate over a single shard of the examples, see
+        :class:`Shardable`.
 
     """
     requests_examples = False
 
-    def __init__(self, examples, batch_size):
+    def __init__(self, examples, batch_size, array_requests=False,
+                 num_shards=1, shard_index=0, strided_shards=False,
+                 equal_shards=False):
         if isinstance(examples, Iterable):
             self.indices = examples
         else:
             self.indices = xrange(examples)
         self.batch_size = batch_size
+        self.array_requests = array_requests
+        self._init_shards(num_shards, shard_index, strided_shards,
+                          equal_shards)
 
 
 class ConcatenatedScheme(IterationScheme):
@@ -119,26 +203,45 @@ class ConcatenatedScheme(IterationScheme):
     def get_request_iterator(self):
         return chain(*[sch.get_request_iterator() for sch in self.schemes])
 
+    def get_state(self):
+        return {'schemes': [scheme.get_state() for scheme in self.schemes]}
+
+    def set_state(self, state):
+        for scheme, scheme_state in zip(self.schemes, state['schemes']):
+            scheme.set_state(scheme_state)
+
     @property
     def requests_examples(self):
         return self.schemes[0].requests_examples
 
 
 @add_metaclass(ABCMeta)
-class IndexScheme(IterationScheme):
+class IndexScheme(IterationScheme, Shardable):
     """Iteration schemes that return single indices.
 
     This is for datasets that support indexing (like :class:`BatchScheme`)
     but where we want to return single examples instead of batches.
 
+    Parameters
+    ----------
+    examples : int or list
+        Defines which examples from the dataset are iterated, see
+        :class:`BatchScheme`.
+    num_shards, shard_index, strided_shards, equal_shards : optional
+        Iterate over a single shard of the examples, see
+        :class:`Shardable`.
+
     """
     requests_examples = True
 
-    def __init__(self, examples):
+    def __init__(self, examples, num_shards=1, shard_index=0,
+                 strided_shards=False, equal_shards=False):
         if isinstance(examples, Iterable):
             self.indices = examples
         else:
             self.indices = xrange(examples)
+        self._init_shards(num_shards, shard_index, strided_shards,
+                          equal_shards)
 
 
 class ConstantScheme(BatchSizeScheme):
@@ -187,9 +290,21 @@ class SequentialScheme(BatchScheme):
     -----
     The batch size isn't enforced, so the last batch could be smaller.
 
+    If `array_requests` is `True` and the examples are given as an
+    integer (or a range with a positive step), slices are requested.
+
     """
     def get_request_iterator(self):
-        return imap(list, partition_all(self.batch_size, self.indices))
+        indices = self.shard(self.indices)
+        if not self.array_requests:
+            return imap(list, partition_all(self.batch_size, indices))
+        if isinstance(indices, xrange):
+            start, step, num_indices = range_parameters(indices)
+            if step > 0:
+                return SliceIterator(start, step, num_indices,
+                                     self.batch_size)
+        return PermutationIterator(index_array(indices),
+                                   self.batch_size, array_requests=True)
 
 
 class ShuffledScheme(BatchScheme):
@@ -208,9 +323,11 @@ class ShuffledScheme(BatchScheme):
     -----
     The batch size isn't enforced, so the last batch could be smaller.
 
-    Shuffling the batches requires creating a shuffled list of indices in
-    memory. This can be memory-intensive for very large numbers of examples
-    (i.e. in the order of tens of millions).
+    Shuffling the batches requires creating a shuffled array of indices in
+    memory. If the examples are given as an integer (or a range), this is
+    a NumPy array of 32-bit integers (64-bit for very large datasets),
+    i.e. 4 to 8 bytes per example. For datasets with hundreds of millions
+    of examples, consider :class:`LazyShuffledScheme` instead.
 
     """
     def __init__(self, *args, **kwargs):
@@ -221,12 +338,56 @@ class ShuffledScheme(BatchScheme):
         super(ShuffledScheme, self).__init__(*args, **kwargs)
 
     def get_request_iterator(self):
-        indices = list(self.indices)
+        indices = index_array(self.indices)
         self.rng.shuffle(indices)
-        if self.sorted_indices:
-            return imap(sorted, partition_all(self.batch_size, indices))
-        else:
-            return imap(list, partition_all(self.batch_size, indices))
+        return PermutationIterator(self.shard(indices), self.batch_size,
+                                   self.sorted_indices, self.array_requests)
+
+
+class LazyShuffledScheme(BatchScheme):
+    """Shuffled batches iterator using constant memory.
+
+    Instead of shuffling an array of indices, this scheme permutes the
+    positions ``[0, n)`` with a keyed pseudo-random bijection (a Feistel
+    network) which is evaluated lazily, one batch at a time. This makes
+    shuffled iteration possible over hundreds of millions of examples.
+
+    Parameters
+    ----------
+    sorted_indices : bool, optional
+        If `True`, enforce that indices within a batch are ordered.
+        Defaults to `False`.
+    rounds : int, optional
+        The number of Feistel rounds to use. Defaults to 4.
+
+    Notes
+    -----
+    The batch size isn't enforced, so the last batch could be smaller.
+
+    New keys for the permutation are drawn from `rng` each time a request
+    iterator is created, so the order of examples changes every epoch and
+    is reproducible given the seed of `rng`. The request iterator can be
+    pickled at any point during the epoch.
+
+    The permutation is not a uniformly random one, but it is more than
+    adequate for the purpose of stochastic optimization.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self.rng = kwargs.pop('rng', None)
+        if self.rng is None:
+            self.rng = numpy.random.RandomState(config.default_seed)
+        self.sorted_indices = kwargs.pop('sorted_indices', False)
+        self.rounds = kwargs.pop('rounds', 4)
+        super(LazyShuffledScheme, self).__init__(*args, **kwargs)
+
+    def get_request_iterator(self):
+        permutation = FeistelPermutation(
+            len(self.indices), self.rng.randint(2 ** 31 - 1,
+                                                size=self.rounds))
+        return LazyPermutationIterator(
+            permutation, self.indices, self.batch_size, self.sorted_indices,
+            self.array_requests, self.shard(xrange(len(self.indices))))
 
 
 class SequentialExampleScheme(IndexScheme):
@@ -236,7 +397,7 @@ class SequentialExampleScheme(IndexScheme):
 
     """
     def get_request_iterator(self):
-        return iter_(self.indices)
+        return iter_(self.shard(self.indices))
 
 
 class ShuffledExampleScheme(IndexScheme):
@@ -252,9 +413,9 @@ class ShuffledExampleScheme(IndexScheme):
         super(ShuffledExampleScheme, self).__init__(*args, **kwargs)
 
     def get_request_iterator(self):
-        indices = list(self.indices)
+        indices = index_array(self.indices)
         self.rng.shuffle(indices)
-        return iter_(indices)
+        return PermutationIterator(self.shard(indices))
 
 
 def cross_validation(scheme_class, num_examples, num_folds, strict=True,
@@ -303,3 +464,363 @@ def cross_validation(scheme_class, num_examples, num_folds, strict=True,
             yield (train, valid)
         else:
             yield (train, valid, end - begin)
+
+
+def skip_requests(request_iterator, num_requests):
+    """Advance a request iterator without reading any data.
+
+    Parameters
+    ----------
+    request_iterator : iterator
+        A request iterator returned by an iteration scheme.
+    num_requests : int
+        The number of requests to skip.
+
+    Returns
+    -------
+    request_iterator : iterator
+        The advanced request iterator.
+
+    Notes
+    -----
+    Iterators which have a `skip` method, such as the ones returned by
+    shuffled schemes and by schemes with `array_requests`, are advanced
+    in constant time. Other iterators are advanced by generating and
+    discarding the requests.
+
+    """
+    if hasattr(request_iterator, 'skip'):
+        request_iterator.skip(num_requests)
+    else:
+        next(islice(request_iterator, num_requests, num_requests), None)
+    return request_iterator
+
+
+def index_array(indices):
+    """Return the indices of a scheme as a new NumPy array.
+
+    Parameters
+    ----------
+    indices : iterable
+        The indices of an iteration scheme. Ranges are converted without
+        going through a list, and use 32-bit integers when possible.
+
+    Returns
+    -------
+    array : :class:`numpy.ndarray`
+        A freshly allocated array, which can safely be shuffled in place.
+
+    """
+    if isinstance(indices, xrange):
+        start, step, num_indices = range_parameters(indices)
+        last = start + step * (num_indices - 1) if num_indices else 0
+        if max(abs(start), abs(last)) < 2 ** 31:
+            dtype = numpy.int32
+        else:
+            dtype = numpy.int64
+        return numpy.arange(start, start + step * num_indices, step,
+                            dtype=dtype)[:num_indices]
+    if isinstance(indices, numpy.ndarray):
+        return indices.copy()
+    return numpy.array(list(indices))
+
+
+def range_parameters(indices):
+    """Return the start, step and length of a range.
+
+    Python 2's ``xrange`` objects don't expose their start and step, so
+    these are recovered by indexing.
+
+    """
+    num_indices = len(indices)
+    start = indices[0] if num_indices else 0
+    step = indices[1] - indices[0] if num_indices > 1 else 1
+    return start, step, num_indices
+
+
+def shard_indices(indices, num_shards, shard_index, strided=False,
+                  equal=False):
+    """Return one of `num_shards` disjoint pieces of a sequence of indices.
+
+    Parameters
+    ----------
+    indices : range or sequence
+        The indices to split, e.g. a permutation of the examples.
+    num_shards : int
+        The number of shards.
+    shard_index : int
+        The shard to return, from 0 to ``num_shards - 1``.
+    strided : bool, optional
+        If `True`, the shard consists of every `num_shards`-th index
+        starting at `shard_index`. Otherwise (the default) it is a
+        contiguous piece of `indices`.
+    equal : bool, optional
+        If `True`, the last ``len(indices) % num_shards`` indices are
+        left out of all shards, so that shards are of equal size.
+        Defaults to `False`, in which case the sizes of shards differ by
+        at most one.
+
+    Returns
+    -------
+    shard : range or sequence
+        A range if `indices` is a range, a slice of `indices` otherwise.
+
+    Examples
+    --------
+    >>> list(shard_indices(range(10), 3, 0))
+    [0, 1, 2]
+    >>> list(shard_indices(range(10), 3, 2))
+    [6, 7, 8, 9]
+    >>> list(shard_indices(range(10), 3, 2, strided=True, equal=True))
+    [2, 5, 8]
+
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError('shard_index must be between 0 and num_shards - 1')
+    if not hasattr(indices, '__len__'):
+        indices = list(indices)
+    num_indices = len(indices)
+    if equal:
+        num_indices -= num_indices % num_shards
+    if strided:
+        positions = slice(shard_index, num_indices, num_shards)
+    else:
+        positions = slice(num_indices * shard_index // num_shards,
+                          num_indices * (shard_index + 1) // num_shards)
+    if isinstance(indices, xrange):
+        start, step, _ = range_parameters(indices)
+        first, stop, stride = positions.indices(num_indices)
+        return xrange(start + step * first, start + step * stop,
+                      step * stride)
+    return indices[positions]
+
+
+def batch_request(batch):
+    """Return the most compact request for an array of indices.
+
+    Parameters
+    ----------
+    batch : :class:`numpy.ndarray`
+        A 1-dimensional array of integer indices.
+
+    Returns
+    -------
+    request : slice or :class:`numpy.ndarray`
+        A slice if the indices are contiguous and increasing, `batch`
+        itself otherwise.
+
+    """
+    if (len(batch) and batch.dtype.kind in 'iu' and batch[0] >= 0 and
+            batch[-1] - batch[0] == len(batch) - 1 and
+            (len(batch) < 3 or (numpy.diff(batch) == 1).all())):
+        return slice(int(batch[0]), int(batch[-1]) + 1)
+    return batch
+
+
+class SliceIterator(six.Iterator):
+    """Iterate over a range in batches of slices.
+
+    Parameters
+    ----------
+    start : int
+        The first index of the range.
+    step : int
+        The (positive) step of the range.
+    num_indices : int
+        The number of indices in the range.
+    batch_size : int
+        The maximum number of indices per slice.
+
+    """
+    def __init__(self, start, step, num_indices, batch_size):
+        self.start = start
+        self.step = step
+        self.num_indices = num_indices
+        self.batch_size = batch_size
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= self.num_indices:
+            raise StopIteration
+        stop = min(self.position + self.batch_size, self.num_indices)
+        request = slice(self.start + self.step * self.position,
+                        self.start + self.step * stop,
+                        self.step if self.step != 1 else None)
+        self.position = stop
+        return request
+
+    def skip(self, num_requests):
+        """Skip the next `num_requests` requests."""
+        self.position = min(self.position + num_requests * self.batch_size,
+                            self.num_indices)
+
+
+class PermutationIterator(six.Iterator):
+    """Iterate over an array of indices as examples or batches.
+
+    Parameters
+    ----------
+    indices : :class:`numpy.ndarray`
+        The (shuffled) indices to iterate over.
+    batch_size : int, optional
+        If given, requests are lists of at most `batch_size` indices.
+        Otherwise single indices are returned.
+    sorted_indices : bool, optional
+        If `True`, indices within a batch are sorted. Defaults to `False`.
+    array_requests : bool, optional
+        If `True`, batches are returned as arrays or slices (see
+        :func:`batch_request`) instead of lists. Defaults to `False`.
+
+    Notes
+    -----
+    Requests are converted to Python integers one batch at a time, so
+    that the whole index array is never materialized as Python objects.
+    The iterator only consists of the array and a position, so it can be
+    pickled mid-epoch.
+
+    """
+    def __init__(self, indices, batch_size=None, sorted_indices=False,
+                 array_requests=False):
+        self.indices = indices
+        self.batch_size = batch_size
+        self.sorted_indices = sorted_indices
+        self.array_requests = array_requests
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self.indices):
+            raise StopIteration
+        if self.batch_size is None:
+            self.position += 1
+            return self.indices[self.position - 1].item()
+        batch = self.indices[self.position:self.position + self.batch_size]
+        self.position += self.batch_size
+        if self.sorted_indices:
+            batch = numpy.sort(batch)
+        if self.array_requests:
+            return batch_request(batch)
+        return batch.tolist()
+
+    def skip(self, num_requests):
+        """Skip the next `num_requests` requests."""
+        self.position = min(
+            self.position + num_requests * (self.batch_size or 1),
+            len(self.indices))
+
+
+class FeistelPermutation(object):
+    """A keyed pseudo-random permutation of ``[0, num_elements)``.
+
+    The permutation is computed by a balanced Feistel network on the
+    smallest domain of ``4 ** k`` elements that contains `num_elements`.
+    Values falling outside of ``[0, num_elements)`` are encrypted again
+    until they fall inside of it ("cycle walking"), which preserves
+    bijectivity.
+
+    Parameters
+    ----------
+    num_elements : int
+        The size of the permuted range.
+    keys : iterable of int
+        One key per Feistel round.
+
+    """
+    def __init__(self, num_elements, keys):
+        self.num_elements = num_elements
+        self.keys = [numpy.uint64(key) for key in keys]
+        bits = max(1, (int(num_elements) - 1).bit_length())
+        self.half_bits = numpy.uint64((bits + 1) // 2)
+        self.mask = numpy.uint64((1 << int(self.half_bits)) - 1)
+
+    def __call__(self, positions):
+        """Return the images of an array of positions."""
+        values = self._encrypt(numpy.asarray(positions, dtype=numpy.uint64))
+        outside = values >= self.num_elements
+        while outside.any():
+            values[outside] = self._encrypt(values[outside])
+            outside = values >= self.num_elements
+        return values.astype(numpy.int64)
+
+    def _encrypt(self, values):
+        left = values >> self.half_bits
+        right = values & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half_bits) | right
+
+    def _round(self, values, key):
+        # A multiply-xorshift hash, as used by e.g. SplitMix64
+        values = (values + key) * numpy.uint64(0x9E3779B97F4A7C15)
+        values ^= values >> numpy.uint64(30)
+        values *= numpy.uint64(0xBF58476D1CE4E5B9)
+        values ^= values >> numpy.uint64(27)
+        return values & self.mask
+
+
+class LazyPermutationIterator(six.Iterator):
+    """Iterate over batches of a lazily evaluated permutation.
+
+    Parameters
+    ----------
+    permutation : :class:`FeistelPermutation`
+        The permutation of the positions ``[0, len(indices))``.
+    indices : range or sequence
+        The indices being permuted.
+    batch_size : int
+        The maximum number of indices per batch.
+    sorted_indices : bool, optional
+        If `True`, indices within a batch are sorted. Defaults to `False`.
+    array_requests : bool, optional
+        If `True`, batches are returned as arrays or slices (see
+        :func:`batch_request`) instead of lists. Defaults to `False`.
+    positions : range, optional
+        The positions of the permutation to iterate over, e.g. a shard
+        (see :func:`shard_indices`). Defaults to all of them.
+
+    """
+    def __init__(self, permutation, indices, batch_size,
+                 sorted_indices=False, array_requests=False,
+                 positions=None):
+        self.permutation = permutation
+        self.indices = indices
+        self.batch_size = batch_size
+        self.sorted_indices = sorted_indices
+        self.array_requests = array_requests
+        if positions is None:
+            positions = xrange(permutation.num_elements)
+        self.positions = positions
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        num_positions = len(self.positions)
+        if self.position >= num_positions:
+            raise StopIteration
+        stop = min(self.position + self.batch_size, num_positions)
+        start, step, _ = range_parameters(self.positions)
+        batch = self.permutation(
+            start + step * numpy.arange(self.position, stop))
+        self.position = stop
+        if isinstance(self.indices, xrange):
+            start, step, _ = range_parameters(self.indices)
+            batch = start + step * batch
+        else:
+            batch = numpy.array([self.indices[i] for i in batch.tolist()])
+        if self.sorted_indices:
+            batch = numpy.sort(batch)
+        if self.array_requests:
+            return batch_request(batch)
+        return batch.tolist()
+
+    def skip(self, num_requests):
+        """Skip the next `num_requests` requests."""
+        self.position = min(self.position + num_requests * self.batch_size,
+                            len(self.positions))
@@ -1,10 +1,8 @@
 from abc import ABCMeta, abstractmethod
 
-import zmq
 from six import add_metaclass, iteritems
 
 from fuel.iterator import DataIterator
-from fuel.server import recv_arrays
 
 
 @add_metaclass(ABCMeta)
@@ -28,6 +26,14 @@ class AbstractDataStream(object):
     axis_labels : dict, optional
         Maps source names to tuples of strings describing axis semantics,
         one per axis. Defaults to `None`, i.e. no information is available.
+    owns_buffers : bool, optional
+        Declares that the arrays returned by this data stream are freshly
+        allocated and not referenced anywhere else, so that transformers
+        wrapping it are free to overwrite them (see e.g.
+        :class:`.ScaleAndShift`). Only set this if the dataset is known to
+        return copies, e.g. an out-of-memory :class:`.H5PYDataset`, but
+        not an in-memory dataset requested with slices, which returns
+        views. Defaults to `False`.
 
     Attributes
     ----------
@@ -40,11 +46,21 @@ class AbstractDataStream(object):
     produces_examples : bool
         Whether this data stream produces examples (as opposed to batches
         of examples).
+    produces_blocks : bool
+        Whether this data stream, although it produces examples, can hand
+        out several consecutive examples at once through
+        :meth:`get_block`. Consumers such as :class:`.Batch` use this to
+        avoid dispatching each example separately. Defaults to `False`.
 
     """
-    def __init__(self, iteration_scheme=None, axis_labels=None):
+    owns_buffers = False
+    produces_blocks = False
+
+    def __init__(self, iteration_scheme=None, axis_labels=None,
+                 owns_buffers=False):
         self.iteration_scheme = iteration_scheme
         self.axis_labels = axis_labels
+        self.owns_buffers = owns_buffers
 
     @property
     def produces_examples(self):
@@ -78,6 +94,33 @@ class AbstractDataStream(object):
 
         """
 
+    def get_block(self, max_examples):
+        """Request a block of consecutive examples.
+
+        Only supported by data streams for which :attr:`produces_blocks`
+        is ``True``. Examples returned by :meth:`get_block` and
+        :meth:`get_data` are taken from the same epoch, so both methods
+        can be mixed.
+
+        Parameters
+        ----------
+        max_examples : int
+            The maximum number of examples to return.
+
+        Returns
+        -------
+        block : tuple
+            One batch (e.g. an array or a list) per source, containing at
+            least one and at most `max_examples` examples.
+
+        Raises
+        ------
+        StopIteration
+            When the epoch is over.
+
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def reset(self):
         """Reset the data stream."""
@@ -92,9 +135,39 @@ class AbstractDataStream(object):
 
     @abstractmethod
     def get_epoch_iterator(self, as_dict=False):
-        return DataIterator(self, self.iteration_scheme.get_request_iterator()
-                            if self.iteration_scheme else None,
-                            as_dict=as_dict)
+        if not self.iteration_scheme:
+            return DataIterator(self, None, as_dict=as_dict)
+        scheme_state = self.iteration_scheme.get_state()
+        return DataIterator(self, self.iteration_scheme.get_request_iterator(),
+                            as_dict=as_dict, scheme_state=scheme_state)
+
+    def get_state(self):
+        """Returns the state of the data stream within the current epoch.
+
+        Used by :meth:`.DataIterator.get_state` to checkpoint an epoch.
+        The state should be small: e.g. positions and leftover examples
+        instead of the data that was read so far.
+
+        Returns
+        -------
+        state : dict
+            A picklable dictionary, to be passed to :meth:`set_state`.
+
+        """
+        raise NotImplementedError(
+            "{} does not support resuming epochs".format(
+                self.__class__.__name__))
+
+    def set_state(self, state):
+        """Restores a state returned by :meth:`get_state`.
+
+        Called by :meth:`.DataIterator.set_state` on a data stream whose
+        epoch iterator was just created.
+
+        """
+        raise NotImplementedError(
+            "{} does not support resuming epochs".format(
+                self.__class__.__name__))
 
     def iterate_epochs(self, as_dict=False):
         """Allow iteration through all epochs.
@@ -124,6 +197,13 @@ class DataStream(AbstractDataStream):
     dataset : instance of :class:`Dataset`
         The dataset from which the data is fetched.
 
+    Notes
+    -----
+    When an epoch without iteration scheme is resumed (see
+    :meth:`get_state`), the dataset is fast-forwarded by reading and
+    discarding the examples that were already returned, since datasets
+    without requests can't be accessed at arbitrary positions.
+
     """
     def __init__(self, dataset, **kwargs):
         if dataset.axis_labels:
@@ -141,6 +221,7 @@ class DataStream(AbstractDataStream):
         self.dataset = dataset
         self.data_state = self.dataset.open()
         self._fresh_state = True
+        self.position = 0
 
     @property
     def sources(self):
@@ -164,7 +245,10 @@ class DataStream(AbstractDataStream):
 
     def get_data(self, request=None):
         """Get data from the dataset."""
-        return self.dataset.get_data(self.data_state, request)
+        data = self.dataset.get_data(self.data_state, request)
+        if request is None:
+            self.position += 1
+        return data
 
     def get_epoch_iterator(self, **kwargs):
         """Get an epoch iterator for the data stream."""
@@ -172,8 +256,16 @@ class DataStream(AbstractDataStream):
             self.next_epoch()
         else:
             self._fresh_state = False
+        self.position = 0
         return super(DataStream, self).get_epoch_iterator(**kwargs)
 
+    def get_state(self):
+        return {'position': self.position}
+
+    def set_state(self, state):
+        while self.position < state['position']:
+            self.get_data()
+
     @classmethod
     def default_stream(cls, dataset, **kwargs):
         data_stream = cls(dataset, **kwargs)
@@ -219,6 +311,8 @@ class ServerDataStream(AbstractDataStream):
         self.connect()
 
     def connect(self):
+        # ZeroMQ is imported on first use to keep `import fuel` fast
+        import zmq
         context = zmq.Context()
         self.socket = socket = context.socket(zmq.PULL)
         socket.set_hwm(self.hwm)
@@ -230,6 +324,7 @@ class ServerDataStream(AbstractDataStream):
             raise ValueError
         if not self.connected:
             self.connect()
+        from fuel.server import recv_arrays
         data = recv_arrays(self.socket)
         return tuple(data)
 
@@ -1,11 +1,15 @@
 from abc import ABCMeta, abstractmethod
 from collections import defaultdict
+import copy
 import logging
 from multiprocessing import Process, Queue
+import sys
+import threading
 
 import numpy
-from picklable_itertools import chain, ifilter, izip
-from six import add_metaclass, iteritems
+from picklable_itertools import chain, izip
+from six import add_metaclass, iteritems, reraise
+from six.moves import queue
 
 from fuel import config
 from fuel.streams import AbstractDataStream
@@ -91,8 +95,15 @@ class Transformer(AbstractDataStream):
     produces_examples : bool
         Whether this transformer produces examples (as opposed to batches
         of examples).
+    state_attributes : tuple of str
+        The names of the attributes which hold state between calls to
+        :meth:`get_data`, e.g. a partially consumed example or a random
+        number generator. They are copied into the state returned by
+        :meth:`get_state`, and restored by :meth:`set_state`.
 
     """
+    state_attributes = ()
+
     def __init__(self, data_stream, produces_examples=None, **kwargs):
         super(Transformer, self).__init__(**kwargs)
         if produces_examples is not None:
@@ -132,6 +143,40 @@ class Transformer(AbstractDataStream):
         self.child_epoch_iterator = self.data_stream.get_epoch_iterator()
         return super(Transformer, self).get_epoch_iterator(**kwargs)
 
+    def get_state(self):
+        """Returns the state of the current epoch of the wrapped stream.
+
+        Transformers which keep buffers between calls to :meth:`get_data`
+        must list them in :attr:`state_attributes`, or add them to the
+        state themselves.
+
+        Raises
+        ------
+        NotImplementedError
+            If the transformer has a random number generator which isn't
+            listed in :attr:`state_attributes`, since a resumed epoch
+            wouldn't be reproducible.
+
+        """
+        unlisted = sorted(
+            name for name, value in vars(self).items()
+            if isinstance(value, numpy.random.RandomState) and
+            name not in self.state_attributes)
+        if unlisted:
+            raise NotImplementedError(
+                'cannot resume epochs of {}, since its state attributes '
+                'don\'t include {}'.format(self.__class__.__name__,
+                                           ', '.join(unlisted)))
+        state = {'child': self.child_epoch_iterator.get_state()}
+        for name in self.state_attributes:
+            state[name] = copy.deepcopy(getattr(self, name))
+        return state
+
+    def set_state(self, state):
+        self.child_epoch_iterator.set_state(state['child'])
+        for name in self.state_attributes:
+            setattr(self, name, copy.deepcopy(state[name]))
+
     def get_data(self, request=None):
         if request is not None:
             raise ValueError
@@ -195,19 +240,34 @@ class Mapping(Transformer):
     add_sources : tuple of str, optional
         When given, the data produced by the mapping is added to original
         data under source names `add_sources`.
+    block_mapping : callable, optional
+        A vectorized version of `mapping` that acts on a block of
+        examples, i.e. a tuple with one batch per source. When given and
+        the wrapped data stream produces blocks (see
+        :attr:`.AbstractDataStream.produces_blocks`), this transformer
+        produces blocks as well, so that e.g. a :class:`Batch` wrapping it
+        calls `block_mapping` once per block instead of calling `mapping`
+        once per example.
 
     """
-    def __init__(self, data_stream, mapping, add_sources=None, **kwargs):
+    def __init__(self, data_stream, mapping, add_sources=None,
+                 block_mapping=None, **kwargs):
         super(Mapping, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
         self.mapping = mapping
         self.add_sources = add_sources
+        self.block_mapping = block_mapping
 
     @property
     def sources(self):
         return self.data_stream.sources + (self.add_sources
                                            if self.add_sources else ())
 
+    @property
+    def produces_blocks(self):
+        return (self.block_mapping is not None and
+                self.data_stream.produces_blocks)
+
     def get_data(self, request=None):
         if request is not None:
             raise ValueError
@@ -217,6 +277,15 @@ class Mapping(Transformer):
             return image
         return data + image
 
+    def get_block(self, max_examples):
+        if not self.produces_blocks:
+            raise NotImplementedError
+        block = self.data_stream.get_block(max_examples)
+        image = self.block_mapping(block)
+        if not self.add_sources:
+            return image
+        return tuple(block) + tuple(image)
+
 
 @add_metaclass(ABCMeta)
 class SourcewiseTransformer(Transformer):
@@ -234,7 +303,17 @@ class SourcewiseTransformer(Transformer):
         Which sources to apply the mapping to. Defaults to `None`, in
         which case the mapping is applied to all sources.
 
+    Attributes
+    ----------
+    fusable : bool
+        Whether consecutive instances of this transformer can be collapsed
+        by :func:`fuse`. This requires the transformation of a source to
+        only depend on that source, and to leave the sources and the type
+        of the stream (examples or batches) unchanged. Defaults to `False`.
+
     """
+    fusable = False
+
     def __init__(self, data_stream, produces_examples, which_sources=None,
                  **kwargs):
         if which_sources is None:
@@ -304,6 +383,12 @@ class AgnosticSourcewiseTransformer(AgnosticTransformer,
         return self._apply_sourcewise_transformation(
             data=data, method=self.transform_any_source)
 
+    def transform_source_example(self, source_example, source_name):
+        return self.transform_any_source(source_example, source_name)
+
+    def transform_source_batch(self, source_batch, source_name):
+        return self.transform_any_source(source_batch, source_name)
+
     @abstractmethod
     def transform_any_source(self, source_data, source_name):
         """Applies a transformation to a source.
@@ -330,6 +415,8 @@ class Flatten(SourcewiseTransformer):
     `numpy.asarray`).
 
     """
+    fusable = True
+
     def __init__(self, data_stream, **kwargs):
         # Modify the axis_labels dict to reflect the fact that all non-batch
         # axes will be grouped together under the same 'feature' axis.
@@ -338,6 +425,8 @@ class Flatten(SourcewiseTransformer):
             kwargs.setdefault(
                 'axis_labels',
                 self._infer_axis_labels(data_stream, which_sources))
+        # Flattening returns views where possible
+        kwargs.setdefault('owns_buffers', data_stream.owns_buffers)
         super(Flatten, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
 
@@ -374,18 +463,71 @@ class ScaleAndShift(AgnosticSourcewiseTransformer):
         Scaling factor.
     shift : float
         Shifting factor.
+    dtype : str, optional
+        If given, the data type in which the result is computed and
+        returned, which saves a separate :class:`Cast`. Can be any valid
+        numpy dtype, or 'floatX', in which case ``fuel.config.floatX`` is
+        used. By default the data type follows NumPy's casting rules.
+
+    Notes
+    -----
+    Only a single array is allocated per source. If the wrapped data
+    stream owns its buffers (see :class:`.AbstractDataStream`), arrays
+    are scaled and shifted in place whenever the data type allows it,
+    and nothing is allocated at all.
 
     """
-    def __init__(self, data_stream, scale, shift, **kwargs):
+    fusable = True
+
+    def __init__(self, data_stream, scale, shift, dtype=None, **kwargs):
         self.scale = scale
         self.shift = shift
+        if dtype == 'floatX':
+            dtype = config.floatX
+        self.dtype = dtype
         if data_stream.axis_labels:
             kwargs.setdefault('axis_labels', data_stream.axis_labels.copy())
+        which_sources = kwargs.get('which_sources', None)
+        kwargs.setdefault('owns_buffers', data_stream.owns_buffers or
+                          which_sources is None or
+                          set(which_sources) >= set(data_stream.sources))
         super(ScaleAndShift, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
 
-    def transform_any_source(self, source_data, _):
-        return numpy.asarray(source_data) * self.scale + self.shift
+    def transform_any_source(self, source_data, source_name):
+        if self.data_stream.owns_buffers:
+            return self.transform_source_inplace(source_data, source_name)
+        return self._scale_and_shift(numpy.asarray(source_data), None)
+
+    def transform_source_inplace(self, source_data, source_name):
+        """Scale and shift an array, overwriting it if possible.
+
+        The array is only overwritten if the result has the same dtype.
+
+        """
+        source_data = numpy.asarray(source_data)
+        if source_data.ndim and self._output_dtype(source_data) == \
+                source_data.dtype:
+            return self._scale_and_shift(source_data, source_data)
+        return self._scale_and_shift(source_data, None)
+
+    def _output_dtype(self, source_data):
+        if self.dtype is not None:
+            return numpy.dtype(self.dtype)
+        return numpy.result_type(numpy.result_type(source_data, self.scale),
+                                 self.shift)
+
+    def _scale_and_shift(self, source_data, out):
+        if self.dtype is None:
+            out = numpy.multiply(source_data, self.scale, out=out)
+            if numpy.result_type(out, self.shift) != out.dtype:
+                return out + self.shift
+        else:
+            out = numpy.multiply(source_data, self.scale, out=out,
+                                 dtype=self.dtype, casting='unsafe')
+        if not isinstance(out, numpy.ndarray):
+            return out + out.dtype.type(self.shift)
+        return numpy.add(out, self.shift, out=out, casting='unsafe')
 
 
 class Cast(AgnosticSourcewiseTransformer):
@@ -401,24 +543,37 @@ class Cast(AgnosticSourcewiseTransformer):
         in which case ``fuel.config.floatX`` is used.
 
     """
+    fusable = True
+
     def __init__(self, data_stream, dtype, **kwargs):
         if dtype == 'floatX':
             dtype = config.floatX
         self.dtype = dtype
         if data_stream.axis_labels:
             kwargs.setdefault('axis_labels', data_stream.axis_labels.copy())
+        # Arrays which already have the right dtype are passed through
+        kwargs.setdefault('owns_buffers', data_stream.owns_buffers)
         super(Cast, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
 
     def transform_any_source(self, source_data, _):
         return numpy.asarray(source_data, dtype=self.dtype)
 
+    def transform_source_inplace(self, source_data, source_name):
+        """Cast an array, which can be returned as-is if no cast is needed.
+
+        """
+        return self.transform_any_source(source_data, source_name)
+
 
 class ForceFloatX(AgnosticSourcewiseTransformer):
     """Force all floating point numpy arrays to be floatX."""
+    fusable = True
+
     def __init__(self, data_stream, **kwargs):
         if data_stream.axis_labels:
             kwargs.setdefault('axis_labels', data_stream.axis_labels.copy())
+        kwargs.setdefault('owns_buffers', data_stream.owns_buffers)
         super(ForceFloatX, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
 
@@ -430,6 +585,125 @@ class ForceFloatX(AgnosticSourcewiseTransformer):
             source_data = source_data.astype(config.floatX)
         return source_data
 
+    def transform_source_inplace(self, source_data, source_name):
+        """Cast an array, which is returned as-is if already floatX."""
+        return self.transform_any_source(source_data, source_name)
+
+
+class FusedSourcewiseTransformer(SourcewiseTransformer):
+    """Applies a chain of sourcewise transformers in a single layer.
+
+    Rather than having each transformer of the chain request data from
+    the previous one, the data of the wrapped data stream is passed
+    through the transformation of every transformer in turn. Once a
+    transformer has produced a new array, the transformers that follow it
+    overwrite that array instead of allocating their own whenever they
+    implement ``transform_source_inplace``. If the wrapped data stream
+    owns its buffers, the first transformer can overwrite them as well.
+
+    Usually instantiated by :func:`fuse`.
+
+    Parameters
+    ----------
+    data_stream : :class:`AbstractDataStream` instance
+        The data stream wrapped by the first transformer of the chain.
+    transformers : list of :class:`SourcewiseTransformer`
+        The fusable transformers to apply, in order of application. Their
+        own data streams are not used.
+
+    """
+    def __init__(self, data_stream, transformers, **kwargs):
+        if not all(getattr(transformer, 'fusable', False)
+                   for transformer in transformers):
+            raise ValueError('all transformers must be fusable')
+        self.transformers = transformers
+        kwargs.setdefault('axis_labels', transformers[-1].axis_labels)
+        kwargs.setdefault('owns_buffers', transformers[-1].owns_buffers)
+        kwargs.setdefault('which_sources', tuple(
+            source for source in data_stream.sources
+            if any(source in transformer.which_sources
+                   for transformer in transformers)))
+        super(FusedSourcewiseTransformer, self).__init__(
+            data_stream, data_stream.produces_examples, **kwargs)
+
+    def _fused_transformation(self, source_data, source_name, method_name):
+        owned = self.data_stream.owns_buffers
+        for transformer in self.transformers:
+            if source_name not in transformer.which_sources:
+                continue
+            if owned and hasattr(transformer, 'transform_source_inplace'):
+                source_data = transformer.transform_source_inplace(
+                    source_data, source_name)
+                continue
+            input_data = source_data
+            source_data = getattr(transformer, method_name)(input_data,
+                                                            source_name)
+            owned = (isinstance(source_data, numpy.ndarray) and
+                     (owned or not numpy.may_share_memory(source_data,
+                                                          input_data)))
+            # Don't keep the input alive while the next transformers run
+            del input_data
+        return source_data
+
+    def transform_source_example(self, source_example, source_name):
+        return self._fused_transformation(source_example, source_name,
+                                          'transform_source_example')
+
+    def transform_source_batch(self, source_batch, source_name):
+        return self._fused_transformation(source_batch, source_name,
+                                          'transform_source_batch')
+
+
+def fuse(data_stream):
+    """Collapse a chain of fusable sourcewise transformers into one.
+
+    Starting from `data_stream`, consecutive :class:`SourcewiseTransformer`
+    instances whose ``fusable`` attribute is `True` (e.g.
+    :class:`ScaleAndShift`, :class:`Cast`, :class:`ForceFloatX` and
+    :class:`Flatten`) are replaced by a single
+    :class:`FusedSourcewiseTransformer`.
+
+    Parameters
+    ----------
+    data_stream : :class:`AbstractDataStream` instance
+        The outermost data stream of the chain to fuse.
+
+    Returns
+    -------
+    data_stream : :class:`AbstractDataStream` instance
+        A data stream producing the same data as `data_stream`. If fewer
+        than two transformers can be fused, `data_stream` itself.
+
+    Examples
+    --------
+    >>> import numpy
+    >>> from fuel.datasets import IndexableDataset
+    >>> from fuel.schemes import SequentialScheme
+    >>> from fuel.streams import DataStream
+    >>> dataset = IndexableDataset(
+    ...     {'features': numpy.ones((4, 2, 2), dtype='uint8')})
+    >>> stream = DataStream(
+    ...     dataset, iteration_scheme=SequentialScheme(4, 2))
+    >>> stream = Flatten(Cast(ScaleAndShift(stream, 2, 1), 'float32'))
+    >>> fused = fuse(stream)
+    >>> [transformer.__class__.__name__
+    ...  for transformer in fused.transformers]
+    ['ScaleAndShift', 'Cast', 'Flatten']
+    >>> next(fused.get_epoch_iterator())[0]
+    array([[3., 3., 3., 3.],
+           [3., 3., 3., 3.]], dtype=float32)
+
+    """
+    transformers = []
+    child = data_stream
+    while (isinstance(child, SourcewiseTransformer) and child.fusable and
+           child.produces_examples == child.data_stream.produces_examples):
+        transformers.append(child)
+        child = child.data_stream
+    if len(transformers) < 2:
+        return data_stream
+    return FusedSourcewiseTransformer(child, transformers[::-1])
+
 
 class Filter(Transformer):
     """Filters samples that meet a predicate.
@@ -440,18 +714,142 @@ class Filter(Transformer):
         The filtered data stream.
     predicate : callable
         Should return ``True`` for the samples to be kept.
+    vectorized : bool, optional
+        If ``True``, `predicate` is given a batch (a tuple with one batch
+        per source) and should return a boolean mask with one entry per
+        example. The examples for which the mask is ``False`` are removed
+        from each source with a single fancy index, so that individual
+        examples can be dropped from batches, and batches that end up
+        empty are skipped. On example streams each example is passed to
+        the predicate as a batch of one, unless the wrapped data stream
+        produces blocks (see :attr:`.AbstractDataStream.produces_blocks`),
+        in which case whole blocks are filtered at once. Defaults to
+        ``False``, in which case `predicate` is called on each example or
+        batch, and whole batches are either kept or dropped.
+    batch_size : int, optional
+        If given, the filtered batches are re-batched so that all batches
+        but the last one of each epoch contain exactly `batch_size`
+        examples. Requires a vectorized predicate and a wrapped data
+        stream that produces batches.
 
     """
-    def __init__(self, data_stream, predicate, **kwargs):
+    def __init__(self, data_stream, predicate, vectorized=False,
+                 batch_size=None, **kwargs):
+        if batch_size is not None and (not vectorized or
+                                       data_stream.produces_examples):
+            raise ValueError('re-batching requires a vectorized predicate '
+                             'and a data stream that produces batches')
         if data_stream.axis_labels:
             kwargs.setdefault('axis_labels', data_stream.axis_labels.copy())
+        # Fancy indexing copies the batches
+        kwargs.setdefault('owns_buffers', data_stream.owns_buffers or (
+            vectorized and not data_stream.produces_examples))
         super(Filter, self).__init__(
             data_stream, data_stream.produces_examples, **kwargs)
         self.predicate = predicate
+        self.vectorized = vectorized
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_offset = 0
+
+    @property
+    def produces_blocks(self):
+        return self.vectorized and self.data_stream.produces_blocks
 
     def get_epoch_iterator(self, **kwargs):
-        super(Filter, self).get_epoch_iterator(**kwargs)
-        return ifilter(self.predicate, self.child_epoch_iterator)
+        self.pending = []
+        self.pending_offset = 0
+        return super(Filter, self).get_epoch_iterator(**kwargs)
+
+    def get_state(self):
+        state = super(Filter, self).get_state()
+        state['pending'] = self._remaining()
+        return state
+
+    def set_state(self, state):
+        super(Filter, self).set_state(state)
+        self.pending = list(state['pending'])
+        self.pending_offset = 0
+
+    def get_data(self, request=None):
+        if request is not None:
+            raise ValueError
+        if not self.vectorized:
+            while True:
+                data = next(self.child_epoch_iterator)
+                if self.predicate(data):
+                    return data
+        if self.produces_examples:
+            while True:
+                example = next(self.child_epoch_iterator)
+                if self.predicate(tuple(numpy.asarray(source_data)[None]
+                                        for source_data in example))[0]:
+                    return example
+        if self.batch_size is not None:
+            return self._rebatch()
+        return self._next_filtered(
+            lambda: next(self.child_epoch_iterator))
+
+    def get_block(self, max_examples):
+        if not self.produces_blocks:
+            raise NotImplementedError
+        return self._next_filtered(
+            lambda: self.data_stream.get_block(max_examples))
+
+    def _next_filtered(self, get_batch):
+        while True:
+            batch = self._filter_batch(get_batch())
+            if len(batch[0]):
+                return batch
+
+    def _filter_batch(self, batch):
+        mask = numpy.asarray(self.predicate(batch), dtype=bool)
+        return tuple(source_data[mask]
+                     if isinstance(source_data, numpy.ndarray)
+                     else [example for example, keep
+                           in izip(source_data, mask) if keep]
+                     for source_data in batch)
+
+    def _remaining(self):
+        """Returns the pending batches without the examples handed out."""
+        if not self.pending:
+            return []
+        first = tuple(source_data[self.pending_offset:]
+                      for source_data in self.pending[0])
+        return [first] + self.pending[1:]
+
+    def _rebatch(self):
+        num_pending = (sum(len(batch[0]) for batch in self.pending) -
+                       self.pending_offset)
+        fetched = False
+        while num_pending < self.batch_size:
+            try:
+                batch = self._next_filtered(
+                    lambda: next(self.child_epoch_iterator))
+            except StopIteration:
+                if not self.pending:
+                    raise
+                break
+            self.pending.append(batch)
+            num_pending += len(batch[0])
+            fetched = True
+        if fetched or len(self.pending) > 1:
+            # Fewer than batch_size examples are left from earlier
+            # batches, so each example is only copied about once, and
+            # large batches are then handed out in slices
+            self.pending = [tuple(_concatenate(source_data)
+                                  for source_data in zip(*self._remaining()))]
+            self.pending_offset = 0
+        start = self.pending_offset
+        stop = start + self.batch_size
+        data = tuple(source_data[start:stop]
+                     for source_data in self.pending[0])
+        if stop < len(self.pending[0][0]):
+            self.pending_offset = stop
+        else:
+            self.pending = []
+            self.pending_offset = 0
+        return data
 
 
 class Cache(Transformer):
@@ -506,11 +904,33 @@ class Cache(Transformer):
         self.cache = [[] for _ in self.sources]
         return super(Cache, self).get_epoch_iterator(**kwargs)
 
+    def get_state(self):
+        state = super(Cache, self).get_state()
+        state['cache'] = self.cache
+        return state
+
+    def set_state(self, state):
+        super(Cache, self).set_state(state)
+        self.cache = [list(cache) for cache in state['cache']]
+
     def _cache(self):
         for cache, data in zip(self.cache, next(self.child_epoch_iterator)):
             cache.extend(data)
 
 
+def _concatenate(batches):
+    """Concatenates batches of a single source into one array.
+
+    Concatenating always copies, so the result never shares memory with
+    the batches it was assembled from.
+
+    """
+    if (all(isinstance(batch, numpy.ndarray) for batch in batches) and
+            len(set(batch.shape[1:] for batch in batches)) == 1):
+        return numpy.concatenate(batches)
+    return numpy.asarray(list(chain.from_iterable(batches)))
+
+
 class SortMapping(object):
     """Callable class for creating sorting mappings.
 
@@ -519,24 +939,55 @@ class SortMapping(object):
 
     Parameters
     ----------
-    key : callable
+    key : callable, optional
         The mapping that returns the value to sort on. Its input will be
         a tuple that contains a single data point for each source.
     reverse : boolean value that indicates whether the sort order should
         be reversed.
+    batch_key : callable, optional
+        A vectorized alternative to `key`. Its input is the whole batch,
+        a tuple with one element per source, and it should return an
+        array containing the value to sort on for each example, e.g.
+        ``lambda batch: batch[1].sum(axis=1)``. The batch is then sorted
+        with a single :func:`numpy.argsort` and each array source is
+        permuted with a single fancy index, instead of constructing a
+        tuple for each example. Either `key` or `batch_key` must be
+        given.
+
+    Notes
+    -----
+    Both code paths sort stably, so examples with equal keys keep their
+    relative order.
 
     """
-    def __init__(self, key, reverse=False):
+    def __init__(self, key=None, reverse=False, batch_key=None):
+        if (key is None) == (batch_key is None):
+            raise ValueError("exactly one of key and batch_key must be given")
         self.key = key
         self.reverse = reverse
+        self.batch_key = batch_key
 
     def __call__(self, batch):
+        if self.batch_key is not None:
+            return self._sort_vectorized(batch)
         output = sorted(zip(*batch), key=self.key, reverse=self.reverse)
         output = tuple(numpy.asarray(i) if isinstance(j, numpy.ndarray)
                        else list(i)
                        for i, j in zip(zip(*output), batch))
         return output
 
+    def _sort_vectorized(self, batch):
+        keys = numpy.asarray(self.batch_key(batch))
+        if self.reverse:
+            # Sort the reversed keys so that ties keep their original order
+            order = (len(keys) - 1 -
+                     numpy.argsort(keys[::-1], kind='mergesort')[::-1])
+        else:
+            order = numpy.argsort(keys, kind='mergesort')
+        return tuple(source[order] if isinstance(source, numpy.ndarray)
+                     else [source[i] for i in order]
+                     for source in batch)
+
 
 class Batch(Transformer):
     """Creates minibatches from data streams providing single examples.
@@ -576,6 +1027,8 @@ class Batch(Transformer):
                 'axis_labels',
                 dict((source, ('batch',) + labels if labels else None) for
                      source, labels in iteritems(data_stream.axis_labels)))
+        # Batches are always assembled into new arrays
+        kwargs.setdefault('owns_buffers', True)
         super(Batch, self).__init__(
             data_stream, iteration_scheme=iteration_scheme, **kwargs)
         self.strictness = strictness
@@ -584,6 +1037,8 @@ class Batch(Transformer):
         """Get data from the dataset."""
         if request is None:
             raise ValueError
+        if self.data_stream.produces_blocks:
+            return self._get_data_from_blocks(request)
         data = [[] for _ in self.sources]
         for i in range(request):
             try:
@@ -600,6 +1055,23 @@ class Batch(Transformer):
                 raise
         return tuple(numpy.asarray(source_data) for source_data in data)
 
+    def _get_data_from_blocks(self, request):
+        blocks = []
+        remaining = request
+        while remaining:
+            try:
+                block = self.data_stream.get_block(remaining)
+            except StopIteration:
+                if not self.strictness and blocks:
+                    break
+                elif self.strictness > 1 and blocks:
+                    raise ValueError
+                raise
+            blocks.append(block)
+            remaining -= len(block[0])
+        return tuple(_concatenate(source_blocks)
+                     for source_blocks in zip(*blocks))
+
 
 class Unpack(Transformer):
     """Unpacks batches to compose a stream of examples.
@@ -607,12 +1079,19 @@ class Unpack(Transformer):
     This class is the inverse of the Batch class: it turns a minibatch into
     a stream of examples.
 
+    It produces blocks (see :attr:`.AbstractDataStream.produces_blocks`),
+    which are slices of the unpacked batches, so that e.g. a
+    :class:`Batch` wrapping it can rebatch the data without iterating
+    over individual examples.
+
     Parameters
     ----------
     data_stream : :class:`AbstractDataStream` instance
         The data stream to unpack
 
     """
+    produces_blocks = True
+
     def __init__(self, data_stream, **kwargs):
         if data_stream.produces_examples:
             raise ValueError('the wrapped data stream must produce batches of '
@@ -625,18 +1104,46 @@ class Unpack(Transformer):
         super(Unpack, self).__init__(
             data_stream, produces_examples=True, **kwargs)
         self.data = None
+        self.position = 0
+
+    def get_epoch_iterator(self, **kwargs):
+        self.data = None
+        return super(Unpack, self).get_epoch_iterator(**kwargs)
+
+    def get_state(self):
+        state = super(Unpack, self).get_state()
+        # Only store the examples of the current batch that are left
+        state['data'] = (None if self.data is None else
+                         tuple(source_data[self.position:]
+                               for source_data in self.data))
+        return state
+
+    def set_state(self, state):
+        super(Unpack, self).set_state(state)
+        self.data = state['data']
+        self.position = 0
+
+    def _fetch_batch(self):
+        while self.data is None or self.position >= len(self.data[0]):
+            self.data = next(self.child_epoch_iterator)
+            self.position = 0
 
     def get_data(self, request=None):
         if request is not None:
             raise ValueError
-        if not self.data:
-            data = next(self.child_epoch_iterator)
-            self.data = izip(*data)
-        try:
-            return next(self.data)
-        except StopIteration:
-            self.data = None
-            return self.get_data()
+        self._fetch_batch()
+        example = tuple(source_data[self.position]
+                        for source_data in self.data)
+        self.position += 1
+        return example
+
+    def get_block(self, max_examples):
+        self._fetch_batch()
+        start, self.position = (
+            self.position,
+            min(self.position + max_examples, len(self.data[0])))
+        return tuple(source_data[start:self.position]
+                     for source_data in self.data)
 
 
 class Padding(Transformer):
@@ -728,6 +1235,35 @@ class Merge(AbstractDataStream):
         The data streams to merge.
     sources : iterable
         A collection of strings, determining what sources should be called.
+    parallel : bool, optional
+        If ``True``, each data stream is read from in a separate thread,
+        so that the latency of the merged stream is that of the slowest
+        data stream instead of the sum of all latencies. This is useful
+        when the data streams are independent and I/O bound, e.g. when
+        they read from different files or are :class:`.ServerDataStream`
+        instances. In this mode the data streams are read from through
+        their epoch iterators, so they can also have iteration schemes or
+        be transformers. The data streams must be aligned: it is an error
+        for one of them to end before the others, or, for batch streams,
+        to return batches of different sizes. Defaults to ``False``.
+    prefetch : int, optional
+        When `parallel` is ``True``, the maximum number of examples or
+        batches each thread reads ahead. Data that was read ahead is
+        discarded when a new epoch iterator is requested, or when the
+        data streams are reset. Defaults to 1.
+    stop_timeout : float, optional
+        When `parallel` is ``True``, the number of seconds to wait for
+        each thread to stop when a new epoch iterator is requested, or
+        when the data streams are reset or closed. Defaults to 10.
+
+    Notes
+    -----
+    A thread can only stop between two reads, so a thread which is
+    blocked while reading, e.g. from a :class:`.ServerDataStream` whose
+    server died, can't be stopped. After `stop_timeout` seconds a
+    warning is logged and the thread is abandoned. It is a daemon thread,
+    so it doesn't keep the interpreter from exiting, but it could still
+    read from its data stream if the read eventually returns.
 
     Examples
     --------
@@ -744,7 +1280,8 @@ class Merge(AbstractDataStream):
     ('Hello world!', 'Bonjour le monde!')
 
     """
-    def __init__(self, data_streams, sources, axis_labels=None):
+    def __init__(self, data_streams, sources, axis_labels=None,
+                 parallel=False, prefetch=1, stop_timeout=10):
         super(Merge, self).__init__(
             iteration_scheme=None, axis_labels=axis_labels)
         if not all(data_stream.produces_examples ==
@@ -759,29 +1296,134 @@ class Merge(AbstractDataStream):
                             in data_streams]))) != len(sources):
             raise ValueError("wrong number of sources given")
         self.sources = sources
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self.parallel = parallel
+        self.prefetch = prefetch
+        self.stop_timeout = stop_timeout
+        self._workers = []
 
     def close(self):
+        self._stop_workers()
         for data_stream in self.data_streams:
             data_stream.close()
 
     def reset(self):
+        self._stop_workers()
         for data_stream in self.data_streams:
             data_stream.reset()
 
     def next_epoch(self):
+        self._stop_workers()
         for data_stream in self.data_streams:
             data_stream.next_epoch()
 
     def get_epoch_iterator(self, **kwargs):
+        self._stop_workers()
         return super(Merge, self).get_epoch_iterator(**kwargs)
 
+    def get_state(self):
+        if self.parallel:
+            raise NotImplementedError('cannot resume epochs of a parallel '
+                                      'Merge, since data is read ahead')
+        return {'data_streams': [data_stream.get_state()
+                                 for data_stream in self.data_streams]}
+
+    def set_state(self, state):
+        for data_stream, data_stream_state in zip(self.data_streams,
+                                                  state['data_streams']):
+            data_stream.set_state(data_stream_state)
+
     def get_data(self, request=None):
         if request is not None:
             raise ValueError
+        if self.parallel:
+            return self._get_data_parallel()
         return sum(
             (data_stream.get_data() for data_stream in self.data_streams),
             tuple())
 
+    def _start_workers(self):
+        self._stop_event = threading.Event()
+        for data_stream in self.data_streams:
+            results = queue.Queue(maxsize=self.prefetch)
+            thread = threading.Thread(
+                target=_prefetch, args=(data_stream.get_epoch_iterator(),
+                                        results, self._stop_event))
+            thread.daemon = True
+            thread.start()
+            self._workers.append((thread, results))
+
+    def _stop_workers(self):
+        if not self._workers:
+            return
+        self._stop_event.set()
+        for thread, _ in self._workers:
+            thread.join(self.stop_timeout)
+            if thread.is_alive():
+                log.warning("a thread of %s instance didn't stop within %s "
+                            "seconds, since it is blocked reading from its "
+                            "data stream; abandoning it",
+                            self.__class__.__name__, self.stop_timeout)
+        self._workers = []
+
+    def _get_data_parallel(self):
+        if not self._workers:
+            self._start_workers()
+        results = [results.get() for _, results in self._workers]
+        errors = [exc_info for _, exc_info in results if exc_info]
+        if errors:
+            self._stop_workers()
+            stopped = [issubclass(exc_info[0], StopIteration)
+                       for exc_info in errors]
+            if all(stopped) and len(errors) == len(results):
+                raise StopIteration
+            elif all(stopped):
+                raise ValueError('data streams are not aligned: some data '
+                                 'streams ended before the others')
+            exc_info = next(exc_info for exc_info, stop
+                            in zip(errors, stopped) if not stop)
+            reraise(*exc_info)
+        data = [data for data, _ in results]
+        if not self.produces_examples:
+            sizes = set(len(child_data[0]) for child_data in data
+                        if child_data)
+            if len(sizes) > 1:
+                self._stop_workers()
+                raise ValueError('data streams are not aligned: got batches '
+                                 'of sizes {}'.format(sorted(sizes)))
+        return sum((tuple(child_data) for child_data in data), tuple())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_workers'] = []
+        state.pop('_stop_event', None)
+        return state
+
+
+def _prefetch(epoch_iterator, results, stop_event):
+    """Reads data from an epoch iterator into a bounded queue.
+
+    Used by :class:`Merge` to read from its data streams in parallel.
+    Each result is a ``(data, exc_info)`` pair. The thread exits after
+    the first exception, which includes the end of the epoch, or when
+    `stop_event` is set.
+
+    """
+    while not stop_event.is_set():
+        try:
+            result = (next(epoch_iterator), None)
+        except Exception:
+            result = (None, sys.exc_info())
+        while not stop_event.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        if result[1] is not None:
+            return
+
 
 class BackgroundProcess(object):
     """A background process that reads batches and stores them in a queue.
@@ -858,6 +1500,10 @@ class MultiProcessing(Transformer):
             raise StopIteration
         return data
 
+    def get_state(self):
+        raise NotImplementedError('cannot resume epochs of MultiProcessing, '
+                                  'since data is read in the background')
+
 
 class Rename(AgnosticTransformer):
     """Renames the sources of the stream.
@@ -1,5 +1,6 @@
 cimport cython
 from cython.parallel cimport prange
+from libc.stdlib cimport malloc, free
 
 
 ctypedef long Py_intptr_t
@@ -9,6 +10,10 @@ ctypedef fused image_dtype:
     double
     unsigned char
 
+ctypedef fused float_dtype:
+    float
+    double
+
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -58,3 +63,403 @@ cpdef window_batch_bchw(image_dtype[:, :, :, :] batch,
             h_extent = h_off + window_height
             w_extent = w_off + window_width
             out[index] = batch[index, :, h_off:h_extent, w_off:w_extent]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef window_list_bchw(list images, long[:] height_offsets,
+                       long[:] width_offsets,
+                       image_dtype[:, :, :, :] out):
+    """window_list_bchw(images, height_offsets, width_offsets, out)
+
+    Perform windowing on a list of (channels, height, width) images.
+
+    Like :func:`window_batch_bchw`, but the images can have different
+    heights and widths.
+
+    Parameters
+    ----------
+    images : list of ndarrays, 3-dimensional
+        The images, which must have the same number of channels and the
+        same data type as `out`.
+    height_offsets : memoryview, integer, 1-dimensional
+        An array of offsets for the height dimension of each image.
+        Assumed that len(images) <= height_offsets.shape[0].
+    width_offsets : memoryview, integer, 1-dimensional
+        An array of offsets for the width dimension of each image.
+        Assumed that len(images) <= width_offsets.shape[0].
+    out : memoryview
+        The array to which to write output. It is assumed that
+        `out.shape[2] + height_offsets[i] <= images[i].shape[1]` and
+        `out.shape[3] + width_offsets[i] <= images[i].shape[2]`, for
+        all values of `i`.
+
+    Notes
+    -----
+    Operates on a batch in parallel via OpenMP. Set `OMP_NUM_THREADS`
+    to benefit from this parallelism.
+
+    This is a low-level utility that, for the sake of speed, does
+    not check its input for validity beyond the number of channels
+    and the data type of each image.
+
+    """
+    cdef Py_intptr_t index, channel, row, column, h_off, w_off
+    cdef Py_intptr_t num_images = len(images)
+    cdef Py_intptr_t num_channels = out.shape[1]
+    cdef Py_intptr_t window_height = out.shape[2]
+    cdef Py_intptr_t window_width = out.shape[3]
+    cdef const image_dtype[:, :, :] image
+    cdef char *pixel
+    if num_images == 0 or out.size == 0:
+        return
+    # The buffers of the images are kept alive by the list
+    cdef char **data = <char **> malloc(num_images * sizeof(char *))
+    cdef Py_intptr_t *strides = <Py_intptr_t *> malloc(
+        3 * num_images * sizeof(Py_intptr_t))
+    try:
+        if data == NULL or strides == NULL:
+            raise MemoryError()
+        for index in range(num_images):
+            image = images[index]
+            if image.shape[0] != num_channels:
+                raise ValueError("image {} has {} channels, expected "
+                                 "{}".format(index, image.shape[0],
+                                             num_channels))
+            data[index] = <char *> &image[0, 0, 0]
+            strides[3 * index] = image.strides[0]
+            strides[3 * index + 1] = image.strides[1]
+            strides[3 * index + 2] = image.strides[2]
+        with nogil:
+            for index in prange(num_images):
+                h_off = height_offsets[index]
+                w_off = width_offsets[index]
+                for channel in range(num_channels):
+                    for row in range(window_height):
+                        pixel = (data[index] +
+                                 channel * strides[3 * index] +
+                                 (h_off + row) * strides[3 * index + 1] +
+                                 w_off * strides[3 * index + 2])
+                        for column in range(window_width):
+                            out[index, channel, row, column] = (
+                                (<image_dtype *> pixel)[0])
+                            pixel = pixel + strides[3 * index + 2]
+    finally:
+        free(data)
+        free(strides)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef resize_batch_bchw(image_dtype[:, :, :, :] batch,
+                        long[:] row_starts, double[:, :] row_weights,
+                        long[:] column_starts, double[:, :] column_weights,
+                        image_dtype[:, :, :, :] out):
+    """resize_batch_bchw(batch, row_starts, row_weights, column_starts,
+                         column_weights, out)
+
+    Resample a (batch, channels, height, width) image tensor.
+
+    Each output pixel is a weighted sum of a window of input pixels,
+    computed separably: first along the width, then along the height.
+
+    Parameters
+    ----------
+    batch : memoryview, 4-dimensional
+        A 4-d tensor containing a batch of images in the expected
+        format above.
+    row_starts : memoryview, integer, 1-dimensional
+        The first input row of the window of each output row.
+    row_weights : memoryview, double, 2-dimensional
+        The weights of the rows of each window, with shape
+        `(out.shape[2], window_height)`.
+    column_starts : memoryview, integer, 1-dimensional
+        The first input column of the window of each output column.
+    column_weights : memoryview, double, 2-dimensional
+        The weights of the columns of each window, with shape
+        `(out.shape[3], window_width)`.
+    out : memoryview
+        The array to which to write output. It is assumed that
+        `row_starts[i] + row_weights.shape[1] <= batch.shape[2]` and
+        `column_starts[j] + column_weights.shape[1] <= batch.shape[3]`
+        for all values of `i` and `j`.
+
+    Notes
+    -----
+    Operates on a batch in parallel via OpenMP. Set `OMP_NUM_THREADS`
+    to benefit from this parallelism.
+
+    Sums are accumulated in double precision. Integer outputs are
+    rounded to the nearest integer and clipped to [0, 255].
+
+    This is a low-level utility that, for the sake of speed, does
+    not check its input for validity. Some amount of protection is
+    provided by Cython memoryview objects.
+
+    """
+    cdef Py_intptr_t index, channel, row, column, tap, start
+    cdef Py_intptr_t num_channels = batch.shape[1]
+    cdef Py_intptr_t height = batch.shape[2]
+    cdef Py_intptr_t out_height = out.shape[2]
+    cdef Py_intptr_t out_width = out.shape[3]
+    cdef Py_intptr_t row_taps = row_weights.shape[1]
+    cdef Py_intptr_t column_taps = column_weights.shape[1]
+    cdef double value
+    # Images resized along the width only, one buffer per image
+    cdef double *rows
+    with nogil:
+        for index in prange(batch.shape[0]):
+            rows = <double *> malloc(num_channels * height * out_width *
+                                     sizeof(double))
+            if rows == NULL:
+                with gil:
+                    raise MemoryError()
+            for channel in range(num_channels):
+                for row in range(height):
+                    for column in range(out_width):
+                        start = column_starts[column]
+                        value = 0
+                        for tap in range(column_taps):
+                            value = value + (
+                                column_weights[column, tap] *
+                                batch[index, channel, row, start + tap])
+                        rows[(channel * height + row) * out_width +
+                             column] = value
+            for channel in range(num_channels):
+                for row in range(out_height):
+                    start = row_starts[row]
+                    for column in range(out_width):
+                        value = 0
+                        for tap in range(row_taps):
+                            value = value + (
+                                row_weights[row, tap] *
+                                rows[(channel * height + start + tap) *
+                                     out_width + column])
+                        if image_dtype is float or image_dtype is double:
+                            out[index, channel, row, column] = (
+                                <image_dtype> value)
+                        elif value <= 0:
+                            out[index, channel, row, column] = 0
+                        elif value >= 255:
+                            out[index, channel, row, column] = 255
+                        else:
+                            out[index, channel, row, column] = (
+                                <image_dtype> (value + 0.5))
+            free(rows)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef crop_flip_normalize_bchw(image_dtype[:, :, :, :] batch,
+                               long[:] height_offsets, long[:] width_offsets,
+                               unsigned char[:] flips, double[:] shifts,
+                               double[:] scales, float_dtype[:, :, :, :] out):
+    """crop_flip_normalize_bchw(batch, height_offsets, width_offsets,
+                                flips, shifts, scales, out)
+
+    Window, flip and normalize a (batch, channels, height, width) image
+    tensor in a single pass.
+
+    Computes `(window[c] - shifts[c]) * scales[c]` for each channel `c`
+    of the window of each image, mirrored along the width where `flips`
+    is nonzero, and writes the result to a floating point output.
+
+    Parameters
+    ----------
+    batch : memoryview, 4-dimensional
+        A 4-d tensor containing a batch of images in the expected
+        format above.
+    height_offsets : memoryview, integer, 1-dimensional
+        An array of offsets for the height dimension of each image.
+        Assumed that batch.shape[0] <= height_offsets.shape[0].
+    width_offsets : memoryview, integer, 1-dimensional
+        An array of offsets for the width dimension of each image.
+        Assumed that batch.shape[0] <= width_offsets.shape[0].
+    flips : memoryview, unsigned char, 1-dimensional
+        Whether to flip each window horizontally.
+    shifts : memoryview, double, 1-dimensional
+        The value subtracted from each channel, e.g. its mean.
+    scales : memoryview, double, 1-dimensional
+        The factor each channel is multiplied with after the shift,
+        e.g. the inverse of its standard deviation.
+    out : memoryview, floating point
+        The array to which to write output. It is assumed that
+        `out.shape[2] + height_offsets[i] <= batch.shape[2]` and
+        `out.shape[3] + width_offsets[i] <= batch.shape[3]`, for
+        all values of `i`.
+
+    Notes
+    -----
+    Operates on a batch in parallel via OpenMP. Set `OMP_NUM_THREADS`
+    to benefit from this parallelism.
+
+    This is a low-level utility that, for the sake of speed, does
+    not check its input for validity. Some amount of protection is
+    provided by Cython memoryview objects.
+
+    """
+    cdef Py_intptr_t index, channel, row, column, h_off, w_off
+    cdef Py_intptr_t num_channels = out.shape[1]
+    cdef Py_intptr_t window_height = out.shape[2]
+    cdef Py_intptr_t window_width = out.shape[3]
+    cdef double shift, scale
+    with nogil:
+        for index in prange(batch.shape[0]):
+            h_off = height_offsets[index]
+            w_off = width_offsets[index]
+            for channel in range(num_channels):
+                shift = shifts[channel]
+                scale = scales[channel]
+                for row in range(window_height):
+                    if flips[index]:
+                        for column in range(window_width):
+                            out[index, channel, row, column] = <float_dtype> (
+                                (batch[index, channel, h_off + row,
+                                       w_off + window_width - 1 - column] -
+                                 shift) * scale)
+                    else:
+                        for column in range(window_width):
+                            out[index, channel, row, column] = <float_dtype> (
+                                (batch[index, channel, h_off + row,
+                                       w_off + column] - shift) * scale)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef resize_list_bchw(list images, long[:, :] row_starts,
+                       double[:, :, :] row_weights, long[:, :] column_starts,
+                       double[:, :, :] column_weights,
+                       image_dtype[:, :, :, :] out):
+    """resize_list_bchw(images, row_starts, row_weights, column_starts,
+                        column_weights, out)
+
+    Resample a list of (channels, height, width) images.
+
+    Like :func:`resize_batch_bchw`, but the images can have different
+    heights and widths, and each image has its own windows, e.g. to
+    resample a different region of each image.
+
+    Parameters
+    ----------
+    images : list of ndarrays, 3-dimensional
+        The images, which must have the same number of channels and the
+        same data type as `out`.
+    row_starts : memoryview, integer, 2-dimensional
+        The first input row of the window of each output row of each
+        image, which must be nondecreasing.
+    row_weights : memoryview, double, 3-dimensional
+        The weights of the rows of each window, with shape
+        `(len(images), out.shape[2], window_height)`.
+    column_starts : memoryview, integer, 2-dimensional
+        The first input column of the window of each output column of
+        each image.
+    column_weights : memoryview, double, 3-dimensional
+        The weights of the columns of each window, with shape
+        `(len(images), out.shape[3], window_width)`.
+    out : memoryview
+        The array to which to write output. It is assumed that all
+        windows lie within their images, except for trailing taps with a
+        weight of zero, which allows windows of different sizes to be
+        padded to the same size.
+
+    Notes
+    -----
+    Operates on a batch in parallel via OpenMP. Set `OMP_NUM_THREADS`
+    to benefit from this parallelism.
+
+    This is a low-level utility that, for the sake of speed, does
+    not check its input for validity beyond the number of channels
+    and the data type of each image.
+
+    """
+    cdef Py_intptr_t index, channel, row, column, tap, start
+    cdef Py_intptr_t first_row, num_rows, num_taps
+    cdef Py_intptr_t num_images = len(images)
+    cdef Py_intptr_t num_channels = out.shape[1]
+    cdef Py_intptr_t out_height = out.shape[2]
+    cdef Py_intptr_t out_width = out.shape[3]
+    cdef Py_intptr_t row_taps = row_weights.shape[2]
+    cdef Py_intptr_t column_taps = column_weights.shape[2]
+    cdef const image_dtype[:, :, :] image
+    cdef double value
+    # The rows of an image's window, resized along the width only
+    cdef double *rows
+    if num_images == 0 or out.size == 0:
+        return
+    # The buffers of the images are kept alive by the list
+    cdef char **data = <char **> malloc(num_images * sizeof(char *))
+    cdef Py_intptr_t *strides = <Py_intptr_t *> malloc(
+        3 * num_images * sizeof(Py_intptr_t))
+    cdef Py_intptr_t *shapes = <Py_intptr_t *> malloc(
+        2 * num_images * sizeof(Py_intptr_t))
+    try:
+        if data == NULL or strides == NULL or shapes == NULL:
+            raise MemoryError()
+        for index in range(num_images):
+            image = images[index]
+            if image.shape[0] != num_channels:
+                raise ValueError("image {} has {} channels, expected "
+                                 "{}".format(index, image.shape[0],
+                                             num_channels))
+            data[index] = <char *> &image[0, 0, 0]
+            strides[3 * index] = image.strides[0]
+            strides[3 * index + 1] = image.strides[1]
+            strides[3 * index + 2] = image.strides[2]
+            shapes[2 * index] = image.shape[1]
+            shapes[2 * index + 1] = image.shape[2]
+        with nogil:
+            for index in prange(num_images):
+                # Padding taps which lie outside of the image are skipped
+                first_row = row_starts[index, 0]
+                num_rows = min(row_starts[index, out_height - 1] + row_taps,
+                               shapes[2 * index]) - first_row
+                rows = <double *> malloc(num_channels * num_rows *
+                                         out_width * sizeof(double))
+                if rows == NULL:
+                    with gil:
+                        raise MemoryError()
+                for channel in range(num_channels):
+                    for row in range(num_rows):
+                        for column in range(out_width):
+                            start = column_starts[index, column]
+                            num_taps = min(column_taps,
+                                           shapes[2 * index + 1] - start)
+                            value = 0
+                            for tap in range(num_taps):
+                                value = value + (
+                                    column_weights[index, column, tap] *
+                                    (<image_dtype *> (
+                                        data[index] +
+                                        channel * strides[3 * index] +
+                                        (first_row + row) *
+                                        strides[3 * index + 1] +
+                                        (start + tap) *
+                                        strides[3 * index + 2]))[0])
+                            rows[(channel * num_rows + row) * out_width +
+                                 column] = value
+                for channel in range(num_channels):
+                    for row in range(out_height):
+                        start = row_starts[index, row] - first_row
+                        num_taps = min(row_taps, num_rows - start)
+                        for column in range(out_width):
+                            value = 0
+                            for tap in range(num_taps):
+                                value = value + (
+                                    row_weights[index, row, tap] *
+                                    rows[(channel * num_rows + start + tap) *
+                                         out_width + column])
+                            if image_dtype is float or image_dtype is double:
+                                out[index, channel, row, column] = (
+                                    <image_dtype> value)
+                            elif value <= 0:
+                                out[index, channel, row, column] = 0
+                            elif value >= 255:
+                                out[index, channel, row, column] = 255
+                            else:
+                                out[index, channel, row, column] = (
+                                    <image_dtype> (value + 0.5))
+                free(rows)
+    finally:
+        free(data)
+        free(strides)
+        free(shapes)
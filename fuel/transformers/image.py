@@ -1,16 +1,155 @@
 from __future__ import division
 from io import BytesIO
 import math
+from multiprocessing.pool import ThreadPool
 
 import numpy
 from PIL import Image
 from six import PY3
 
-from ._image import window_batch_bchw
+from ._image import (crop_flip_normalize_bchw, resize_batch_bchw,
+                     resize_list_bchw, window_batch_bchw, window_list_bchw)
 from . import ExpectsAxisLabels, SourcewiseTransformer
 from .. import config
+from ..utils import do_not_pickle_attributes
 
+#: The data types of the images which the compiled kernels support
+NATIVE_DTYPES = (numpy.dtype('uint8'), numpy.dtype('float32'),
+                 numpy.dtype('float64'))
 
+
+def _resampling_weights(input_size, output_size, resample):
+    """Computes the windows of input pixels of each output pixel.
+
+    Parameters
+    ----------
+    input_size : int
+        The length of the axis that is resampled.
+    output_size : int
+        The length of the resampled axis.
+    resample : str
+        One of 'nearest', 'bilinear' and 'area'.
+
+    Returns
+    -------
+    starts : ndarray
+        The first input pixel of the window of each output pixel.
+    weights : ndarray
+        The weights of the pixels of each window, with shape
+        `(output_size, window_size)`, where `window_size` is at most
+        `input_size`.
+
+    """
+    scale = input_size / output_size
+    positions = numpy.arange(output_size)
+    if resample == 'nearest':
+        indices = numpy.minimum(numpy.floor((positions + 0.5) * scale),
+                                input_size - 1)[:, None]
+        weights = numpy.ones_like(indices)
+    elif resample == 'bilinear':
+        centers = numpy.clip((positions + 0.5) * scale - 0.5,
+                             0, input_size - 1)
+        lower = numpy.floor(centers)
+        indices = numpy.minimum(
+            numpy.stack([lower, lower + 1], axis=1), input_size - 1)
+        fractions = centers - lower
+        weights = numpy.stack([1 - fractions, fractions], axis=1)
+    elif resample == 'area':
+        # The average of the input pixels covered by each output pixel
+        starts, stops = positions * scale, (positions + 1) * scale
+        indices = (numpy.floor(starts)[:, None] +
+                   numpy.arange(int(math.ceil(scale)) + 1))
+        weights = numpy.clip(
+            numpy.minimum(indices + 1, stops[:, None]) -
+            numpy.maximum(indices, starts[:, None]), 0, None) / scale
+        indices = numpy.minimum(indices, input_size - 1)
+    else:
+        raise ValueError("unknown resampling method '{}'".format(resample))
+    indices = indices.astype(int)
+    window_size = min(input_size, int((indices.max(axis=1) -
+                                       indices.min(axis=1)).max()) + 1)
+    starts = numpy.minimum(indices.min(axis=1), input_size - window_size)
+    window = numpy.zeros((output_size, window_size))
+    numpy.add.at(window, (positions[:, None], indices - starts[:, None]),
+                 weights)
+    return starts, window
+
+
+def _region_weights(offsets, sizes, output_size, resample):
+    """Computes the windows which resample a region of each image.
+
+    Returns the starts and weights of :func:`_resampling_weights` for
+    each image, as arrays with a leading batch axis. The starts include
+    the offsets of the regions, and windows are padded with zero weights
+    to the size of the largest window.
+
+    """
+    tables = [_resampling_weights(size, output_size, resample)
+              for size in sizes]
+    window_size = max([weights.shape[1] for _, weights in tables] + [1])
+    all_starts = numpy.empty((len(tables), output_size), dtype=int)
+    all_weights = numpy.zeros((len(tables), output_size, window_size))
+    for i, (offset, (starts, weights)) in enumerate(zip(offsets, tables)):
+        all_starts[i] = starts + offset
+        all_weights[i, :, :weights.shape[1]] = weights
+    return all_starts, all_weights
+
+
+def _resize(batch, shape, resample):
+    """Resizes a `(batch, channel, height, width)` array of images."""
+    if batch.dtype not in NATIVE_DTYPES:
+        raise ValueError("can't resize images of dtype {}; expected one of "
+                         "{}".format(batch.dtype, ', '.join(
+                             str(dtype) for dtype in NATIVE_DTYPES)))
+    height, width = shape
+    row_starts, row_weights = _resampling_weights(batch.shape[2], height,
+                                                  resample)
+    column_starts, column_weights = _resampling_weights(batch.shape[3],
+                                                        width, resample)
+    out = numpy.empty(batch.shape[:2] + (height, width), dtype=batch.dtype)
+    resize_batch_bchw(batch, row_starts, row_weights, column_starts,
+                      column_weights, out)
+    return out
+
+
+#: The fields of an image index, see :func:`image_index`
+IMAGE_INDEX_DTYPE = numpy.dtype([('height', 'int32'), ('width', 'int32'),
+                                 ('mode', 'S8'), ('num_bytes', 'int64')])
+
+
+def image_index(encoded_images):
+    """Reads the sizes and modes of encoded images from their headers.
+
+    PIL only parses the header of an image when opening it, so this is
+    much faster than decoding the images. The index can be used to plan
+    crops, resizes or batches of similarly sized images before decoding
+    anything.
+
+    Parameters
+    ----------
+    encoded_images : iterable
+        Encoded images, as `bytes` (`str` on Python 2) or 1-dimensional
+        `uint8` arrays, such as the examples of a variable-length source
+        of an HDF5 file.
+
+    Returns
+    -------
+    index : ndarray
+        A structured array of dtype :data:`IMAGE_INDEX_DTYPE` with the
+        `height`, `width`, PIL `mode` and `num_bytes` of each image.
+
+    """
+    rows = []
+    for encoded in encoded_images:
+        if isinstance(encoded, numpy.ndarray):
+            encoded = encoded.tobytes()
+        pil_image = Image.open(BytesIO(encoded))
+        width, height = pil_image.size
+        rows.append((height, width, pil_image.mode, len(encoded)))
+    return numpy.array(rows, dtype=IMAGE_INDEX_DTYPE)
+
+
+@do_not_pickle_attributes('pool')
 class ImagesFromBytes(SourcewiseTransformer):
     """Load from a stream of bytes objects representing encoded images.
 
@@ -24,6 +163,26 @@ class ImagesFromBytes(SourcewiseTransformer):
     color_mode : str, optional
         Mode to pass to PIL for color space conversion. Default is RGB.
         If `None`, no coercion is performed.
+    num_workers : int, optional
+        The number of threads decoding the images of a batch in parallel.
+        PIL releases the GIL while decoding, so this speeds up decoding
+        on multiple cores. Defaults to 1, i.e. images are decoded in the
+        calling thread.
+    stack : bool, optional
+        If `True`, a batch of images which all have the same size is
+        returned as a single `(batch, channel, height, width)` array, which
+        is allocated up front and into which the images are decoded.
+        Batches of images of different sizes are still returned as lists.
+        Defaults to `False`.
+    min_size : 2-tuple, optional
+        The minimum `(height, width)` needed by the transformers further
+        down the stream, e.g. the window shape of a crop or the size
+        images are resized to. JPEG images are then decoded at the
+        smallest of the reduced scales 1/2, 1/4 and 1/8 (or at full
+        scale) which keeps them at least this large, which is several
+        times faster for large images. Images in other formats are
+        decoded at full scale. By default, all images are decoded at full
+        scale.
 
     Notes
     -----
@@ -38,10 +197,12 @@ class ImagesFromBytes(SourcewiseTransformer):
     This SourcewiseTransformer supports streams returning single examples
     as `bytes` objects (`str` on Python 2.x) as well as streams that
     return iterables containing such objects. In the case of an
-    iterable, a list of loaded images is returned.
+    iterable, a list of loaded images is returned (unless `stack` is
+    `True`).
 
     """
-    def __init__(self, data_stream, color_mode='RGB', **kwargs):
+    def __init__(self, data_stream, color_mode='RGB', num_workers=1,
+                 stack=False, min_size=None, **kwargs):
         kwargs.setdefault('produces_examples', data_stream.produces_examples)
         # Acrobatics currently required to correctly set axis labels.
         which_sources = kwargs.get('which_sources', data_stream.sources)
@@ -50,8 +211,45 @@ class ImagesFromBytes(SourcewiseTransformer):
         kwargs.setdefault('axis_labels', axis_labels)
         super(ImagesFromBytes, self).__init__(data_stream, **kwargs)
         self.color_mode = color_mode
+        self.num_workers = num_workers
+        self.stack = stack
+        self.min_size = min_size
+
+    def load(self):
+        # The threads are started when the first batch is decoded
+        self.pool = (ThreadPool(self.num_workers) if self.num_workers > 1
+                     else None)
+
+    def close(self):
+        if getattr(self, '_pool', None) is not None:
+            self.pool.terminate()
+            del self._pool
+        super(ImagesFromBytes, self).close()
 
     def transform_source_example(self, example, source_name):
+        return self._to_array(self._open(example))
+
+    def transform_source_batch(self, batch, source_name):
+        map_ = self.pool.map if self.pool is not None else map
+        if not self.stack:
+            return list(map_(lambda example: self._to_array(
+                self._open(example)), batch))
+        # Opening an image only reads its header
+        pil_images = list(map_(self._open, batch))
+        if len(set((pil_image.size, pil_image.mode)
+                   for pil_image in pil_images)) != 1:
+            return list(map_(self._to_array, pil_images))
+        first = self._to_array(pil_images[0])
+        images = numpy.empty((len(pil_images),) + first.shape,
+                             dtype=first.dtype)
+        images[0] = first
+
+        def decode(i):
+            images[i] = self._to_array(pil_images[i])
+        list(map_(decode, range(1, len(pil_images))))
+        return images
+
+    def _open(self, example):
         if PY3:
             bytes_type = bytes
         else:
@@ -59,6 +257,13 @@ class ImagesFromBytes(SourcewiseTransformer):
         if not isinstance(example, bytes_type):
             raise TypeError("expected {} object".format(bytes_type.__name__))
         pil_image = Image.open(BytesIO(example))
+        if self.min_size is not None:
+            # Only has an effect on JPEG images, which can be decoded at a
+            # reduced scale (and directly in the requested color mode)
+            pil_image.draft(self.color_mode, tuple(self.min_size[::-1]))
+        return pil_image
+
+    def _to_array(self, pil_image):
         if self.color_mode is not None:
             pil_image = pil_image.convert(self.color_mode)
         image = numpy.array(pil_image)
@@ -72,9 +277,6 @@ class ImagesFromBytes(SourcewiseTransformer):
             raise ValueError('unexpected number of axes')
         return image
 
-    def transform_source_batch(self, batch, source_name):
-        return [self.transform_source_example(im, source_name) for im in batch]
-
     def _make_axis_labels(self, data_stream, which_sources, produces_examples):
         # This is ugly and probably deserves a refactoring of how we handle
         # axis labels. It would be simpler to use memoized read-only
@@ -110,9 +312,12 @@ class MinimumImageDimensions(SourcewiseTransformer, ExpectsAxisLabels):
         Images whose height and width are larger than these dimensions
         are passed through as-is.
     resample : str, optional
-        Resampling filter for PIL to use to upsample any images requiring
-        it. Options include 'nearest' (default), 'bilinear', and 'bicubic'.
-        See the PIL documentation for more detailed information.
+        Resampling filter to use to upsample any images requiring it.
+        Options include 'nearest' (default), 'bilinear', and 'bicubic'.
+        Images of dtype `uint8`, `float32` or `float64` are resampled
+        with 'nearest' and 'bilinear' by the same compiled code as
+        :class:`ResizeImages`. Otherwise PIL is used; see the PIL
+        documentation for more detailed information.
 
     Notes
     -----
@@ -121,6 +326,9 @@ class MinimumImageDimensions(SourcewiseTransformer, ExpectsAxisLabels):
     The format of the stream is unaltered.
 
     """
+    #: The PIL filters which are resampled natively, and their names
+    native_resamples = {Image.NEAREST: 'nearest', Image.BILINEAR: 'bilinear'}
+
     def __init__(self, data_stream, minimum_shape, resample='nearest',
                  **kwargs):
         self.minimum_shape = minimum_shape
@@ -150,19 +358,27 @@ class MinimumImageDimensions(SourcewiseTransformer, ExpectsAxisLabels):
         min_height, min_width = self.minimum_shape
         original_height, original_width = example.shape[-2:]
         if original_height < min_height or original_width < min_width:
+            multiplier = max(1, min_width / original_width,
+                             min_height / original_height)
+            width = int(math.ceil(original_width * multiplier))
+            height = int(math.ceil(original_height * multiplier))
+            if (self.resample in self.native_resamples and
+                    example.dtype in NATIVE_DTYPES):
+                images = example.reshape((1,) * (4 - example.ndim) +
+                                         example.shape)
+                resized = _resize(images, (height, width),
+                                  self.native_resamples[self.resample])
+                return resized.reshape(example.shape[:-2] + (height, width))
             dt = example.dtype
             # If we're dealing with a colour image, swap around the axes
             # to be in the format that PIL needs.
             if example.ndim == 3:
-                im = example.tranpose(2, 0, 1)
+                im = example.transpose(1, 2, 0)
             else:
                 im = example
             im = Image.fromarray(im)
-            width, height = im.size
-            multiplier = max(1, min_width / width, min_height / height)
-            width = int(math.ceil(width * multiplier))
-            height = int(math.ceil(height * multiplier))
-            im = numpy.array(im.resize((width, height))).astype(dt)
+            im = numpy.array(im.resize((width, height),
+                                       self.resample)).astype(dt)
             # If necessary, undo the axis swap from earlier.
             if im.ndim == 3:
                 example = im.transpose(2, 0, 1)
@@ -171,6 +387,94 @@ class MinimumImageDimensions(SourcewiseTransformer, ExpectsAxisLabels):
         return example
 
 
+class ResizeImages(SourcewiseTransformer, ExpectsAxisLabels):
+    """Resize images to a fixed shape, or rescale them by a factor.
+
+    Parameters
+    ----------
+    data_stream : :class:`AbstractDataStream`
+        The data stream to wrap.
+    shape : tuple, optional
+        The `(height, width)` tuple representing the size of the output
+        images.
+    scale : float or tuple, optional
+        The factor by which to scale the height and width of the images,
+        or a `(height, width)` tuple of factors. The output sizes are
+        rounded to the nearest integer. Exactly one of `shape` and
+        `scale` must be given.
+    resample : str, optional
+        The resampling method, either 'bilinear' (default), 'area' or
+        'nearest'. Use 'area', which averages the input pixels covered
+        by each output pixel, to shrink images without aliasing.
+
+    Notes
+    -----
+    This transformer expects to act on stream sources which provide one of
+
+     * Single images represented as 3-dimensional ndarrays, with layout
+       `(channel, height, width)`.
+     * Batches of images represented as lists of 3-dimensional ndarrays,
+       possibly of different shapes (i.e. images of differing
+       heights/widths).
+     * Batches of images represented as 4-dimensional ndarrays, with
+       layout `(batch, channel, height, width)`.
+
+    The images must be of dtype `uint8`, `float32` or `float64`. They are
+    resampled by compiled code, without converting them to PIL images,
+    and 4-dimensional batches are resampled in parallel via OpenMP. The
+    format of the stream is unaltered.
+
+    """
+    def __init__(self, data_stream, shape=None, scale=None,
+                 resample='bilinear', **kwargs):
+        if (shape is None) == (scale is None):
+            raise ValueError("pass exactly one of shape and scale")
+        if resample not in ('nearest', 'bilinear', 'area'):
+            raise ValueError("unknown resampling method '{}'".format(
+                resample))
+        if scale is not None and not isinstance(scale, (tuple, list)):
+            scale = (scale, scale)
+        self.shape = shape
+        self.scale = scale
+        self.resample = resample
+        kwargs.setdefault('produces_examples', data_stream.produces_examples)
+        kwargs.setdefault('axis_labels', data_stream.axis_labels)
+        super(ResizeImages, self).__init__(data_stream, **kwargs)
+
+    def output_shape(self, image_shape):
+        """The `(height, width)` of an image of the given shape."""
+        if self.shape is not None:
+            return tuple(self.shape)
+        return tuple(max(1, int(round(size * factor)))
+                     for size, factor in zip(image_shape[-2:], self.scale))
+
+    def transform_source_batch(self, source, source_name):
+        self.verify_axis_labels(('batch', 'channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if isinstance(source, list) and all(isinstance(b, numpy.ndarray) and
+                                            b.ndim == 3 for b in source):
+            return [self.transform_source_example(im, source_name)
+                    for im in source]
+        elif isinstance(source, numpy.ndarray) and source.ndim == 4:
+            return _resize(source, self.output_shape(source.shape),
+                           self.resample)
+        else:
+            raise ValueError("uninterpretable batch format; expected a list "
+                             "of arrays with ndim = 3, or an array with "
+                             "ndim = 4")
+
+    def transform_source_example(self, example, source_name):
+        self.verify_axis_labels(('channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if not isinstance(example, numpy.ndarray) or example.ndim != 3:
+            raise ValueError("uninterpretable example format; expected "
+                             "ndarray with ndim = 3")
+        return _resize(example[None], self.output_shape(example.shape),
+                       self.resample)[0]
+
+
 class RandomFixedSizeCrop(SourcewiseTransformer, ExpectsAxisLabels):
     """Randomly crop images to a fixed window size.
 
@@ -194,11 +498,16 @@ class RandomFixedSizeCrop(SourcewiseTransformer, ExpectsAxisLabels):
      * Batches of images represented as 4-dimensional ndarrays, with
        layout `(batch, channel, height, width)`.
 
-    The format of the stream will be un-altered, i.e. if lists are
-    yielded by `data_stream` then lists will be yielded by this
-    transformer.
+    The windows of a list of images are returned as a single
+    4-dimensional ndarray, cropped in parallel via OpenMP, if the images
+    have the same number of channels and the same dtype, which is one of
+    `uint8`, `float32` and `float64`. Otherwise a list of windows is
+    returned. Examples and 4-dimensional batches are returned in the
+    same format.
 
     """
+    state_attributes = ('rng',)
+
     def __init__(self, data_stream, window_shape, **kwargs):
         self.window_shape = window_shape
         self.rng = kwargs.pop('rng', None)
@@ -216,8 +525,7 @@ class RandomFixedSizeCrop(SourcewiseTransformer, ExpectsAxisLabels):
         windowed_height, windowed_width = self.window_shape
         if isinstance(source, list) and all(isinstance(b, numpy.ndarray) and
                                             b.ndim == 3 for b in source):
-            return [self.transform_source_example(im, source_name)
-                    for im in source]
+            return self._crop_list(source)
         elif isinstance(source, numpy.ndarray) and source.ndim == 4:
             # Hardcoded assumption of (batch, channels, height, width).
             # This is what the fast Cython code supports.
@@ -264,3 +572,310 @@ class RandomFixedSizeCrop(SourcewiseTransformer, ExpectsAxisLabels):
             off_w = 0
         return example[:, off_h:off_h + windowed_height,
                        off_w:off_w + windowed_width]
+
+    def _crop_list(self, images):
+        windowed_height, windowed_width = self.window_shape
+        shapes = numpy.array([image.shape for image in images],
+                             dtype=int).reshape((-1, 3))
+        max_h_offs = shapes[:, 1] - windowed_height
+        max_w_offs = shapes[:, 2] - windowed_width
+        if (max_h_offs < 0).any() or (max_w_offs < 0).any():
+            raise ValueError("can't obtain ({}, {}) window from images of "
+                             "dimensions {}".format(
+                                 windowed_height, windowed_width,
+                                 [tuple(shape[1:]) for shape in shapes]))
+        offsets_h = self.rng.randint(max_h_offs + 1).astype(int)
+        offsets_w = self.rng.randint(max_w_offs + 1).astype(int)
+        dtypes = set(image.dtype for image in images)
+        if (len(dtypes) == 1 and dtypes <= set(NATIVE_DTYPES) and
+                len(set(shapes[:, 0])) == 1):
+            out = numpy.empty((len(images), shapes[0, 0]) +
+                              tuple(self.window_shape), dtype=dtypes.pop())
+            window_list_bchw(images, offsets_h, offsets_w, out)
+            return out
+        return [image[:, off_h:off_h + windowed_height,
+                      off_w:off_w + windowed_width]
+                for image, off_h, off_w in zip(images, offsets_h, offsets_w)]
+
+
+class RandomCropFlipNormalize(SourcewiseTransformer, ExpectsAxisLabels):
+    """Randomly crop and flip images, and normalize them per channel.
+
+    This is equivalent to a :class:`RandomFixedSizeCrop` followed by
+    random horizontal flips, a :class:`.ScaleAndShift` and a
+    :class:`.Cast`, but reads each image once and writes its output once.
+
+    Parameters
+    ----------
+    data_stream : :class:`AbstractDataStream`
+        The data stream to wrap.
+    window_shape : tuple
+        The `(height, width)` tuple representing the size of the output
+        window.
+    flip : bool, optional
+        If `True` (default), each window is flipped horizontally with
+        probability 1/2.
+    mean : float or sequence, optional
+        The mean subtracted from the images, either a scalar or one value
+        per channel. Defaults to 0.
+    std : float or sequence, optional
+        The standard deviation the images are divided by after
+        subtracting the mean, either a scalar or one value per channel.
+        Defaults to 1.
+    dtype : str, optional
+        The floating point data type of the output, either 'float32',
+        'float64' or 'floatX' (default), in which case
+        ``fuel.config.floatX`` is used.
+
+    Notes
+    -----
+    This transformer expects the same formats as
+    :class:`RandomFixedSizeCrop`, with images of dtype `uint8`, `float32`
+    or `float64`. The format of the stream is unaltered. 4-dimensional
+    batches are processed in parallel via OpenMP.
+
+    """
+    state_attributes = ('rng',)
+
+    def __init__(self, data_stream, window_shape, flip=True, mean=0, std=1,
+                 dtype='floatX', **kwargs):
+        if dtype == 'floatX':
+            dtype = config.floatX
+        if numpy.dtype(dtype) not in (numpy.dtype('float32'),
+                                      numpy.dtype('float64')):
+            raise ValueError("dtype must be float32 or float64")
+        self.window_shape = window_shape
+        self.flip = flip
+        self.mean = mean
+        self.std = std
+        self.dtype = numpy.dtype(dtype)
+        self.rng = kwargs.pop('rng', None)
+        if self.rng is None:
+            self.rng = numpy.random.RandomState(config.default_seed)
+        kwargs.setdefault('produces_examples', data_stream.produces_examples)
+        kwargs.setdefault('axis_labels', data_stream.axis_labels)
+        super(RandomCropFlipNormalize, self).__init__(data_stream, **kwargs)
+
+    def transform_source_batch(self, source, source_name):
+        self.verify_axis_labels(('batch', 'channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if isinstance(source, list) and all(isinstance(b, numpy.ndarray) and
+                                            b.ndim == 3 for b in source):
+            offsets_h, offsets_w, flips = self._sample(
+                [image.shape for image in source])
+            return [self._augment(image[None], offsets_h[i:i + 1],
+                                  offsets_w[i:i + 1], flips[i:i + 1])[0]
+                    for i, image in enumerate(source)]
+        elif isinstance(source, numpy.ndarray) and source.ndim == 4:
+            offsets_h, offsets_w, flips = self._sample(
+                [source.shape[1:]] * len(source))
+            return self._augment(source, offsets_h, offsets_w, flips)
+        else:
+            raise ValueError("uninterpretable batch format; expected a list "
+                             "of arrays with ndim = 3, or an array with "
+                             "ndim = 4")
+
+    def transform_source_example(self, example, source_name):
+        self.verify_axis_labels(('channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if not isinstance(example, numpy.ndarray) or example.ndim != 3:
+            raise ValueError("uninterpretable example format; expected "
+                             "ndarray with ndim = 3")
+        return self._augment(example[None], *self._sample([example.shape]))[0]
+
+    def _sample(self, shapes):
+        """Draws the offsets and flips of images of the given shapes."""
+        windowed_height, windowed_width = self.window_shape
+        max_offsets = (numpy.array([shape[-2:] for shape in shapes],
+                                   dtype=int).reshape((-1, 2)) -
+                       self.window_shape)
+        if (max_offsets < 0).any():
+            raise ValueError("can't obtain ({}, {}) window from images of "
+                             "shapes {}".format(windowed_height,
+                                                windowed_width, shapes))
+        offsets = self.rng.randint(max_offsets + 1).astype(int)
+        if self.flip:
+            flips = self.rng.uniform(size=len(shapes)) < 0.5
+        else:
+            flips = numpy.zeros(len(shapes), dtype=bool)
+        return offsets[:, 0], offsets[:, 1], flips.astype('uint8')
+
+    def _augment(self, batch, offsets_h, offsets_w, flips):
+        if batch.dtype not in NATIVE_DTYPES:
+            raise ValueError("can't normalize images of dtype {}".format(
+                batch.dtype))
+        num_channels = batch.shape[1]
+        shifts = numpy.empty(num_channels)
+        shifts[:] = self.mean
+        scales = numpy.empty(num_channels)
+        scales[:] = 1 / numpy.asarray(self.std, dtype=float)
+        out = numpy.empty(batch.shape[:2] + tuple(self.window_shape),
+                          dtype=self.dtype)
+        crop_flip_normalize_bchw(batch, offsets_h, offsets_w, flips, shifts,
+                                 scales, out)
+        return out
+
+
+class RandomResizedCrop(SourcewiseTransformer, ExpectsAxisLabels):
+    """Crop random regions of images and resize them to a fixed shape.
+
+    The area of each region is drawn uniformly from a range of fractions
+    of the image's area, and its aspect ratio log-uniformly from a range
+    of ratios. This is the usual scale augmentation for training on
+    ImageNet.
+
+    Parameters
+    ----------
+    data_stream : :class:`AbstractDataStream`
+        The data stream to wrap.
+    shape : tuple
+        The `(height, width)` tuple representing the size of the output
+        images.
+    scale : tuple, optional
+        The range of the area of the regions, as fractions of the area of
+        the images. Defaults to `(0.08, 1)`.
+    ratio : tuple, optional
+        The range of the aspect ratios (width over height) of the
+        regions. Defaults to `(3 / 4, 4 / 3)`.
+    resample : str, optional
+        The resampling method, either 'bilinear' (default), 'area' or
+        'nearest'.
+    attempts : int, optional
+        The number of times a region is drawn for an image before falling
+        back to the largest central region with an aspect ratio within
+        `ratio`. Regions are redrawn when they don't fit in the image.
+        Defaults to 10.
+
+    Notes
+    -----
+    This transformer expects the same formats as
+    :class:`RandomFixedSizeCrop`. Batches are returned as 4-dimensional
+    ndarrays, so the images of a batch must have the same number of
+    channels and the same dtype, which is one of `uint8`, `float32` and
+    `float64`. The regions of all images of a batch are drawn at once,
+    and resampled straight from the images in parallel via OpenMP.
+
+    """
+    state_attributes = ('rng',)
+
+    def __init__(self, data_stream, shape, scale=(0.08, 1),
+                 ratio=(3 / 4, 4 / 3), resample='bilinear', attempts=10,
+                 **kwargs):
+        if resample not in ('nearest', 'bilinear', 'area'):
+            raise ValueError("unknown resampling method '{}'".format(
+                resample))
+        self.shape = shape
+        self.scale = scale
+        self.ratio = ratio
+        self.resample = resample
+        self.attempts = attempts
+        self.rng = kwargs.pop('rng', None)
+        if self.rng is None:
+            self.rng = numpy.random.RandomState(config.default_seed)
+        kwargs.setdefault('produces_examples', data_stream.produces_examples)
+        kwargs.setdefault('axis_labels', data_stream.axis_labels)
+        super(RandomResizedCrop, self).__init__(data_stream, **kwargs)
+
+    def transform_source_batch(self, source, source_name):
+        self.verify_axis_labels(('batch', 'channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if len(source) == 0:
+            # A filter upstream can leave a batch without images, whose
+            # number of channels is only known if it is a 4D array
+            num_channels = (source.shape[1] if isinstance(
+                source, numpy.ndarray) and source.ndim == 4 else 0)
+            return numpy.empty((0, num_channels) + tuple(self.shape),
+                               dtype=numpy.asarray(source).dtype)
+        if isinstance(source, list) and all(isinstance(b, numpy.ndarray) and
+                                            b.ndim == 3 for b in source):
+            return self._crop_and_resize(source)
+        elif isinstance(source, numpy.ndarray) and source.ndim == 4:
+            return self._crop_and_resize(list(source))
+        else:
+            raise ValueError("uninterpretable batch format; expected a list "
+                             "of arrays with ndim = 3, or an array with "
+                             "ndim = 4")
+
+    def transform_source_example(self, example, source_name):
+        self.verify_axis_labels(('channel', 'height', 'width'),
+                                self.data_stream.axis_labels[source_name],
+                                source_name)
+        if not isinstance(example, numpy.ndarray) or example.ndim != 3:
+            raise ValueError("uninterpretable example format; expected "
+                             "ndarray with ndim = 3")
+        return self._crop_and_resize([example])[0]
+
+    def sample_regions(self, image_shapes):
+        """Draws a region of each image.
+
+        Parameters
+        ----------
+        image_shapes : ndarray
+            The `(height, width)` of each image, with shape
+            `(num_images, 2)`.
+
+        Returns
+        -------
+        regions : ndarray
+            The `(top, left, height, width)` of the region of each image,
+            with shape `(num_images, 4)`.
+
+        """
+        num_images = len(image_shapes)
+        heights, widths = image_shapes[:, :1], image_shapes[:, 1:]
+        size = (num_images, self.attempts)
+        areas = heights * widths * self.rng.uniform(*self.scale, size=size)
+        ratios = numpy.exp(self.rng.uniform(*numpy.log(self.ratio),
+                                            size=size))
+        region_widths = numpy.round(numpy.sqrt(areas * ratios)).astype(int)
+        region_heights = numpy.round(numpy.sqrt(areas / ratios)).astype(int)
+        fits = ((region_heights > 0) & (region_heights <= heights) &
+                (region_widths > 0) & (region_widths <= widths))
+        # The largest central region with a valid aspect ratio
+        ratios = numpy.clip(widths / heights, *self.ratio)
+        fallback_heights = numpy.minimum(
+            heights, numpy.round(widths / ratios).astype(int))
+        fallback_widths = numpy.minimum(
+            widths, numpy.round(heights * ratios).astype(int))
+        found = fits.any(axis=1)
+        attempt = fits.argmax(axis=1)
+        rows = numpy.arange(num_images)
+        region_heights = numpy.where(found, region_heights[rows, attempt],
+                                     fallback_heights[:, 0])
+        region_widths = numpy.where(found, region_widths[rows, attempt],
+                                    fallback_widths[:, 0])
+        max_tops = heights[:, 0] - region_heights
+        max_lefts = widths[:, 0] - region_widths
+        tops = numpy.where(found, self.rng.randint(max_tops + 1),
+                           max_tops // 2)
+        lefts = numpy.where(found, self.rng.randint(max_lefts + 1),
+                            max_lefts // 2)
+        return numpy.stack([tops, lefts, region_heights, region_widths],
+                           axis=1)
+
+    def _crop_and_resize(self, images):
+        dtypes = set(image.dtype for image in images)
+        if len(dtypes) != 1 or not dtypes <= set(NATIVE_DTYPES):
+            raise ValueError("expected images of a single dtype, one of "
+                             "{}".format(', '.join(
+                                 str(dtype) for dtype in NATIVE_DTYPES)))
+        shapes = numpy.array([image.shape for image in images], dtype=int)
+        if len(set(shapes[:, 0])) > 1:
+            raise ValueError("can't stack images with different numbers "
+                             "of channels")
+        if (shapes[:, 1:] == 0).any():
+            raise ValueError("can't crop empty images")
+        height, width = self.shape
+        out = numpy.empty((len(images), shapes[0, 0], height, width),
+                          dtype=dtypes.pop())
+        regions = self.sample_regions(shapes[:, 1:])
+        row_starts, row_weights = _region_weights(
+            regions[:, 0], regions[:, 2], height, self.resample)
+        column_starts, column_weights = _region_weights(
+            regions[:, 1], regions[:, 3], width, self.resample)
+        resize_list_bchw(images, row_starts, row_weights, column_starts,
+                         column_weights, out)
+        return out
@@ -0,0 +1,301 @@
+"""Caching the output of deterministic pipelines on disk."""
+import functools
+import hashlib
+import json
+import numbers
+import os
+import shutil
+import tempfile
+import types
+
+import numpy
+import six
+from six.moves import xrange
+
+from fuel.datasets import Dataset
+from fuel.schemes import IterationScheme, range_parameters
+from fuel.streams import AbstractDataStream
+from fuel.transformers import Transformer
+from fuel.utils import do_not_pickle_attributes
+
+#: Attributes that hold the state of an epoch rather than configuration
+UNHASHED_ATTRIBUTES = ('child_epoch_iterator', 'data_state', 'position')
+
+
+def pipeline_hash(data_stream):
+    """Returns a hash of the configuration of a data stream pipeline.
+
+    The hash covers the classes and attributes of the data streams,
+    datasets and iteration schemes of the pipeline, including arrays
+    (hashed by content), random number generators (hashed by state) and
+    functions (hashed by code, defaults and closure). Other objects, e.g.
+    open files, contribute their type and representation. Objects whose
+    representation includes their address therefore give a different
+    hash in every process, so their pipelines aren't cached across runs.
+
+    Parameters
+    ----------
+    data_stream : :class:`.AbstractDataStream`
+        The last data stream of the pipeline.
+
+    Returns
+    -------
+    hash : str
+        A hexadecimal SHA-1 digest.
+
+    """
+    description = _describe(data_stream, set())
+    return hashlib.sha1(repr(description).encode('utf-8')).hexdigest()
+
+
+def _type_name(obj):
+    cls = type(obj)
+    return '{}.{}'.format(cls.__module__, cls.__name__)
+
+
+def _describe(obj, seen):
+    """Describes an object with a nested tuple of strings and numbers."""
+    if obj is None or isinstance(obj, (bool, numbers.Number, six.string_types,
+                                       six.binary_type)):
+        return obj
+    if isinstance(obj, numpy.ndarray):
+        if obj.dtype.kind == 'O':
+            return ('ndarray', obj.shape, _describe(obj.tolist(), seen))
+        digest = hashlib.sha1(numpy.ascontiguousarray(obj).tobytes())
+        return ('ndarray', obj.dtype.str, obj.shape, digest.hexdigest())
+    if isinstance(obj, numpy.random.RandomState):
+        return ('RandomState', _describe(obj.get_state(), seen))
+    if isinstance(obj, xrange):
+        return ('range',) + range_parameters(obj)
+    if isinstance(obj, slice):
+        return ('slice', _describe(obj.start, seen),
+                _describe(obj.stop, seen), _describe(obj.step, seen))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_describe(item, seen) for item in obj)
+    if isinstance(obj, dict):
+        return tuple(sorted((repr(key), _describe(value, seen))
+                            for key, value in obj.items()))
+    if isinstance(obj, (set, frozenset)):
+        return tuple(sorted(repr(_describe(item, seen)) for item in obj))
+    if isinstance(obj, types.FunctionType):
+        return ('function', obj.__module__, obj.__name__,
+                _describe(six.get_function_code(obj), seen),
+                _describe(six.get_function_defaults(obj), seen),
+                _describe([cell.cell_contents for cell in
+                           six.get_function_closure(obj) or ()], seen))
+    if isinstance(obj, types.CodeType):
+        return ('code', obj.co_code, _describe(obj.co_consts, seen),
+                obj.co_names)
+    if isinstance(obj, types.MethodType):
+        return ('method', _describe(six.get_method_self(obj), seen),
+                _describe(six.get_method_function(obj), seen))
+    if isinstance(obj, functools.partial):
+        return ('partial', _describe(obj.func, seen),
+                _describe(obj.args, seen), _describe(obj.keywords, seen))
+    if (isinstance(obj, (AbstractDataStream, Dataset, IterationScheme)) or
+            type(obj).__module__.split('.')[0] == 'fuel'):
+        if id(obj) in seen:
+            return ('cycle', _type_name(obj))
+        seen.add(id(obj))
+        attributes = dict((key, value)
+                          for key, value in vars(obj).items()
+                          if key not in UNHASHED_ATTRIBUTES)
+        return (_type_name(obj), _describe(attributes, seen))
+    if isinstance(obj, type):
+        return ('type', obj.__module__, obj.__name__)
+    return (_type_name(obj), repr(obj))
+
+
+@do_not_pickle_attributes('arrays', 'recording')
+class Memoize(Transformer):
+    """Caches the first epoch of a deterministic data stream on disk.
+
+    The first epoch is read from the wrapped data stream and written to
+    files in `directory`. Once it is complete, later epochs are read from
+    memory maps of these files instead, without touching the wrapped data
+    stream. The files outlive the process, and are found again using a
+    hash of the configuration of the pipeline (see :func:`pipeline_hash`),
+    so that later runs skip the first epoch's work as well.
+
+    Parameters
+    ----------
+    data_stream : :class:`.AbstractDataStream`
+        The wrapped data stream. It must produce the same data in every
+        epoch, and all examples of a source must have the same shape and
+        data type (which can't be `object`).
+    directory : str
+        The directory in which to store the cache. It is created if it
+        doesn't exist.
+    key : str, optional
+        Identifies the cache in `directory`. Defaults to the hash of the
+        wrapped data stream.
+    iteration_scheme : :class:`.IterationScheme`, optional
+        When given, the cached examples are read with this scheme, e.g. a
+        :class:`.ShuffledScheme`. Examples are indexed in the order in
+        which the first epoch produced them. The first epoch is then
+        recorded in full when its epoch iterator is requested. By default
+        the examples or batches are replayed as the first epoch produced
+        them.
+
+    Notes
+    -----
+    The hash doesn't cover the contents of the files datasets read from,
+    only their paths. When these files change, either remove the cache
+    or pass a new `key`.
+
+    """
+    def __init__(self, data_stream, directory, key=None,
+                 iteration_scheme=None, **kwargs):
+        if data_stream.axis_labels:
+            kwargs.setdefault('axis_labels', data_stream.axis_labels.copy())
+        if iteration_scheme is None:
+            kwargs['produces_examples'] = data_stream.produces_examples
+        super(Memoize, self).__init__(
+            data_stream, iteration_scheme=iteration_scheme, **kwargs)
+        if key is None:
+            key = pipeline_hash(data_stream)
+        self.directory = directory
+        self.key = key
+        self.path = os.path.join(directory, 'memoize-{}'.format(key))
+        self.position = 0
+
+    @property
+    def cached(self):
+        """Whether the first epoch has been recorded."""
+        return self.arrays is not None
+
+    def load(self):
+        self.recording = None
+        if not os.path.isdir(self.path):
+            self.arrays = None
+            return
+        with open(os.path.join(self.path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        self.arrays = tuple(
+            numpy.memmap(os.path.join(self.path, '{}.bin'.format(i)),
+                         dtype=numpy.dtype(dtype), mode='c',
+                         shape=(metadata['num_examples'],) + tuple(shape))
+            for i, (dtype, shape) in enumerate(zip(metadata['dtypes'],
+                                                   metadata['shapes'])))
+        self.offsets = numpy.load(os.path.join(self.path, 'offsets.npy'))
+
+    def close(self):
+        self._abort_recording()
+        super(Memoize, self).close()
+
+    def reset(self):
+        self._abort_recording()
+        super(Memoize, self).reset()
+
+    def get_epoch_iterator(self, **kwargs):
+        self._abort_recording()
+        if not self.cached:
+            # Another process might have completed the cache in the meantime
+            self.load()
+        self.position = 0
+        if self.cached:
+            return super(Transformer, self).get_epoch_iterator(**kwargs)
+        self._start_recording()
+        self.child_epoch_iterator = self.data_stream.get_epoch_iterator()
+        if self.iteration_scheme is not None:
+            while self.recording is not None:
+                try:
+                    self.get_data()
+                except StopIteration:
+                    pass
+        return super(Transformer, self).get_epoch_iterator(**kwargs)
+
+    def get_data(self, request=None):
+        if not self.cached:
+            if request is not None:
+                raise ValueError
+            try:
+                data = next(self.child_epoch_iterator)
+            except StopIteration:
+                self._finish_recording()
+                raise
+            # An unpickled epoch that was being recorded continues without
+            # recording, as the files written so far are gone.
+            if self.recording is not None:
+                self._record(data)
+            return data
+        if request is None:
+            if self.position + 1 >= len(self.offsets):
+                raise StopIteration
+            start, stop = self.offsets[self.position:self.position + 2]
+            self.position += 1
+            request = start if self.produces_examples else slice(start, stop)
+        return tuple(array[request] for array in self.arrays)
+
+    def get_state(self):
+        if not self.cached:
+            raise NotImplementedError('the state of an epoch that is being '
+                                      'recorded cannot be stored')
+        return {'position': self.position}
+
+    def set_state(self, state):
+        self.position = state['position']
+
+    def _start_recording(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.recording = {
+            'path': tempfile.mkdtemp(prefix='.memoize-', dir=self.directory),
+            'files': None, 'dtypes': None, 'shapes': None, 'offsets': [0]}
+
+    def _record(self, data):
+        recording = self.recording
+        if self.data_stream.produces_examples:
+            data = [numpy.asarray(source_data)[None] for source_data in data]
+        else:
+            data = [numpy.asarray(source_data) for source_data in data]
+        if recording['files'] is None:
+            if any(source_data.dtype.kind == 'O' for source_data in data):
+                self._abort_recording()
+                raise ValueError('Memoize cannot cache data of dtype object')
+            recording['files'] = [
+                open(os.path.join(recording['path'], '{}.bin'.format(i)),
+                     'wb') for i in range(len(data))]
+            recording['dtypes'] = [source_data.dtype for source_data in data]
+            recording['shapes'] = [source_data.shape[1:]
+                                   for source_data in data]
+        for source_data, dtype, shape in zip(data, recording['dtypes'],
+                                             recording['shapes']):
+            if source_data.dtype != dtype or source_data.shape[1:] != shape:
+                self._abort_recording()
+                raise ValueError('Memoize requires all examples of a source '
+                                 'to have the same shape and dtype')
+        for source_data, f in zip(data, recording['files']):
+            source_data.tofile(f)
+        recording['offsets'].append(recording['offsets'][-1] + len(data[0]))
+
+    def _finish_recording(self):
+        recording = self.recording
+        if recording is None:
+            return
+        # An empty epoch has no files, and is replayed without sources
+        for f in recording['files'] or ():
+            f.close()
+        metadata = {'num_examples': recording['offsets'][-1],
+                    'dtypes': [dtype.str
+                               for dtype in recording['dtypes'] or ()],
+                    'shapes': recording['shapes'] or []}
+        with open(os.path.join(recording['path'], 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+        numpy.save(os.path.join(recording['path'], 'offsets.npy'),
+                   numpy.array(recording['offsets']))
+        try:
+            os.rename(recording['path'], self.path)
+        except OSError:
+            # Another process completed the same cache first
+            shutil.rmtree(recording['path'])
+        self.load()
+
+    def _abort_recording(self):
+        recording = self.recording
+        if recording is None:
+            return
+        for f in recording['files'] or ():
+            f.close()
+        shutil.rmtree(recording['path'])
+        self.recording = None
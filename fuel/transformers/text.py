@@ -24,6 +24,8 @@ class NGrams(Transformer):
         this source is 'targets'.
 
     """
+    state_attributes = ('sentence', 'index')
+
     def __init__(self, ngram_order, data_stream, target_source='targets',
                  **kwargs):
         if not data_stream.produces_examples:
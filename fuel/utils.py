@@ -15,10 +15,11 @@ else:
 
 
 def iterable_fancy_indexing(iterable, request):
-    if isinstance(iterable, numpy.ndarray):
+    if isinstance(iterable, numpy.ndarray) or isinstance(request, slice):
         return iterable[request]
-    else:
-        return [iterable[r] for r in request]
+    if isinstance(request, numpy.ndarray):
+        request = request.tolist()
+    return [iterable[r] for r in request]
 
 
 def find_in_data_path(filename):
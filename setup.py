@@ -1,4 +1,5 @@
 """Installation script."""
+import sys
 from os import path
 from setuptools import find_packages, setup
 from Cython.Build import cythonize
@@ -6,6 +7,10 @@ from distutils.extension import Extension
 
 HERE = path.abspath(path.dirname(__file__))
 
+# The image kernels run in parallel over the batch with OpenMP where the
+# compiler is known to support it
+OPENMP_ARGS = ['-fopenmp'] if sys.platform.startswith('linux') else []
+
 with open(path.join(HERE, 'README.rst')) as f:
     LONG_DESCRIPTION = f.read().strip()
 
@@ -37,9 +42,16 @@ setup(
     extras_require={
         'test': ['nose', 'nose2', 'mock']
     },
-    scripts=['bin/fuel-convert', 'bin/fuel-download', 'bin/fuel-info'],
-    ext_modules=cythonize(Extension("fuel.transformers._image",
-                                    ["fuel/transformers/_image.pyx"],
-                                    extra_compile_args=[
-                                        '-Wno-unused-function']))
+    scripts=['bin/fuel-bench', 'bin/fuel-convert', 'bin/fuel-download',
+             'bin/fuel-info'],
+    ext_modules=cythonize([Extension("fuel.transformers._image",
+                                     ["fuel/transformers/_image.pyx"],
+                                     extra_compile_args=[
+                                         '-Wno-unused-function'] +
+                                     OPENMP_ARGS,
+                                     extra_link_args=OPENMP_ARGS),
+                           Extension("fuel.datasets._text",
+                                     ["fuel/datasets/_text.pyx"],
+                                     extra_compile_args=[
+                                         '-Wno-unused-function'])])
 )
@@ -0,0 +1,52 @@
+import json
+
+from numpy.testing import assert_equal, assert_raises
+
+from fuel.benchmarks import decoding, pipelines, startup
+
+
+class TestPipelines(object):
+    def setUp(self):
+        self.settings = dict(num_examples=50, batch_size=8,
+                             example_shape=(3, 8, 8), epochs=2)
+
+    def test_run(self):
+        names = ['h5py_sequential', 'h5py_shuffled', 'text_padding',
+                 'text_file', 'text_file_shuffled',
+                 'numberized_text_shuffled', 'image_crops',
+                 'image_augmentation', 'image_augmentation_fused']
+        report = pipelines.run(names, isolate=False, chunk_size=16,
+                               compression='gzip', **self.settings)
+        assert_equal(list(report['results']), names)
+        for result in report['results'].values():
+            assert_equal(result['batches'], 14)
+            assert_equal(result['examples'], 100)
+            assert result['examples_per_second'] > 0
+            assert result['megabytes_per_second'] > 0
+            assert (result['latency_ms']['p50'] <=
+                    result['latency_ms']['p100'])
+        json.dumps(report)
+
+    def test_run_isolated(self):
+        report = pipelines.run(['h5py_sequential'], **self.settings)
+        result = report['results']['h5py_sequential']
+        assert_equal(result['examples'], 100)
+        assert result['peak_rss_mb'] > 0
+
+    def test_unknown_setting(self):
+        assert_raises(ValueError, pipelines.run, batchsize=10)
+
+
+def test_startup():
+    results = startup.run(repeat=1)
+    assert_equal(sorted(results), sorted(startup.MODULES))
+    for result in results.values():
+        assert_equal(result['heavy_modules'], [])
+        assert result['seconds'] > 0
+
+
+def test_decoding():
+    results = decoding.run(num_images=4, batch_size=2, shape=(16, 16),
+                           num_workers=(2,), repeat=1)
+    assert_equal(sorted(results), ['draft', 'serial', 'threads-2',
+                                   'threads-2-stacked'])
@@ -19,7 +19,9 @@ from six.moves import range, zip, cPickle
 from fuel.converters.base import (fill_hdf5_file, check_exists,
                                   MissingInputFiles)
 from fuel.converters import (binarized_mnist, caltech101_silhouettes,
-                             iris, cifar10, cifar100, mnist, svhn)
+                             iris, cifar10, cifar100, mnist,
+                             one_billion_word, svhn)
+from fuel.datasets import NumberizedText
 from fuel.downloaders.caltech101_silhouettes import silhouettes_downloader
 from fuel.downloaders.base import default_downloader
 
@@ -67,6 +69,18 @@ class TestFillHDF5File(object):
         assert_equal(str(self.h5file['features'].dtype), 'uint8')
         assert_equal(str(self.h5file['targets'].dtype), 'float32')
 
+    def test_dataset_kwargs(self):
+        fill_hdf5_file(
+            self.h5file,
+            (('train', 'features', self.train_features),
+             ('train', 'targets', self.train_targets)),
+            dataset_kwargs={'features': {'chunks': (2, 2, 2),
+                                         'compression': 'gzip'}})
+        assert_equal(self.h5file['features'].chunks, (2, 2, 2))
+        assert_equal(self.h5file['features'].compression, 'gzip')
+        assert self.h5file['targets'].chunks is None
+        assert_equal(self.h5file['features'], self.train_features)
+
     def test_multiple_length_error(self):
         train_targets = numpy.arange(8, dtype='float32').reshape((8, 1))
         assert_raises(ValueError, fill_hdf5_file, self.h5file,
@@ -485,6 +499,61 @@ class TestIris(object):
             assert numpy.allclose(h5['targets'], targets)
 
 
+class TestOneBillionWord(object):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tempdir,
+                              'heldout-monolingual.tokenized.shuffled'))
+        self.sentences = [["The cat sat .\n", "A dog !\n"],
+                          ["the dog\n", "\n", "Cat"]]
+        for i, sentences in enumerate(self.sentences):
+            with open(os.path.join(
+                    self.tempdir, 'heldout-monolingual.tokenized.shuffled',
+                    'news.en.heldout-{:05d}-of-00050'.format(i)), 'w') as f:
+                f.write(''.join(sentences))
+        self.dictionary = {'<UNK>': 0, '<S>': 1, '</S>': 2, 'the': 3,
+                           'cat': 4, 'dog': 5}
+        self.dictionary_path = os.path.join(self.tempdir, 'dictionary.pkl')
+        with open(self.dictionary_path, 'wb') as f:
+            cPickle.dump(self.dictionary, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_converter(self):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        subparser = subparsers.add_parser('one_billion_word')
+        subparser.set_defaults(
+            directory=self.tempdir, output_directory=self.tempdir)
+        one_billion_word.fill_subparser(subparser)
+        args = parser.parse_args(
+            ['one_billion_word', 'heldout', '1', '0', '--dictionary',
+             self.dictionary_path, '--lowercase'])
+        args_dict = vars(args)
+        func = args_dict.pop('func')
+        filename, = func(**args_dict)
+        assert_equal(os.path.basename(filename),
+                     'one_billion_word_heldout.hdf5')
+        with h5py.File(filename, mode='r') as h5file:
+            assert_equal(h5file['tokens'][...],
+                         [1, 3, 5, 2, 1, 2, 1, 4, 2,
+                          1, 3, 4, 0, 0, 2, 1, 0, 5, 0, 2])
+            assert_equal(h5file['offsets'][...], [0, 4, 6, 9, 15, 20])
+            assert_equal(str(h5file['tokens'].dtype), 'int32')
+            assert_equal(h5file.attrs['level'], 'word')
+        dataset = NumberizedText(filename, dictionary=self.dictionary_path)
+        assert_equal(dataset.get_data(request=1)[0], [1, 2])
+        assert_raises(ValueError, NumberizedText, filename,
+                      level='character')
+
+    def test_missing_partitions(self):
+        assert_raises(MissingInputFiles,
+                      one_billion_word.convert_one_billion_word,
+                      'heldout', [0, 2], self.dictionary, self.tempdir,
+                      self.tempdir)
+
+
 class TestSVHN(object):
     def setUp(self):
         numpy.random.seed(9 + 5 + 2015)
@@ -5,9 +5,11 @@ from numpy.testing import assert_raises, assert_equal
 from picklable_itertools import repeat
 from six.moves import zip, range, cPickle
 
-from fuel.datasets import Dataset, IterableDataset, IndexableDataset
+from fuel.datasets import (Dataset, IterableDataset, IndexableDataset,
+                           CachedDataset)
 from fuel.streams import DataStream
-from fuel.schemes import ShuffledScheme, BatchSizeScheme, ConstantScheme
+from fuel.schemes import (SequentialScheme, ShuffledScheme, BatchSizeScheme,
+                          ConstantScheme)
 from fuel.transformers import Mapping
 
 
@@ -132,6 +134,103 @@ class TestIndexableDataset(object):
         assert set(returned[0]) == set(range(50))
         assert set(returned[1]) == set(range(1, 51))
 
+    def test_array_requests(self):
+        data = IndexableDataset(OrderedDict([('foo', list(range(10))),
+                                             ('bar', numpy.arange(10))]))
+        assert_equal(data.get_data(request=slice(2, 5)),
+                     ([2, 3, 4], numpy.arange(2, 5)))
+        assert_equal(data.get_data(request=numpy.array([7, 1])),
+                     ([7, 1], numpy.array([7, 1])))
+
+    def test_batch_iteration_scheme_with_array_requests(self):
+        data = IndexableDataset(numpy.arange(50))
+        for scheme in (SequentialScheme(50, 7, array_requests=True),
+                       ShuffledScheme(50, 7, array_requests=True)):
+            stream = DataStream(data, iteration_scheme=scheme)
+            returned = numpy.concatenate(
+                [batch for batch, in stream.get_epoch_iterator()])
+            assert_equal(numpy.sort(returned), numpy.arange(50))
+
+
+class TestCachedDataset(object):
+    def setUp(self):
+        self.requests = []
+        requests = self.requests
+
+        class RecordingDataset(IndexableDataset):
+            def get_data(self, state=None, request=None):
+                requests.append(request)
+                return super(RecordingDataset, self).get_data(state, request)
+
+        self.features = numpy.arange(40, dtype='float32').reshape((10, 4))
+        self.words = [[i] * i for i in range(10)]
+        self.dataset = RecordingDataset(OrderedDict(
+            [('features', self.features), ('words', self.words)]))
+        self.cached = CachedDataset(self.dataset, max_bytes=10 ** 6)
+
+    def test_requests(self):
+        assert_equal(self.cached.get_data(request=[3, 1]),
+                     (self.features[[3, 1]], [[3] * 3, [1]]))
+        assert_equal(self.cached.get_data(request=slice(0, 3)),
+                     (self.features[:3], self.words[:3]))
+        assert_equal(self.cached.get_data(request=2),
+                     (self.features[2], [2, 2]))
+        assert_equal(self.requests, [[1, 3], [0, 2]])
+        assert_equal((self.cached.hits, self.cached.misses), (2, 4))
+        assert_equal(self.cached.hit_rate, 1 / 3.)
+
+    def test_empty_request(self):
+        assert_equal(self.cached.get_data(request=[]), ([], []))
+        self.cached.get_data(request=[1])
+        features, words = self.cached.get_data(request=slice(3, 3))
+        assert_equal((features.shape, str(features.dtype)), ((0,), 'float32'))
+        assert_equal(words, [])
+        assert_equal(self.requests, [[1]])
+
+    def test_duplicate_indices(self):
+        self.cached.get_data(request=[1])
+        assert_equal(self.cached.get_data(request=[1, 2, 1, 2]),
+                     (self.features[[1, 2, 1, 2]], [[1], [2, 2]] * 2))
+        assert_equal((self.cached.hits, self.cached.misses), (1, 2))
+
+    def test_single_index_is_copied(self):
+        for _ in range(2):
+            features, words = self.cached.get_data(request=2)
+            assert_equal(features, self.features[2])
+            features[...] = -1
+        assert_equal(self.cached.get_data(request=[2])[0],
+                     self.features[[2]])
+
+    def test_lru_eviction(self):
+        cached = CachedDataset(IndexableDataset(self.features), 4 * 16)
+        for index in range(4):
+            cached.get_data(request=[index])
+        cached.get_data(request=[0])
+        cached.get_data(request=[4])
+        assert_equal(list(cached.cache), [2, 3, 0, 4])
+        assert_equal(cached.num_bytes, 4 * 16)
+
+    def test_sources(self):
+        cached = CachedDataset(self.dataset, 1000, sources=('words',))
+        assert_equal(cached.get_data(request=[5]), ([[5] * 5],))
+
+    def test_stream(self):
+        stream = DataStream(self.cached, iteration_scheme=ShuffledScheme(
+            10, 3, rng=numpy.random.RandomState(1)))
+        for _ in range(2):
+            features, = zip(*[(batch[0],)
+                              for batch in stream.get_epoch_iterator()])
+            assert_equal(numpy.sort(numpy.concatenate(features), axis=0),
+                         self.features)
+        assert self.cached.hits > 0
+
+    def test_pickling(self):
+        cached = CachedDataset(IndexableDataset(self.features), 1000)
+        cached.get_data(request=[1, 2])
+        cached = cPickle.loads(cPickle.dumps(cached))
+        assert_equal((len(cached.cache), cached.num_bytes), (0, 0))
+        assert_equal(cached.get_data(request=[1])[0], self.features[[1]])
+
 
 def test_sources_selection():
     features = [5, 6, 7, 1]
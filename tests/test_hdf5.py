@@ -1,11 +1,15 @@
 import os
+from io import BytesIO
+
 import tables
 
 import h5py
 import numpy
 from numpy.testing import assert_equal, assert_raises
+from PIL import Image
 from six.moves import range, cPickle
 
+from fuel.converters.base import add_image_index
 from fuel.datasets.hdf5 import PytablesDataset, H5PYDataset
 from fuel.streams import DataStream
 from fuel.schemes import SequentialScheme
@@ -45,6 +49,10 @@ class TestPytablesDataset(object):
         assert_equal(self.dataset.get_data(request=list(range(10)))[0],
                      numpy.arange(20, 30).reshape(10, 1))
 
+    def test_get_data_array_request(self):
+        assert_equal(self.dataset.get_data(request=numpy.arange(10))[0],
+                     numpy.arange(20, 30).reshape(10, 1))
+
     def test_get_data_value_error(self):
         assert_raises(ValueError, self.dataset.get_data, None, True)
 
@@ -229,6 +237,25 @@ class TestH5PYDataset(object):
                      (self.features[request], self.targets[request]))
         dataset.close(handle)
 
+    def test_out_of_memory_array_request(self):
+        dataset = H5PYDataset(
+            self.h5file, which_sets=('test',), load_in_memory=False)
+        handle = dataset.open()
+        request = numpy.array([7, 4, 6, 2, 5])
+        assert_equal(dataset.get_data(handle, request),
+                     (self.features[request + 20],
+                      self.targets[request + 20]))
+        dataset.close(handle)
+
+    def test_in_memory_array_request(self):
+        dataset = H5PYDataset(
+            self.h5file, which_sets=('train',), load_in_memory=True)
+        handle = dataset.open()
+        request = numpy.array([7, 4, 6, 2, 5])
+        assert_equal(dataset.get_data(handle, request),
+                     (self.features[request], self.targets[request]))
+        dataset.close(handle)
+
     def test_out_of_memory_unsorted_indices(self):
         dataset = H5PYDataset(
             self.h5file, which_sets=('train',), load_in_memory=False,
@@ -246,6 +273,28 @@ class TestH5PYDataset(object):
                       self.targets[slice(0, 10, 2)]))
         dataset.close(handle)
 
+    def test_shards(self):
+        for load_in_memory in (False, True):
+            for subset in (None, slice(2, 20), [0, 2, 4, 6, 8, 10]):
+                expected = self.features[:20][subset or slice(None)]
+                shards = []
+                for i in range(3):
+                    dataset = H5PYDataset(
+                        self.h5file, which_sets=('train',), subset=subset,
+                        load_in_memory=load_in_memory, num_shards=3,
+                        shard_index=i)
+                    handle = dataset.open()
+                    shards.append(dataset.get_data(
+                        handle, slice(0, dataset.num_examples))[0])
+                    dataset.close(handle)
+                assert_equal(numpy.concatenate(shards), expected)
+        dataset = H5PYDataset(self.h5file, which_sets=('train',),
+                              num_shards=3, shard_index=2, equal_shards=True)
+        assert_equal(dataset.num_examples, 6)
+        assert_equal(dataset.subsets, [slice(12, 18, None)] * 2)
+        assert_raises(ValueError, H5PYDataset, self.h5file,
+                      which_sets=('train',), num_shards=2, shard_index=2)
+
     def test_value_error_on_unequal_sources(self):
         def get_subsets():
             return H5PYDataset(self.h5file, which_sets=('train',)).subsets
@@ -407,3 +456,58 @@ class TestH5PYDataset(object):
             assert_equal(val, truth)
         assert_equal(rval[1], expected_targets)
         dataset.close(handle)
+
+
+class TestImageIndex(object):
+    def setUp(self):
+        self.shapes = [(4, 6, 'RGB', 'PNG'), (7, 3, 'L', 'PNG'),
+                       (16, 8, 'RGB', 'JPEG'), (5, 5, 'RGBA', 'PNG')]
+        encoded = []
+        for height, width, mode, image_format in self.shapes:
+            bytes_io = BytesIO()
+            Image.new(mode, (width, height)).save(bytes_io,
+                                                  format=image_format)
+            encoded.append(numpy.frombuffer(bytes_io.getvalue(), 'uint8'))
+        self.num_bytes = [len(image) for image in encoded]
+        h5file = h5py.File(
+            'images.hdf5', mode='w', driver='core', backing_store=False)
+        dtype = h5py.special_dtype(vlen=numpy.dtype('uint8'))
+        images = h5file.create_dataset('images', (4,), dtype=dtype)
+        images[...] = encoded
+        images.dims[0].label = 'batch'
+        split_dict = {'train': {'images': (0, 3)}, 'test': {'images': (3, 4)}}
+        h5file.attrs['split'] = H5PYDataset.create_split_array(split_dict)
+        self.h5file = h5file
+
+    def tearDown(self):
+        self.h5file.close()
+
+    def check_index(self, index, examples):
+        assert_equal(index['height'], [self.shapes[i][0] for i in examples])
+        assert_equal(index['width'], [self.shapes[i][1] for i in examples])
+        assert_equal(index['mode'], [self.shapes[i][2].encode('ascii')
+                                     for i in examples])
+        assert_equal(index['num_bytes'], [self.num_bytes[i]
+                                          for i in examples])
+
+    def test_built_from_headers(self):
+        dataset = H5PYDataset(self.h5file, which_sets=('train',))
+        index = dataset.get_image_index('images', chunk_size=2)
+        self.check_index(index, [0, 1, 2])
+        assert dataset.get_image_index('images') is index
+
+    def test_stored_index(self):
+        add_image_index(self.h5file, 'images', chunk_size=3)
+        self.check_index(self.h5file['images_image_index'][...], range(4))
+        # Changing the stored index shows that it is read
+        self.h5file['images_image_index'][0, 'height'] = 100
+        dataset = H5PYDataset(self.h5file, which_sets=('train',),
+                              subset=slice(0, 3, 2))
+        index = dataset.get_image_index('images')
+        assert_equal(index['height'], [100, 16])
+        dataset = H5PYDataset(self.h5file, which_sets=('test',))
+        self.check_index(dataset.get_image_index('images'), [3])
+
+    def test_unknown_source(self):
+        dataset = H5PYDataset(self.h5file, which_sets=('train',))
+        assert_raises(ValueError, dataset.get_image_index, 'features')
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy
+from numpy.testing import assert_equal, assert_raises
+
+from fuel.datasets import IndexableDataset, IterableDataset
+from fuel.profiling import Profiler
+from fuel.schemes import SequentialScheme
+from fuel.streams import DataStream
+from fuel.transformers import Mapping, Merge, ScaleAndShift
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class TestProfiler(object):
+    def setUp(self):
+        dataset = IndexableDataset({'features': numpy.ones((20, 5))})
+        self.data_stream = DataStream(
+            dataset, iteration_scheme=SequentialScheme(20, 5))
+
+        def slow(data):
+            time.sleep(0.01)
+            return data
+
+        self.stream = ScaleAndShift(Mapping(self.data_stream, slow), 2, 1)
+
+    def iterate(self, profiler):
+        with profiler:
+            batches = list(self.stream.get_epoch_iterator())
+        return batches
+
+    def test_graph(self):
+        profiler = Profiler(self.stream)
+        names = []
+        node = profiler.root
+        while node.children:
+            names.append(node.name)
+            node, = node.children
+        names.append(node.name)
+        assert_equal(names, ['ScaleAndShift', 'Mapping', 'DataStream',
+                             'IndexableDataset'])
+
+    def test_statistics(self):
+        profiler = Profiler(self.stream)
+        self.iterate(profiler)
+        scale_and_shift = profiler.root
+        mapping, = scale_and_shift.children
+        data_stream, = mapping.children
+        dataset, = data_stream.children
+        for node in (scale_and_shift, mapping, data_stream, dataset):
+            assert_equal(node.calls, 4)
+            assert node.exclusive_time <= node.wall_time
+        assert_equal(scale_and_shift.bytes, 20 * 5 * 8)
+        assert mapping.exclusive_time >= 0.04
+        assert scale_and_shift.wall_time >= mapping.wall_time
+        assert scale_and_shift.exclusive_time < 0.04
+
+    def test_uninstrumented_after_exit(self):
+        profiler = Profiler(self.stream)
+        self.iterate(profiler)
+        assert 'get_data' not in self.stream.__dict__
+        assert 'get_data' not in self.data_stream.dataset.__dict__
+        list(self.stream.get_epoch_iterator())
+        assert_equal(profiler.root.calls, 4)
+
+    def test_same_data(self):
+        expected = list(self.stream.get_epoch_iterator())
+        assert_equal(self.iterate(Profiler(self.stream)), expected)
+
+    def test_report(self):
+        profiler = Profiler(self.stream)
+        self.iterate(profiler)
+        lines = profiler.report().split('\n')
+        assert_equal(len(lines), 5)
+        assert lines[1].startswith('ScaleAndShift')
+        assert lines[4].startswith('      IndexableDataset')
+
+    def test_chrome_trace(self):
+        profiler = Profiler(self.stream)
+        self.iterate(profiler)
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            trace = profiler.chrome_trace(filename)
+            with open(filename) as f:
+                assert_equal(json.load(f), trace)
+        finally:
+            os.remove(filename)
+        events = trace['traceEvents']
+        assert_equal(len(events), 4 * 4)
+        assert all(event['ph'] == 'X' for event in events)
+
+    def test_merge(self):
+        streams = [DataStream(IterableDataset(range(3))),
+                   DataStream(IterableDataset(range(3)))]
+        merge = Merge(streams, ('a', 'b'))
+        profiler = Profiler(merge)
+        with profiler:
+            epoch = merge.get_epoch_iterator()
+            for _ in range(3):
+                next(epoch)
+        assert_equal([child.calls for child in profiler.root.children],
+                     [3, 3])
+
+    def test_track_memory(self):
+        if not hasattr(tracemalloc, 'reset_peak'):
+            assert_raises(ValueError, Profiler, self.stream,
+                          track_memory=True)
+            return
+        profiler = Profiler(self.stream, track_memory=True)
+        self.iterate(profiler)
+        assert profiler.root.peak_allocation >= 5 * 5 * 8
+        assert not tracemalloc.is_tracing()
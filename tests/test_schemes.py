@@ -1,10 +1,12 @@
 import numpy
 from numpy.testing import assert_raises
+from six.moves import cPickle
 
 from fuel.schemes import (ConstantScheme, SequentialExampleScheme,
                           SequentialScheme, ShuffledExampleScheme,
-                          ShuffledScheme, ConcatenatedScheme,
-                          cross_validation)
+                          ShuffledScheme, LazyShuffledScheme,
+                          ConcatenatedScheme, cross_validation,
+                          shard_indices, skip_requests)
 
 
 def iterator_requester(scheme):
@@ -38,6 +40,34 @@ def test_sequential_scheme():
     assert not SequentialScheme(3, 3).requests_examples
 
 
+def test_sequential_scheme_array_requests():
+    get_request_iterator = iterator_requester(SequentialScheme)
+    assert (list(get_request_iterator(5, 3, array_requests=True)) ==
+            [slice(0, 3), slice(3, 5)])
+    assert (list(get_request_iterator(range(1, 10, 3), 2,
+                                      array_requests=True)) ==
+            [slice(1, 7, 3), slice(7, 10, 3)])
+    requests = list(get_request_iterator([4, 5, 2, 1, 0], 2,
+                                         array_requests=True))
+    assert requests[0] == slice(4, 6)
+    assert isinstance(requests[1], numpy.ndarray)
+    assert requests[1].tolist() == [2, 1]
+    assert requests[2] == slice(0, 1)
+
+
+def test_shuffled_scheme_array_requests():
+    requests = list(ShuffledScheme(
+        7, 3, array_requests=True, rng=numpy.random.RandomState(3),
+        sorted_indices=True).get_request_iterator())
+    expected = ShuffledScheme(
+        7, 3, rng=numpy.random.RandomState(3),
+        sorted_indices=True).get_request_iterator()
+    for request, expected_request in zip(requests, expected):
+        if isinstance(request, slice):
+            request = list(range(request.start, request.stop))
+        assert list(request) == expected_request
+
+
 def test_shuffled_scheme_sorted_indices():
     get_request_iterator = iterator_requester(ShuffledScheme)
     indices = list(range(7))
@@ -84,6 +114,58 @@ def test_shuffled_scheme_requests_batches():
     assert not ShuffledScheme(3, 3).requests_examples
 
 
+def test_shuffled_scheme_pickles_mid_epoch():
+    iterator = ShuffledScheme(10, 3).get_request_iterator()
+    next(iterator)
+    copy = cPickle.loads(cPickle.dumps(iterator))
+    assert list(copy) == list(iterator)
+
+
+def test_lazy_shuffled_scheme_is_permutation():
+    get_request_iterator = iterator_requester(LazyShuffledScheme)
+    for num_examples in (0, 1, 2, 7, 100, 1025):
+        batches = list(get_request_iterator(num_examples, 8))
+        assert all(len(batch) <= 8 for batch in batches)
+        assert (sorted(sum(batches, [])) == list(range(num_examples)))
+    batches = list(get_request_iterator(range(5, 50, 3), 4))
+    assert sorted(sum(batches, [])) == list(range(5, 50, 3))
+    batches = list(get_request_iterator([4, 3, 2, 1, 0], 2))
+    assert sorted(sum(batches, [])) == [0, 1, 2, 3, 4]
+
+
+def test_lazy_shuffled_scheme_shuffles():
+    batches = list(LazyShuffledScheme(100, 100).get_request_iterator())
+    assert batches[0] != list(range(100))
+
+
+def test_lazy_shuffled_scheme_reproducible():
+    def get_epochs(seed):
+        scheme = LazyShuffledScheme(
+            50, 7, rng=numpy.random.RandomState(seed))
+        return [list(scheme.get_request_iterator()) for _ in range(2)]
+    epochs = get_epochs(3)
+    assert epochs == get_epochs(3)
+    assert epochs[0] != epochs[1]
+    assert epochs != get_epochs(4)
+
+
+def test_lazy_shuffled_scheme_sorted_indices():
+    for batch in LazyShuffledScheme(
+            20, 6, sorted_indices=True).get_request_iterator():
+        assert batch == sorted(batch)
+
+
+def test_lazy_shuffled_scheme_pickles_mid_epoch():
+    iterator = LazyShuffledScheme(1000, 10).get_request_iterator()
+    next(iterator)
+    copy = cPickle.loads(cPickle.dumps(iterator))
+    assert list(copy) == list(iterator)
+
+
+def test_lazy_shuffled_scheme_requests_batches():
+    assert not LazyShuffledScheme(3, 3).requests_examples
+
+
 def test_shuffled_example_scheme():
     get_request_iterator = iterator_requester(ShuffledExampleScheme)
     indices = list(range(7))
@@ -135,6 +217,80 @@ def test_concatenated_scheme_infers_request_type():
                  SequentialExampleScheme(examples=10)]).requests_examples
 
 
+def test_scheme_state_restores_shuffling():
+    for scheme in (ShuffledScheme(10, 3), LazyShuffledScheme(10, 3),
+                   ShuffledExampleScheme(10),
+                   ConcatenatedScheme([ShuffledScheme(4, 2),
+                                       ShuffledScheme(4, 2)])):
+        state = scheme.get_state()
+        expected = list(scheme.get_request_iterator())
+        assert list(scheme.get_request_iterator()) != expected
+        scheme.set_state(state)
+        assert list(scheme.get_request_iterator()) == expected
+
+
+def test_deterministic_scheme_state_is_empty():
+    assert SequentialScheme(10, 3).get_state() == {}
+    assert ConstantScheme(3).get_state() == {}
+
+
+def test_skip_requests():
+    for scheme in (SequentialScheme(10, 3),
+                   SequentialScheme(10, 3, array_requests=True),
+                   ShuffledScheme(10, 3), LazyShuffledScheme(10, 3),
+                   ShuffledExampleScheme(10), SequentialExampleScheme(10),
+                   ConstantScheme(3, num_examples=10)):
+        state = scheme.get_state()
+        expected = list(scheme.get_request_iterator())
+        for num_requests in (0, 2, len(expected), len(expected) + 1):
+            scheme.set_state(state)
+            iterator = skip_requests(scheme.get_request_iterator(),
+                                     num_requests)
+            assert ([numpy.asarray(numpy.arange(10)[r]).tolist()
+                     for r in iterator] ==
+                    [numpy.asarray(numpy.arange(10)[r]).tolist()
+                     for r in expected[num_requests:]])
+
+
+def test_shard_indices():
+    assert list(shard_indices(range(10), 3, 1)) == [3, 4, 5]
+    assert list(shard_indices(range(10), 3, 1, equal=True)) == [3, 4, 5]
+    assert list(shard_indices(range(10), 3, 2, equal=True)) == [6, 7, 8]
+    assert list(shard_indices(range(10), 3, 0, strided=True)) == [0, 3, 6, 9]
+    assert list(shard_indices(range(2, 20, 2), 2, 1)) == [10, 12, 14, 16, 18]
+    assert shard_indices([5, 3, 1, 0], 2, 1, strided=True) == [3, 0]
+    assert_raises(ValueError, shard_indices, range(10), 3, 3)
+
+
+def test_sharded_schemes_are_disjoint():
+    def examples(scheme):
+        return [numpy.asarray(numpy.arange(10)[request]).ravel().tolist()
+                for request in scheme.get_request_iterator()]
+
+    for scheme_class, kwargs in (
+            (SequentialScheme, {'batch_size': 2}),
+            (SequentialScheme, {'batch_size': 2, 'array_requests': True}),
+            (ShuffledScheme, {'batch_size': 2}),
+            (LazyShuffledScheme, {'batch_size': 2}),
+            (SequentialExampleScheme, {}),
+            (ShuffledExampleScheme, {})):
+        full = sum(examples(scheme_class(10, **kwargs)), [])
+        for strided in (False, True):
+            for equal in (False, True):
+                shards = [examples(scheme_class(
+                    10, num_shards=3, shard_index=i, strided_shards=strided,
+                    equal_shards=equal, **kwargs)) for i in range(3)]
+                batch_counts = set(len(shard) for shard in shards)
+                shards = [sum(shard, []) for shard in shards]
+                pieces = [shard_indices(full, 3, i, strided, equal)
+                          for i in range(3)]
+                assert shards == pieces
+                if equal:
+                    assert len(batch_counts) == 1
+    assert_raises(ValueError, ShuffledScheme, 10, 2, num_shards=2,
+                  shard_index=2)
+
+
 def test_cross_validation():
     # test raise when strict=True
     cross = cross_validation(SequentialExampleScheme, 10, 3)
@@ -1,8 +1,10 @@
 import numpy
 from numpy.testing import assert_equal, assert_raises
+from six.moves import cPickle
 
 from fuel.datasets import IterableDataset, IndexableDataset
-from fuel.schemes import SequentialExampleScheme, SequentialScheme
+from fuel.schemes import (SequentialExampleScheme, SequentialScheme,
+                          ShuffledScheme)
 from fuel.streams import AbstractDataStream, DataStream
 
 
@@ -63,3 +65,38 @@ class TestDataStream(object):
         stream = DataStream(self.dataset,
                             iteration_scheme=SequentialExampleScheme(2))
         assert stream.produces_examples
+
+    def test_resume_without_scheme(self):
+        stream = DataStream(IterableDataset(range(10)))
+        iterator = stream.get_epoch_iterator()
+        for _ in range(4):
+            next(iterator)
+        state = iterator.get_state()
+        expected = list(iterator)
+        resumed = DataStream(IterableDataset(range(10))).get_epoch_iterator()
+        resumed.set_state(state)
+        assert_equal(list(resumed), expected)
+
+    def test_resume_with_scheme(self):
+        def stream():
+            return DataStream(IndexableDataset(numpy.arange(20)),
+                              iteration_scheme=ShuffledScheme(
+                                  20, 3, rng=numpy.random.RandomState(1)))
+        original = stream()
+        original.get_epoch_iterator()
+        iterator = original.get_epoch_iterator()
+        next(iterator)
+        state = cPickle.loads(cPickle.dumps(iterator.get_state()))
+        expected = list(iterator) + list(original.get_epoch_iterator())
+        resumed = stream()
+        iterator = resumed.get_epoch_iterator()
+        iterator.set_state(state)
+        assert_equal(list(iterator) + list(resumed.get_epoch_iterator()),
+                     expected)
+
+    def test_set_state_on_used_iterator(self):
+        stream = DataStream(IterableDataset(range(10)))
+        iterator = stream.get_epoch_iterator()
+        state = iterator.get_state()
+        next(iterator)
+        assert_raises(ValueError, iterator.set_state, state)
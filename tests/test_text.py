@@ -1,12 +1,17 @@
+import os
 import tempfile
 
+import h5py
 import numpy
-from numpy.testing import assert_raises
+from numpy.testing import assert_equal, assert_raises
 from six import BytesIO
 from six.moves import cPickle
 
-from fuel.datasets import TextFile, IterableDataset, IndexableDataset
-from fuel.schemes import SequentialScheme
+from fuel.converters.base import fill_numberized_text
+from fuel.datasets import (TextFile, NumberizedText, IterableDataset,
+                           IndexableDataset)
+from fuel.schemes import (SequentialScheme, ShuffledExampleScheme,
+                          ShuffledScheme)
 from fuel.streams import DataStream
 from fuel.transformers.text import NGrams
 
@@ -40,7 +45,7 @@ def test_text():
     sentence = next(epoch)
     f.seek(0)
     epoch = cPickle.load(f)
-    assert next(epoch) == sentence
+    assert_equal(next(epoch), sentence)
     assert_raises(StopIteration, next, epoch)
 
     # Test character level.
@@ -51,8 +56,176 @@ def test_text():
                          dictionary=dictionary, preprocess=lower,
                          level="character")
     sentence = next(DataStream(text_data).get_epoch_iterator())[0]
-    assert sentence[:3] == [27, 19, 7]
-    assert sentence[-3:] == [2, 4, 28]
+    assert_equal(sentence[:3], [27, 19, 7])
+    assert_equal(sentence[-3:], [2, 4, 28])
+
+
+def numberize_naively(sentence, dictionary, level='word', bos='<S>',
+                      eos='</S>'):
+    tokens = sentence.split() if level == 'word' else sentence.strip()
+    return ([dictionary[bos]] if bos else []) + [
+        dictionary.get(token, dictionary['<UNK>']) for token in tokens] + (
+        [dictionary[eos]] if eos else [])
+
+
+def test_text_blocks():
+    sentences = ["a b c\n", "\n", "  d  a\r\n", "e\u00e9 \u20ac f\n",
+                 "b" * 50 + "\n",
+                 "a\u00a0b\u3000c\x1cd\u2028\u0085\u2009a\n", "c a b"]
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(''.join(sentences).encode('utf-8'))
+    words = {'<UNK>': 0, '<S>': 1, '</S>': 2, 'a': 3, 'b': 4, 'c': 5,
+             '\u20ac': 6}
+    characters = {'<UNK>': 0, '<S>': 1, '</S>': 2, 'a': 3, ' ': 4,
+                  '\u00e9': 5, 'b': 6}
+    try:
+        for block_size in (1, 7, 1000):
+            for level, dictionary in (('word', words),
+                                      ('character', characters)):
+                for bos, eos in (('<S>', '</S>'), (None, '</S>'),
+                                 (None, None)):
+                    text_data = TextFile([f.name, f.name], dictionary,
+                                         bos_token=bos, eos_token=eos,
+                                         level=level, block_size=block_size)
+                    epoch = DataStream(text_data).get_epoch_iterator()
+                    examples = [example for example, in epoch]
+                    assert_equal(examples, 2 * [
+                        numberize_naively(sentence, dictionary, level,
+                                          bos, eos)
+                        for sentence in sentences])
+                    assert all(example.dtype == numpy.int32
+                               for example in examples)
+            # Resuming from a pickled state in the middle of a block
+            text_data = TextFile([f.name, f.name], words,
+                                 block_size=block_size)
+            for i in range(2 * len(sentences)):
+                epoch = DataStream(text_data).get_epoch_iterator()
+                for _ in range(i):
+                    next(epoch)
+                pickled = cPickle.dumps(epoch)
+                remaining = list(epoch)
+                assert_equal(len(remaining), 2 * len(sentences) - i)
+                assert_equal(list(cPickle.loads(pickled)), remaining)
+    finally:
+        os.remove(f.name)
+
+
+def test_text_random_access():
+    sentences = ["a b c\n", "\n", "  d  a\r\n", "e\u00e9 \u20ac f\n",
+                 "c a b"]
+    filenames = []
+    for contents in (sentences, [], sentences[:2], sentences[:1]):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(''.join(contents).encode('utf-8'))
+        filenames.append(f.name)
+    words = {'<UNK>': 0, '<S>': 1, '</S>': 2, 'a': 3, 'b': 4, 'c': 5,
+             '\u20ac': 6}
+    try:
+        for level in ('word', 'character'):
+            text_data = TextFile(filenames, words, level=level)
+            sequential = [example.tolist() for example, in
+                          DataStream(text_data).get_epoch_iterator()]
+            assert_equal(text_data.num_examples, 8)
+            assert_equal(text_data.get_data(request=4)[0], sequential[4])
+            assert_equal(text_data.get_data(request=[7, 4, 5, 0])[0],
+                         [sequential[i] for i in [7, 4, 5, 0]])
+            assert_equal(text_data.get_data(request=slice(3, 6))[0],
+                         sequential[3:6])
+            assert_equal(text_data.get_data(request=[])[0], [])
+
+            scheme = ShuffledScheme(text_data.num_examples, 3,
+                                    rng=numpy.random.RandomState(1))
+            epoch = DataStream(text_data, iteration_scheme=scheme)
+            assert_equal(sorted(example.tolist() for batch, in
+                                epoch.get_epoch_iterator()
+                                for example in batch), sorted(sequential))
+
+            scheme = ShuffledExampleScheme(text_data.num_examples,
+                                           rng=numpy.random.RandomState(1))
+            epoch = DataStream(text_data,
+                               iteration_scheme=scheme).get_epoch_iterator()
+            next(epoch)
+            pickled = cPickle.dumps(epoch)
+            remaining = [example.tolist() for example, in epoch]
+            assert_equal([example.tolist() for example, in
+                          cPickle.loads(pickled)], remaining)
+
+            mapped_files = text_data.mapped_files
+            line_offsets = text_data.line_offsets
+            epoch.data_stream.close()
+            assert all(mapped_file.closed for mapped_file in mapped_files
+                       if not isinstance(mapped_file, bytes))
+            assert_equal(text_data.get_data(request=4)[0], sequential[4])
+            assert text_data.line_offsets is line_offsets
+            text_data.close_files()
+    finally:
+        for filename in filenames:
+            os.remove(filename)
+
+
+def test_numberized_text():
+    sentences = ["a b c\n", "\n", "c d\n", "b" * 5 + " a"]
+    dictionary = {'<UNK>': 0, '<S>': 1, '</S>': 2, 'a': 3, 'b': 4, 'c': 5}
+    with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
+        f.write(''.join(sentences))
+    with tempfile.NamedTemporaryFile(delete=False) as h5_f:
+        pass
+    try:
+        with h5py.File(h5_f.name, mode='w') as h5file:
+            fill_numberized_text(h5file, TextFile([f.name], dictionary,
+                                                  block_size=4),
+                                 chunk_size=3)
+        expected = [numberize_naively(sentence, dictionary)
+                    for sentence in sentences]
+        dataset = NumberizedText(h5_f.name)
+        assert_equal(dataset.num_examples, 4)
+        assert_equal(list(dataset.get_example_stream().get_epoch_iterator()),
+                     [(sentence,) for sentence in expected])
+        assert_equal(dataset.get_data(request=2)[0].dtype, numpy.int32)
+        assert_equal(dataset.get_data(request=[3, 0])[0],
+                     [expected[3], expected[0]])
+        assert_equal(dataset.get_data(request=slice(1, 3))[0], expected[1:3])
+
+        scheme = ShuffledExampleScheme(dataset.num_examples,
+                                       rng=numpy.random.RandomState(1))
+        epoch = DataStream(dataset, iteration_scheme=scheme)
+        assert_equal(sorted(example.tolist() for example, in
+                            epoch.get_epoch_iterator()), sorted(expected))
+        scheme = ShuffledScheme(dataset.num_examples, 3,
+                                rng=numpy.random.RandomState(1))
+        epoch = DataStream(dataset, iteration_scheme=scheme)
+        assert_equal(sorted(example.tolist() for batch, in
+                            epoch.get_epoch_iterator() for example in batch),
+                     sorted(expected))
+
+        dataset = cPickle.loads(cPickle.dumps(dataset))
+        assert_equal(dataset.get_data(request=3)[0], expected[3])
+
+        NumberizedText(h5_f.name, dictionary=dictionary)
+        assert_raises(ValueError, NumberizedText, h5_f.name,
+                      dictionary=dict(dictionary, d=6))
+        assert_raises(ValueError, NumberizedText, h5_f.name,
+                      level='character')
+        assert_raises(ValueError, NumberizedText, h5_f.name, bos_token=None)
+        assert_raises(ValueError, NumberizedText, h5_f.name,
+                      unk_token='</S>')
+
+        with h5py.File(h5_f.name, mode='w') as h5file:
+            fill_numberized_text(h5file, TextFile([f.name], dictionary,
+                                                  bos_token=None,
+                                                  level='character'))
+        NumberizedText(h5_f.name, dictionary=dictionary, bos_token=None,
+                       level='character')
+        assert_raises(ValueError, NumberizedText, h5_f.name,
+                      level='character')
+
+        with h5py.File(h5_f.name, mode='w') as h5file:
+            h5file.create_dataset('tokens', data=numpy.zeros(0, 'int32'))
+            h5file.create_dataset('offsets', data=numpy.zeros(1, 'int64'))
+        assert_raises(ValueError, NumberizedText, h5_f.name)
+    finally:
+        os.remove(f.name)
+        os.remove(h5_f.name)
 
 
 def test_ngram_stream():
@@ -63,6 +236,21 @@ def test_ngram_stream():
     assert len(list(ngrams.get_epoch_iterator())) == 4
 
 
+def test_ngram_stream_resume():
+    sentences = [list(range(10)), list(range(10, 16))]
+
+    def make_stream():
+        return NGrams(2, DataStream(IterableDataset(sentences)))
+    iterator = make_stream().get_epoch_iterator()
+    for _ in range(3):
+        next(iterator)
+    state = cPickle.loads(cPickle.dumps(iterator.get_state()))
+    expected = list(iterator)
+    resumed = make_stream().get_epoch_iterator()
+    resumed.set_state(state)
+    assert_equal(list(resumed), expected)
+
+
 def test_ngram_stream_error_on_multiple_sources():
     # Check that NGram accepts only data streams with one source
     sentences = [list(numpy.random.randint(10, size=sentence_length))
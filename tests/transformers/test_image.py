@@ -1,17 +1,20 @@
+from __future__ import division
 from collections import OrderedDict
 from io import BytesIO
 import numpy
-from numpy.testing import assert_raises
+from numpy.testing import assert_equal, assert_raises
 from PIL import Image
 from picklable_itertools.extras import partition_all
-from six.moves import zip
+from six.moves import zip, cPickle
 from fuel import config
 from fuel.datasets.base import IndexableDataset
 from fuel.schemes import ShuffledScheme, SequentialExampleScheme
 from fuel.streams import DataStream
-from fuel.transformers.image import (ImagesFromBytes,
+from fuel.transformers.image import (ImagesFromBytes, _resize,
                                      MinimumImageDimensions,
-                                     RandomFixedSizeCrop)
+                                     RandomCropFlipNormalize,
+                                     RandomFixedSizeCrop, RandomResizedCrop,
+                                     ResizeImages)
 
 
 def reorder_axes(shp):
@@ -143,6 +146,69 @@ class TestImagesFromBytes(ImageTestingMixin):
         assert_raises(TypeError, stream.transform_source_example, 54321,
                       'source2')
 
+    def test_num_workers(self):
+        serial = ImagesFromBytes(self.batch_stream, color_mode=None)
+        batch = next(self.batch_stream.get_epoch_iterator())
+        parallel = ImagesFromBytes(self.batch_stream, color_mode=None,
+                                   num_workers=3)
+        for source_name, source_batch in zip(('source1', 'source2'), batch):
+            expected = serial.transform_source_batch(source_batch,
+                                                     source_name)
+            actual = parallel.transform_source_batch(source_batch,
+                                                     source_name)
+            assert len(actual) == len(expected)
+            for image, expected_image in zip(actual, expected):
+                assert_equal(image, expected_image)
+        parallel.close()
+        assert '_pool' not in parallel.__dict__
+
+    def test_stack(self):
+        rng = numpy.random.RandomState(config.default_seed)
+        images = rng.randint(0, 256, size=(4, 6, 5, 3)).astype('uint8')
+        encoded = []
+        for image in images:
+            bytes_io = BytesIO()
+            Image.fromarray(image, mode='RGB').save(bytes_io, format='PNG')
+            encoded.append(bytes_io.getvalue())
+        for num_workers in (1, 2):
+            stream = ImagesFromBytes(self.batch_stream, stack=True,
+                                     num_workers=num_workers)
+            batch = stream.transform_source_batch(encoded, 'source1')
+            assert isinstance(batch, numpy.ndarray)
+            assert_equal(batch, images.transpose(0, 3, 1, 2))
+            different_sizes = stream.transform_source_batch(
+                next(self.batch_stream.get_epoch_iterator())[0], 'source1')
+            assert isinstance(different_sizes, list)
+
+    def test_min_size(self):
+        image = numpy.zeros((64, 48, 3), dtype='uint8')
+        image[:32] = 255
+        encoded = {}
+        for image_format in ('JPEG', 'PNG'):
+            bytes_io = BytesIO()
+            Image.fromarray(image).save(bytes_io, format=image_format)
+            encoded[image_format] = bytes_io.getvalue()
+        stream = ImagesFromBytes(self.example_stream, min_size=(16, 16))
+        jpeg = stream.transform_source_example(encoded['JPEG'], 'source1')
+        assert jpeg.shape == (3, 32, 24)
+        assert abs(int(jpeg[0, 8, 8]) - 255) < 5 and jpeg[0, 24, 8] < 5
+        png = stream.transform_source_example(encoded['PNG'], 'source1')
+        assert png.shape == (3, 64, 48)
+        stream = ImagesFromBytes(self.example_stream, min_size=(20, 100),
+                                 color_mode='L')
+        jpeg = stream.transform_source_example(encoded['JPEG'], 'source1')
+        assert jpeg.shape == (1, 64, 48)
+
+    def test_pickling(self):
+        stream = ImagesFromBytes(self.batch_stream, num_workers=2)
+        unpickled = cPickle.loads(cPickle.dumps(stream))
+        expected = list(stream.get_epoch_iterator())
+        for batch, expected_batch in zip(unpickled.get_epoch_iterator(),
+                                         expected):
+            for images, expected_images in zip(batch, expected_batch):
+                for image, expected_image in zip(images, expected_images):
+                    assert_equal(image, expected_image)
+
 
 class TestMinimumDimensions(ImageTestingMixin):
     def setUp(self):
@@ -197,6 +263,19 @@ class TestMinimumDimensions(ImageTestingMixin):
                       MinimumImageDimensions, self.example_stream, (4, 5),
                       resample='notarealresamplingmode')
 
+    def test_colour_images(self):
+        image = numpy.arange(3 * 2 * 3, dtype='uint8').reshape((3, 2, 3))
+        for resample in ('nearest', 'bilinear', 'bicubic'):
+            stream = MinimumImageDimensions(self.example_stream, (4, 5),
+                                            resample=resample,
+                                            which_sources=('source1',))
+            resized = stream.transform_source_example(image, 'source1')
+            assert_equal(resized.shape, (3, 4, 6))
+            assert_equal(resized.dtype, image.dtype)
+            if resample == 'nearest':
+                assert_equal(resized,
+                             image.repeat(2, axis=1).repeat(2, axis=2))
+
 
 class TestFixedSizeRandomCrop(ImageTestingMixin):
     def setUp(self):
@@ -252,6 +331,29 @@ class TestFixedSizeRandomCrop(ImageTestingMixin):
         else:
             assert False
 
+    def test_list_batch_is_stacked(self):
+        stream = RandomFixedSizeCrop(self.batch_stream, (5, 4),
+                                     which_sources=('source2',))
+        images = self.dataset.indexables[1]
+        windows = stream.transform_source_batch(images, 'source2')
+        assert_equal(windows.shape, (len(images), 2, 5, 4))
+        assert_equal(windows.dtype, numpy.uint8)
+        for window, image in zip(windows, images):
+            # The windows of these images start with distinct values
+            i, j = numpy.argwhere(image[0] == window[0, 0, 0])[0]
+            assert_equal(window, image[:, i:i + 5, j:j + 4])
+
+    def test_mixed_list_batch(self):
+        stream = RandomFixedSizeCrop(self.batch_stream, (5, 4),
+                                     which_sources=('source2',))
+        images = [numpy.zeros((2, 5, 6), dtype='uint8'),
+                  numpy.zeros((3, 6, 4), dtype='uint8'),
+                  numpy.zeros((2, 5, 5), dtype='int16')]
+        windows = stream.transform_source_batch(images, 'source2')
+        assert isinstance(windows, list)
+        assert_equal([window.shape for window in windows],
+                     [(2, 5, 4), (3, 5, 4), (2, 5, 4)])
+
     def test_format_exceptions(self):
         estream = RandomFixedSizeCrop(self.example_stream, (5, 4),
                                       which_sources=('source2',))
@@ -276,3 +378,247 @@ class TestFixedSizeRandomCrop(ImageTestingMixin):
 
         assert_raises(ValueError, bstream.transform_source_batch,
                       numpy.empty((5, 3, 4, 2)), 'source1')
+
+
+class TestResizeImages(ImageTestingMixin):
+    def setUp(self):
+        rng = numpy.random.RandomState(config.default_seed)
+        source1 = rng.uniform(size=(5, 2, 8, 6)).astype('float32')
+        source2 = [rng.randint(256, size=(3,) + shape).astype('uint8')
+                   for shape in [(4, 6), (8, 4), (6, 6), (2, 2), (9, 7)]]
+        axis_labels = {'source1': ('batch', 'channel', 'height', 'width'),
+                       'source2': ('batch', 'channel', 'height', 'width')}
+        self.dataset = IndexableDataset(OrderedDict([('source1', source1),
+                                                     ('source2', source2)]),
+                                        axis_labels=axis_labels)
+        self.common_setup()
+
+    def test_ndarray_batch_source(self):
+        stream = ResizeImages(self.batch_stream, (4, 3), resample='area',
+                              which_sources=('source1',))
+        for batch in stream.get_epoch_iterator():
+            assert_equal(batch[0].dtype, numpy.float32)
+            assert_equal(batch[0].shape[1:], (2, 4, 3))
+        images = self.dataset.indexables[0]
+        resized = stream.transform_source_batch(images, 'source1')
+        expected = images.reshape((5, 2, 4, 2, 3, 2)).mean(axis=(3, 5))
+        numpy.testing.assert_allclose(resized, expected, rtol=1e-5)
+
+    def test_list_batch_source(self):
+        stream = ResizeImages(self.batch_stream, scale=0.5,
+                              which_sources=('source2',))
+        for batch in stream.get_epoch_iterator():
+            for image in batch[1]:
+                assert image.shape in [(3, 2, 3), (3, 4, 2), (3, 3, 3),
+                                       (3, 1, 1), (3, 4, 4)]
+                assert_equal(image.dtype, numpy.uint8)
+
+    def test_example_source(self):
+        stream = ResizeImages(self.example_stream, (6, 9),
+                              which_sources=('source2',))
+        for example in stream.get_epoch_iterator():
+            assert_equal(example[1].shape, (3, 6, 9))
+        constant = numpy.full((3, 2, 5), 7, dtype='uint8')
+        assert_equal(stream.transform_source_example(constant, 'source2'),
+                     numpy.full((3, 6, 9), 7, dtype='uint8'))
+
+    def test_bilinear_matches_pil(self):
+        image = self.dataset.indexables[1][1]
+        stream = ResizeImages(self.example_stream, (13, 11),
+                              which_sources=('source2',))
+        resized = stream.transform_source_example(image, 'source2')
+        expected = numpy.array(Image.fromarray(image.transpose(1, 2, 0))
+                               .resize((11, 13), Image.BILINEAR))
+        assert (numpy.abs(resized.transpose(1, 2, 0).astype(int) -
+                          expected) <= 1).all()
+
+    def test_exceptions(self):
+        assert_raises(ValueError, ResizeImages, self.example_stream)
+        assert_raises(ValueError, ResizeImages, self.example_stream, (2, 2),
+                      scale=2)
+        assert_raises(ValueError, ResizeImages, self.example_stream, (2, 2),
+                      resample='bicubic')
+        stream = ResizeImages(self.example_stream, (2, 2),
+                              which_sources=('source2',))
+        assert_raises(ValueError, stream.transform_source_example,
+                      numpy.zeros((3, 4, 4), dtype='int32'), 'source2')
+        assert_raises(ValueError, stream.transform_source_example,
+                      numpy.zeros((4, 4), dtype='uint8'), 'source2')
+
+
+class TestRandomCropFlipNormalize(ImageTestingMixin):
+    def setUp(self):
+        source1 = numpy.zeros((5, 3, 7, 5), dtype='uint8')
+        source1[:] = numpy.arange(3 * 7 * 5, dtype='uint8').reshape(3, 7, 5)
+        source2 = [numpy.arange(2 * shape[0] * shape[1]).reshape(
+            (2,) + shape).astype('float32')
+            for shape in [(5, 9), (6, 8), (5, 6), (5, 5), (6, 4)]]
+        axis_labels = {'source1': ('batch', 'channel', 'height', 'width'),
+                       'source2': ('batch', 'channel', 'height', 'width')}
+        self.dataset = IndexableDataset(OrderedDict([('source1', source1),
+                                                     ('source2', source2)]),
+                                        axis_labels=axis_labels)
+        self.common_setup()
+
+    def windows(self, image, window_shape, flip=True):
+        """All windows of an image, and their horizontal flips."""
+        height, width = window_shape
+        for i in range(image.shape[1] - height + 1):
+            for j in range(image.shape[2] - width + 1):
+                window = image[:, i:i + height, j:j + width]
+                yield window
+                if flip:
+                    yield window[:, :, ::-1]
+
+    def test_ndarray_batch_source(self):
+        mean, std = [1, 2, 3], [2, 4, 8]
+        stream = RandomCropFlipNormalize(self.batch_stream, (5, 4),
+                                         mean=mean, std=std, dtype='float64',
+                                         which_sources=('source1',))
+        image = self.dataset.indexables[0][0]
+        expected = [(window - numpy.array(mean)[:, None, None]) /
+                    numpy.array(std)[:, None, None]
+                    for window in self.windows(image, (5, 4))]
+        seen = set()
+        for _ in range(20):
+            for batch in stream.get_epoch_iterator():
+                assert_equal(batch[0].dtype, numpy.float64)
+                assert_equal(batch[0].shape[1:], (3, 5, 4))
+                for window in batch[0]:
+                    matches = [i for i, candidate in enumerate(expected)
+                               if numpy.allclose(window, candidate)]
+                    assert matches
+                    seen.update(matches)
+        # Every offset and flip is drawn
+        assert_equal(len(seen), len(expected))
+
+    def test_list_batch_source(self):
+        stream = RandomCropFlipNormalize(self.batch_stream, (5, 4),
+                                         flip=False, mean=1, dtype='float32',
+                                         which_sources=('source2',))
+        for batch in stream.get_epoch_iterator():
+            for window in batch[1]:
+                assert_equal(window.dtype, numpy.float32)
+                assert any(numpy.array_equal(window + 1, candidate)
+                           for image in self.dataset.indexables[1]
+                           for candidate in self.windows(image, (5, 4),
+                                                         flip=False))
+
+    def test_example_source(self):
+        stream = RandomCropFlipNormalize(self.example_stream, (5, 4),
+                                         std=2, which_sources=('source2',))
+        for example in stream.get_epoch_iterator():
+            assert_equal(example[1].shape, (2, 5, 4))
+            assert_equal(example[1].dtype, numpy.dtype(config.floatX))
+
+    def test_exceptions(self):
+        assert_raises(ValueError, RandomCropFlipNormalize,
+                      self.example_stream, (5, 4), dtype='uint8')
+        stream = RandomCropFlipNormalize(self.batch_stream, (5, 4),
+                                         which_sources=('source2',))
+        assert_raises(ValueError, stream.transform_source_batch,
+                      [numpy.zeros((2, 4, 4), dtype='float32')], 'source2')
+        assert_raises(ValueError, stream.transform_source_batch,
+                      numpy.zeros((1, 2, 5, 4), dtype='int32'), 'source2')
+        assert_raises(ValueError, stream.transform_source_batch,
+                      [numpy.zeros((5, 4), dtype='float32')], 'source2')
+
+
+class TestRandomResizedCrop(ImageTestingMixin):
+    def setUp(self):
+        rng = numpy.random.RandomState(config.default_seed)
+        source1 = rng.uniform(size=(4, 2, 20, 30))
+        source2 = [rng.randint(256, size=(3,) + shape).astype('uint8')
+                   for shape in [(20, 30), (25, 25), (31, 9), (5, 100)]]
+        axis_labels = {'source1': ('batch', 'channel', 'height', 'width'),
+                       'source2': ('batch', 'channel', 'height', 'width')}
+        self.dataset = IndexableDataset(OrderedDict([('source1', source1),
+                                                     ('source2', source2)]),
+                                        axis_labels=axis_labels)
+        self.common_setup()
+
+    def test_sample_regions(self):
+        stream = RandomResizedCrop(self.batch_stream, (8, 8))
+        image_shapes = numpy.array([[40, 30]] * 1000)
+        regions = stream.sample_regions(image_shapes)
+        tops, lefts, heights, widths = regions.T
+        assert (tops >= 0).all() and (lefts >= 0).all()
+        assert (tops + heights <= 40).all() and (lefts + widths <= 30).all()
+        areas = heights * widths / (40 * 30)
+        assert areas.min() > 0.06 and areas.max() <= 1
+        ratios = widths / heights
+        assert ratios.min() > 0.65 and ratios.max() < 1.45
+
+    def test_empty_batch(self):
+        stream = RandomResizedCrop(self.batch_stream, (6, 7))
+        out = stream.transform_source_batch(
+            numpy.zeros((0, 3, 20, 30), dtype='uint8'), 'source1')
+        assert_equal((out.shape, str(out.dtype)), ((0, 3, 6, 7), 'uint8'))
+        out = stream.transform_source_batch([], 'source2')
+        assert_equal(out.shape, (0, 0, 6, 7))
+
+    def test_fallback_region(self):
+        stream = RandomResizedCrop(self.batch_stream, (8, 8), scale=(1, 1))
+        regions = stream.sample_regions(numpy.array([[5, 100], [100, 5]]))
+        assert_equal(regions, [[0, 46, 5, 7], [46, 0, 7, 5]])
+
+    def test_matches_crop_and_resize(self):
+        for source_name, index in (('source1', 0), ('source2', 1)):
+            stream = RandomResizedCrop(self.batch_stream, (6, 7),
+                                       resample='area',
+                                       which_sources=(source_name,))
+            images = self.dataset.indexables[index]
+            state = stream.rng.get_state()
+            resized = stream.transform_source_batch(images, source_name)
+            assert_equal(resized.shape, (4, images[0].shape[0], 6, 7))
+            assert_equal(resized.dtype, images[0].dtype)
+            stream.rng.set_state(state)
+            regions = stream.sample_regions(
+                numpy.array([image.shape[1:] for image in images]))
+            for image, (top, left, height, width), result in zip(
+                    images, regions, resized):
+                expected = _resize(image[None, :, top:top + height,
+                                         left:left + width],
+                                   (6, 7), 'area')[0]
+                numpy.testing.assert_allclose(result, expected)
+
+    def test_example_source(self):
+        stream = RandomResizedCrop(self.example_stream, (5, 5),
+                                   which_sources=('source2',))
+        for example in stream.get_epoch_iterator():
+            assert_equal(example[1].shape, (3, 5, 5))
+
+    def test_exceptions(self):
+        assert_raises(ValueError, RandomResizedCrop, self.batch_stream,
+                      (5, 5), resample='bicubic')
+        stream = RandomResizedCrop(self.batch_stream, (5, 5),
+                                   which_sources=('source2',))
+        assert_raises(ValueError, stream.transform_source_batch,
+                      [numpy.zeros((3, 5, 5), dtype='int32')], 'source2')
+        assert_raises(ValueError, stream.transform_source_batch,
+                      [numpy.zeros((3, 5, 5), dtype='uint8'),
+                       numpy.zeros((1, 5, 5), dtype='uint8')], 'source2')
+        assert_raises(ValueError, stream.transform_source_batch,
+                      [numpy.zeros((3, 0, 5), dtype='uint8')], 'source2')
+
+
+def test_random_transformers_resume():
+    images = numpy.random.RandomState(1).randint(
+        256, size=(6, 3, 10, 12)).astype('uint8')
+    dataset = IndexableDataset(
+        {'images': images},
+        axis_labels={'images': ('batch', 'channel', 'height', 'width')})
+
+    def batches():
+        return DataStream(dataset, iteration_scheme=ShuffledScheme(
+            6, 2, rng=numpy.random.RandomState(1)))
+    for make_stream in (lambda: RandomFixedSizeCrop(batches(), (5, 5)),
+                        lambda: RandomCropFlipNormalize(batches(), (5, 5)),
+                        lambda: RandomResizedCrop(batches(), (4, 4))):
+        iterator = make_stream().get_epoch_iterator()
+        next(iterator)
+        state = cPickle.loads(cPickle.dumps(iterator.get_state()))
+        expected = list(iterator)
+        resumed = make_stream().get_epoch_iterator()
+        resumed.set_state(state)
+        assert_equal(list(resumed), expected)
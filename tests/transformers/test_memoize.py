@@ -0,0 +1,180 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+import h5py
+import numpy
+from numpy.testing import assert_equal, assert_raises
+from six.moves import xrange
+
+from fuel.datasets import H5PYDataset, IndexableDataset, IterableDataset
+from fuel.schemes import SequentialScheme, ShuffledScheme
+from fuel.streams import DataStream
+from fuel.transformers import Mapping
+from fuel.transformers.memoize import Memoize, pipeline_hash
+
+
+def double(data):
+    return tuple(2 * source_data for source_data in data)
+
+
+class TestMemoize(object):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.features = numpy.arange(30, dtype='float32').reshape((10, 3))
+        self.targets = numpy.arange(10).reshape((10, 1))
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def counting_double(self, data):
+        self.calls += 1
+        return double(data)
+
+    def pipeline(self, batch_size=4, mapping=None):
+        dataset = IndexableDataset(
+            {'features': self.features, 'targets': self.targets})
+        stream = DataStream(dataset, iteration_scheme=SequentialScheme(
+            dataset.num_examples, batch_size))
+        return Mapping(stream, mapping or self.counting_double)
+
+    def test_replays_batches(self):
+        stream = Memoize(self.pipeline(), self.directory)
+        expected = list(stream.get_epoch_iterator())
+        assert_equal(self.calls, 3)
+        assert stream.cached
+        for _ in range(2):
+            assert_equal(list(stream.get_epoch_iterator()), expected)
+        assert_equal(self.calls, 3)
+        assert_equal(expected[0][0], 2 * self.features[:4])
+
+    def test_replays_examples(self):
+        dataset = IterableDataset({'numbers': numpy.arange(5)})
+        stream = Memoize(DataStream(dataset), self.directory)
+        assert_equal(list(stream.get_epoch_iterator()),
+                     [(i,) for i in range(5)])
+        assert_equal(list(stream.get_epoch_iterator()),
+                     [(i,) for i in range(5)])
+
+    def test_iteration_scheme(self):
+        scheme = ShuffledScheme(10, 3, rng=numpy.random.RandomState(1))
+        stream = Memoize(self.pipeline(), self.directory,
+                         iteration_scheme=scheme)
+        epochs = [list(stream.get_epoch_iterator()) for _ in range(2)]
+        assert_equal(self.calls, 3)
+        indices = ShuffledScheme(10, 3, rng=numpy.random.RandomState(1))
+        for epoch in epochs:
+            for request, (features, targets) in zip(
+                    indices.get_request_iterator(), epoch):
+                assert_equal(features, 2 * self.features[request])
+                assert_equal(targets, 2 * self.targets[request])
+        assert_equal(sorted(numpy.concatenate(
+            [targets for _, targets in epochs[0]]).ravel()),
+            2 * numpy.arange(10))
+
+    def test_empty_epoch(self):
+        dataset = IndexableDataset({'numbers': numpy.arange(0)})
+        for iteration_scheme in (None, ShuffledScheme(0, 3)):
+            stream = Memoize(DataStream(dataset, iteration_scheme=(
+                SequentialScheme(0, 3))), self.directory,
+                key=str(iteration_scheme is None),
+                iteration_scheme=iteration_scheme)
+            for _ in range(2):
+                assert_equal(list(stream.get_epoch_iterator()), [])
+                assert stream.cached
+
+    def test_shared_between_instances(self):
+        list(Memoize(self.pipeline(), self.directory).get_epoch_iterator())
+        stream = Memoize(self.pipeline(), self.directory)
+        assert stream.cached
+        list(stream.get_epoch_iterator())
+        assert_equal(self.calls, 3)
+        assert_equal(len(os.listdir(self.directory)), 1)
+
+    def test_pipeline_hash(self):
+        assert_equal(pipeline_hash(self.pipeline()),
+                     pipeline_hash(self.pipeline()))
+        assert (pipeline_hash(self.pipeline()) !=
+                pipeline_hash(self.pipeline(batch_size=5)))
+        assert (pipeline_hash(self.pipeline(mapping=double)) !=
+                pipeline_hash(self.pipeline()))
+        assert (pipeline_hash(self.pipeline(mapping=lambda d: d)) !=
+                pipeline_hash(self.pipeline(mapping=lambda d: d[::-1])))
+        hash_ = pipeline_hash(self.pipeline())
+        self.features[0, 0] = -1
+        assert pipeline_hash(self.pipeline()) != hash_
+
+    def test_pipeline_hash_ranges(self):
+        dataset = IndexableDataset(numpy.arange(20))
+
+        def pipeline(num_examples):
+            return DataStream(dataset, iteration_scheme=SequentialScheme(
+                num_examples, 4))
+        list(Memoize(pipeline(20), self.directory).get_epoch_iterator())
+        stream = Memoize(pipeline(8), self.directory)
+        assert not stream.cached
+        assert_equal(list(stream.get_epoch_iterator()),
+                     [(numpy.arange(4),), (numpy.arange(4, 8),)])
+        assert (pipeline_hash(pipeline(xrange(0, 8))) !=
+                pipeline_hash(pipeline(xrange(0, 16, 2))))
+
+    def test_pipeline_hash_subsets(self):
+        features = numpy.arange(20).reshape((20, 1))
+        with tempfile.NamedTemporaryFile(suffix='.hdf5',
+                                         delete=False) as f:
+            pass
+        try:
+            with h5py.File(f.name, mode='w') as h5file:
+                h5file['features'] = features
+                split_dict = {'train': {'features': (0, 20)}}
+                h5file.attrs['split'] = H5PYDataset.create_split_array(
+                    split_dict)
+
+            def pipeline(subset):
+                dataset = H5PYDataset(f.name, which_sets=('train',),
+                                      subset=subset)
+                return DataStream(dataset, iteration_scheme=(
+                    SequentialScheme(dataset.num_examples, 10)))
+            assert (pipeline_hash(pipeline(slice(0, 10))) !=
+                    pipeline_hash(pipeline(slice(10, 20))))
+            list(Memoize(pipeline(slice(0, 10)),
+                         self.directory).get_epoch_iterator())
+            stream = Memoize(pipeline(slice(10, 20)), self.directory)
+            assert not stream.cached
+            assert_equal(list(stream.get_epoch_iterator()),
+                         [(features[10:],)])
+        finally:
+            os.remove(f.name)
+
+    def test_incomplete_epoch_is_discarded(self):
+        stream = Memoize(self.pipeline(), self.directory)
+        next(stream.get_epoch_iterator())
+        assert_equal(len(list(stream.get_epoch_iterator())), 3)
+        assert stream.cached
+        assert_equal(os.listdir(self.directory), [os.path.basename(
+            stream.path)])
+
+    def test_pickling(self):
+        stream = Memoize(self.pipeline(mapping=double), self.directory)
+        expected = list(stream.get_epoch_iterator())
+        stream = pickle.loads(pickle.dumps(stream))
+        assert_equal(list(stream.get_epoch_iterator()), expected)
+
+    def test_resume(self):
+        stream = Memoize(self.pipeline(mapping=double), self.directory)
+        list(stream.get_epoch_iterator())
+        epoch = stream.get_epoch_iterator()
+        next(epoch)
+        state = epoch.get_state()
+        expected = list(epoch)
+        resumed = stream.get_epoch_iterator()
+        resumed.set_state(state)
+        assert_equal(list(resumed), expected)
+
+    def test_variable_shapes_raise(self):
+        dataset = IterableDataset({'numbers': [[1], [1, 2]]})
+        stream = Memoize(DataStream(dataset), self.directory)
+        assert_raises(ValueError, list, stream.get_epoch_iterator())
+        assert_equal(os.listdir(self.directory), [])
@@ -1,5 +1,7 @@
 import logging
 import operator
+import threading
+import time
 from collections import OrderedDict
 
 import numpy
@@ -8,13 +10,14 @@ from six.moves import zip, cPickle
 
 from fuel import config
 from fuel.datasets import IterableDataset, IndexableDataset
-from fuel.schemes import (ConstantScheme, SequentialScheme,
+from fuel.schemes import (ConstantScheme, SequentialScheme, ShuffledScheme,
                           SequentialExampleScheme)
 from fuel.streams import DataStream
 from fuel.transformers import (
     ExpectsAxisLabels, Transformer, Mapping, SortMapping, ForceFloatX, Filter,
     Cache, Batch, Padding, MultiProcessing, Unpack, Merge,
-    SourcewiseTransformer, Flatten, ScaleAndShift, Cast, Rename, FilterSources)
+    SourcewiseTransformer, Flatten, ScaleAndShift, Cast, Rename, FilterSources,
+    FusedSourcewiseTransformer, fuse)
 
 
 class FlagDataStream(DataStream):
@@ -137,6 +140,36 @@ class TestMapping(object):
         assert_equal(list(transformer.get_epoch_iterator()),
                      data_sorted)
 
+    def test_sort_mapping_batch_key(self):
+        data = OrderedDict([('x', numpy.array(self.data_x)),
+                            ('y', self.data_y)])
+        transformer = Mapping(
+            DataStream(IterableDataset(data)),
+            mapping=SortMapping(batch_key=operator.itemgetter(0)))
+        expected = Mapping(DataStream(IterableDataset(data)),
+                           mapping=SortMapping(operator.itemgetter(0)))
+        for (x, y), (x_, y_) in zip(transformer.get_epoch_iterator(),
+                                    expected.get_epoch_iterator()):
+            assert isinstance(x, numpy.ndarray)
+            assert isinstance(y, list)
+            assert_equal(x, x_)
+            assert_equal(y, y_)
+
+    def test_sort_mapping_batch_key_reverse_is_stable(self):
+        batch = (numpy.array([1, 2, 1, 2]), ['a', 'b', 'c', 'd'])
+        for reverse in (False, True):
+            expected = SortMapping(operator.itemgetter(0),
+                                   reverse=reverse)(batch)
+            output = SortMapping(batch_key=operator.itemgetter(0),
+                                 reverse=reverse)(batch)
+            assert_equal(output[0], expected[0])
+            assert_equal(output[1], expected[1])
+
+    def test_sort_mapping_requires_one_key(self):
+        assert_raises(ValueError, SortMapping)
+        assert_raises(ValueError, SortMapping, operator.itemgetter(0),
+                      batch_key=operator.itemgetter(0))
+
     def test_value_error_on_request(self):
         stream = DataStream(IterableDataset(self.data))
         transformer = Mapping(stream, lambda d: ([2 * i for i in d[0]],))
@@ -231,6 +264,50 @@ class TestScaleAndShift(object):
     def test_axis_labels_are_passed_through(self):
         assert_equal(self.wrapper.axis_labels, self.stream.axis_labels)
 
+    def test_does_not_modify_buffers_not_owned(self):
+        features = numpy.arange(6, dtype='float32').reshape((3, 2))
+        stream = DataStream(IterableDataset({'features': [features]}))
+        output, = next(ScaleAndShift(stream, 2, 1).get_epoch_iterator())
+        assert_equal(output, 2 * numpy.arange(6).reshape((3, 2)) + 1)
+        assert_equal(features, numpy.arange(6).reshape((3, 2)))
+
+    def test_modifies_owned_buffers_in_place(self):
+        features = numpy.arange(6, dtype='float32').reshape((3, 2))
+        stream = DataStream(IterableDataset({'features': [features]}),
+                            owns_buffers=True)
+        output, = next(ScaleAndShift(stream, 2, 1).get_epoch_iterator())
+        assert output is features
+        assert_equal(output, 2 * numpy.arange(6).reshape((3, 2)) + 1)
+
+    def test_owned_buffers_of_other_dtype_are_not_modified(self):
+        features = numpy.arange(6, dtype='uint8')
+        stream = DataStream(IterableDataset({'features': [features]}),
+                            owns_buffers=True)
+        output, = next(ScaleAndShift(stream, 0.5, -1).get_epoch_iterator())
+        assert_equal(output, 0.5 * numpy.arange(6) - 1)
+        assert_equal(features, numpy.arange(6))
+
+    def test_dtype(self):
+        features = numpy.arange(6, dtype='uint8')
+        stream = DataStream(IterableDataset({'features': [features]}))
+        wrapper = ScaleAndShift(stream, 1 / 255., -0.5, dtype='float32')
+        output, = next(wrapper.get_epoch_iterator())
+        assert output.dtype == numpy.float32
+        assert_equal(output, (numpy.arange(6) / 255. - 0.5).astype('float32'))
+
+    def test_dtype_floatx(self):
+        wrapper = ScaleAndShift(self.stream, 2, -1, dtype='floatX')
+        assert all(f.dtype == config.floatX and t.dtype == config.floatX
+                   for f, t in wrapper.get_epoch_iterator())
+
+    def test_owns_buffers(self):
+        assert not self.wrapper.owns_buffers
+        assert ScaleAndShift(self.stream, 2, -1).owns_buffers
+        assert not Cast(self.stream, 'float32').owns_buffers
+        batches = Batch(self.stream, ConstantScheme(2))
+        assert batches.owns_buffers
+        assert Cast(batches, 'float32').owns_buffers
+
 
 class TestCast(object):
     def setUp(self):
@@ -279,6 +356,80 @@ class TestForceFloatX(object):
         assert_equal(transformer.axis_labels, stream.axis_labels)
 
 
+class TestFuse(object):
+    def setUp(self):
+        self.features = numpy.arange(48, dtype='uint8').reshape((4, 3, 2, 2))
+        self.targets = numpy.array([0, 1, 0, 1])
+        dataset = IndexableDataset(
+            OrderedDict([('features', self.features),
+                         ('targets', self.targets)]),
+            axis_labels={'features': ('batch', 'channel', 'height', 'width'),
+                         'targets': ('batch',)})
+        self.stream = DataStream(
+            dataset, iteration_scheme=SequentialScheme(4, 2))
+        self.wrapper = Flatten(
+            ForceFloatX(Cast(ScaleAndShift(
+                self.stream, 0.5, -1, which_sources=('features',)),
+                'float32', which_sources=('features',))),
+            which_sources=('features',))
+
+    def test_fuses_chain(self):
+        fused = fuse(self.wrapper)
+        assert isinstance(fused, FusedSourcewiseTransformer)
+        assert fused.data_stream is self.stream
+        assert ([type(transformer) for transformer in fused.transformers] ==
+                [ScaleAndShift, Cast, ForceFloatX, Flatten])
+
+    def test_fused_data_is_unchanged(self):
+        for expected, actual in zip(self.wrapper.get_epoch_iterator(),
+                                    fuse(self.wrapper).get_epoch_iterator()):
+            assert_equal(actual, expected)
+            assert actual[0].dtype == expected[0].dtype
+
+    def test_fused_does_not_modify_input(self):
+        list(fuse(self.wrapper).get_epoch_iterator())
+        assert_equal(self.features,
+                     numpy.arange(48, dtype='uint8').reshape((4, 3, 2, 2)))
+        stream = DataStream(IndexableDataset(
+            {'features': self.features.astype('float64')}),
+            iteration_scheme=SequentialScheme(4, 2))
+        fused = fuse(ScaleAndShift(ScaleAndShift(stream, 2, 1), 3, 0))
+        assert_equal(next(fused.get_epoch_iterator())[0],
+                     3 * (2 * self.features[:2] + 1))
+        assert_equal(stream.dataset.indexables[0], self.features)
+
+    def test_fused_examples(self):
+        stream = DataStream(
+            IndexableDataset({'features': numpy.arange(3.)}),
+            iteration_scheme=SequentialExampleScheme(3))
+        fused = fuse(ScaleAndShift(Cast(stream, 'float32'), 2, 1))
+        assert isinstance(fused, FusedSourcewiseTransformer)
+        assert fused.produces_examples
+        assert_equal(list(fused.get_epoch_iterator()),
+                     [(numpy.float32(1),), (numpy.float32(3),),
+                      (numpy.float32(5),)])
+
+    def test_axis_labels(self):
+        assert fuse(self.wrapper).axis_labels == self.wrapper.axis_labels
+
+    def test_single_transformer_not_fused(self):
+        wrapper = Cast(self.stream, 'float32')
+        assert fuse(wrapper) is wrapper
+
+    def test_stops_at_non_fusable_transformer(self):
+        wrapper = Cast(Cast(Mapping(
+            ScaleAndShift(self.stream, 2, 0), lambda x: x), 'int64'),
+            'float32')
+        fused = fuse(wrapper)
+        assert isinstance(fused.data_stream, Mapping)
+        assert len(fused.transformers) == 2
+
+    def test_value_error_on_non_fusable(self):
+        mapping = Mapping(self.stream, lambda x: x)
+        assert_raises(ValueError, FusedSourcewiseTransformer,
+                      self.stream, [mapping])
+
+
 class TestFilter(object):
     def test_filter_examples(self):
         data = [1, 2, 3]
@@ -305,6 +456,71 @@ class TestFilter(object):
         wrapper = Filter(stream, lambda d: d[0][0] % 3 == 0)
         assert_equal(wrapper.axis_labels, stream.axis_labels)
 
+    def test_filter_vectorized_batches(self):
+        data = OrderedDict([('features', numpy.arange(10)),
+                            ('targets', list(range(10)))])
+        stream = DataStream(IndexableDataset(data),
+                            iteration_scheme=SequentialScheme(10, 4))
+        wrapper = Filter(stream, lambda d: d[0] % 3 != 0, vectorized=True)
+        batches = list(wrapper.get_epoch_iterator())
+        assert_equal(batches, [([1, 2], [1, 2]), ([4, 5, 7], [4, 5, 7]),
+                               ([8], [8])])
+        assert all(isinstance(f, numpy.ndarray) and isinstance(t, list)
+                   for f, t in batches)
+        assert wrapper.owns_buffers
+
+    def test_filter_vectorized_skips_empty_batches(self):
+        stream = DataStream(IndexableDataset(numpy.arange(6)),
+                            iteration_scheme=SequentialScheme(6, 2))
+        wrapper = Filter(stream, lambda d: d[0] < 1, vectorized=True)
+        assert_equal(list(wrapper.get_epoch_iterator()), [([0],)])
+
+    def test_filter_vectorized_rebatch(self):
+        stream = DataStream(IndexableDataset(numpy.arange(20)),
+                            iteration_scheme=SequentialScheme(20, 4))
+        wrapper = Filter(stream, lambda d: d[0] % 2 == 0, vectorized=True,
+                         batch_size=3)
+        for _ in range(2):
+            assert_equal(list(wrapper.get_epoch_iterator()),
+                         [([0, 2, 4],), ([6, 8, 10],), ([12, 14, 16],),
+                          ([18],)])
+
+    def test_filter_vectorized_rebatch_large_batches(self):
+        stream = DataStream(IndexableDataset(numpy.arange(40)),
+                            iteration_scheme=SequentialScheme(40, 20))
+        wrapper = Filter(stream, lambda d: d[0] % 2 == 0, vectorized=True,
+                         batch_size=3)
+        batches = [batch for batch, in wrapper.get_epoch_iterator()]
+        assert_equal(numpy.concatenate(batches), numpy.arange(0, 40, 2))
+        assert_equal([len(batch) for batch in batches], [3] * 6 + [2])
+        # The first upstream batch is concatenated once and then sliced
+        assert batches[0].base is batches[1].base
+        assert batches[1].base is batches[2].base
+
+    def test_filter_vectorized_examples(self):
+        stream = DataStream(IterableDataset([1, 2, 3]))
+        wrapper = Filter(stream, lambda d: d[0] % 2 == 1, vectorized=True)
+        assert_equal(list(wrapper.get_epoch_iterator()), [(1,), (3,)])
+
+    def test_filter_vectorized_blocks(self):
+        stream = Unpack(Batch(DataStream(IterableDataset(numpy.arange(10))),
+                              ConstantScheme(4)))
+        wrapper = Filter(stream, lambda d: d[0] % 2 == 0, vectorized=True)
+        assert wrapper.produces_blocks
+        assert not Filter(stream, lambda d: d[0] % 2 == 0).produces_blocks
+        assert_equal(list(Batch(wrapper, ConstantScheme(2))
+                          .get_epoch_iterator()),
+                     [([0, 2],), ([4, 6],), ([8],)])
+
+    def test_rebatch_value_errors(self):
+        stream = DataStream(IndexableDataset(numpy.arange(4)),
+                            iteration_scheme=SequentialScheme(4, 2))
+        assert_raises(ValueError, Filter, stream, lambda d: True,
+                      batch_size=2)
+        assert_raises(ValueError, Filter,
+                      DataStream(IterableDataset([1, 2])), lambda d: True,
+                      vectorized=True, batch_size=2)
+
 
 class TestCache(object):
     def setUp(self):
@@ -436,6 +652,60 @@ class TestUnpack(object):
         wrapper = Unpack(self.stream)
         assert_equal(wrapper.axis_labels, {'features': ('index',)})
 
+    def test_get_block(self):
+        wrapper = Unpack(self.stream_np)
+        epoch = wrapper.get_epoch_iterator()
+        assert_equal(next(epoch), (0,))
+        assert_equal(wrapper.get_block(3), (numpy.array([1]),))
+        assert_equal(wrapper.get_block(3), (numpy.array([2, 3]),))
+        assert_equal(next(epoch), (4,))
+
+    def test_rebatch_from_blocks(self):
+        for stream in (self.stream, self.stream_np):
+            for strictness in (0, 1):
+                wrapper = Batch(Unpack(stream), ConstantScheme(3),
+                                strictness=strictness)
+                expected = [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+                if not strictness:
+                    expected.append([9])
+                batches = [batch for batch,
+                           in wrapper.get_epoch_iterator()]
+                assert_equal(batches, expected)
+                assert all(isinstance(batch, numpy.ndarray)
+                           for batch in batches)
+
+    def test_rebatch_from_blocks_strictness_2(self):
+        wrapper = Batch(Unpack(self.stream_np), ConstantScheme(3),
+                        strictness=2)
+        assert_raises(ValueError, list, wrapper.get_epoch_iterator())
+
+    def test_rebatch_copies_blocks(self):
+        wrapper = Batch(Unpack(self.stream_np), ConstantScheme(2))
+        batch, = next(wrapper.get_epoch_iterator())
+        batch[0] = -1
+        assert_equal(next(Unpack(self.stream_np).get_epoch_iterator()),
+                     (0,))
+
+    def test_mapping_block_mapping(self):
+        calls = []
+
+        def block_mapping(block):
+            calls.append(len(block[0]))
+            return (2 * block[0],)
+
+        mapped = Mapping(Unpack(self.stream_np), lambda example: None,
+                         add_sources=('doubled',),
+                         block_mapping=block_mapping)
+        assert mapped.produces_blocks
+        wrapper = Batch(mapped, ConstantScheme(4))
+        assert_equal(list(wrapper.get_epoch_iterator()),
+                     [([0, 1, 2, 3], [0, 2, 4, 6]),
+                      ([4, 5, 6, 7], [8, 10, 12, 14]),
+                      ([8, 9], [16, 18])])
+        assert_equal(calls, [2, 2, 2, 2, 2])
+        assert not Mapping(Unpack(self.stream_np),
+                           lambda example: None).produces_blocks
+
 
 class TestPadding(object):
     def test_1d_sequences(self):
@@ -566,6 +836,99 @@ class TestMerge(object):
         transformer.reset()
         assert all(stream.reset_called for stream in streams)
 
+    def test_parallel_merge(self):
+        streams = [DataStream(IterableDataset(range(10))),
+                   DataStream(IterableDataset(range(10, 20)))]
+        transformer = Merge(streams, ('a', 'b'), parallel=True, prefetch=3)
+        assert_equal(list(transformer.get_epoch_iterator()),
+                     [(i, i + 10) for i in range(10)])
+
+    def test_parallel_merge_is_concurrent(self):
+        class SlowDataStream(DataStream):
+            def get_data(self, request=None):
+                time.sleep(0.1)
+                return super(SlowDataStream, self).get_data(request)
+
+        streams = [SlowDataStream(IterableDataset([i])) for i in range(4)]
+        transformer = Merge(streams, ('a', 'b', 'c', 'd'), parallel=True)
+        start = time.time()
+        assert_equal(next(transformer.get_epoch_iterator()), (0, 1, 2, 3))
+        assert time.time() - start < 0.3
+        transformer.close()
+
+    def test_parallel_merge_batches(self):
+        streams = [
+            DataStream(IndexableDataset(numpy.arange(5)),
+                       iteration_scheme=SequentialScheme(5, 2)),
+            DataStream(IndexableDataset(OrderedDict(
+                [('x', numpy.arange(5)), ('y', -numpy.arange(5))])),
+                iteration_scheme=SequentialScheme(5, 2))]
+        transformer = Merge(streams, ('a', 'b', 'c'), parallel=True)
+        assert_equal(list(transformer.get_epoch_iterator()),
+                     [([0, 1], [0, 1], [0, -1]),
+                      ([2, 3], [2, 3], [-2, -3]),
+                      ([4], [4], [-4])])
+
+    def test_parallel_merge_checks_alignment(self):
+        streams = [DataStream(IterableDataset(range(2))),
+                   DataStream(IterableDataset(range(3)))]
+        transformer = Merge(streams, ('a', 'b'), parallel=True)
+        assert_raises(ValueError, list, transformer.get_epoch_iterator())
+        streams = [
+            DataStream(IndexableDataset(numpy.arange(4)),
+                       iteration_scheme=SequentialScheme(4, 2)),
+            DataStream(IndexableDataset(numpy.arange(4)),
+                       iteration_scheme=SequentialScheme(4, 3))]
+        transformer = Merge(streams, ('a', 'b'), parallel=True)
+        assert_raises(ValueError, next, transformer.get_epoch_iterator())
+
+    def test_parallel_merge_reraises_errors(self):
+        def fail(data):
+            raise KeyError
+
+        streams = [DataStream(IterableDataset(range(2))),
+                   Mapping(DataStream(IterableDataset(range(2))), fail)]
+        transformer = Merge(streams, ('a', 'b'), parallel=True)
+        assert_raises(KeyError, next, transformer.get_epoch_iterator())
+
+    def test_parallel_merge_picklable(self):
+        streams = [DataStream(IterableDataset(range(3))),
+                   DataStream(IterableDataset(range(3)))]
+        transformer = Merge(streams, ('a', 'b'), parallel=True)
+        next(transformer.get_epoch_iterator())
+        cPickle.loads(cPickle.dumps(transformer))
+        transformer.close()
+
+    def test_parallel_merge_stop_timeout(self):
+        release = threading.Event()
+
+        class BlockingDataStream(DataStream):
+            def get_data(self, request=None):
+                data = super(BlockingDataStream, self).get_data(request)
+                if data[0] > 0:
+                    release.wait()
+                return data
+
+        streams = [BlockingDataStream(IterableDataset(range(3)))]
+        transformer = Merge(streams, ('a',), parallel=True,
+                            stop_timeout=0.1)
+        handler = VerifyWarningHandler()
+        logging.getLogger().addHandler(handler)
+        try:
+            assert_equal(next(transformer.get_epoch_iterator()), (0,))
+            start = time.time()
+            transformer.close()
+            assert time.time() - start < 1
+            assert_equal([record.levelno for record in handler.records],
+                         [logging.WARNING])
+        finally:
+            logging.getLogger().removeHandler(handler)
+            release.set()
+
+    def test_prefetch_value_error(self):
+        assert_raises(ValueError, Merge, self.streams, ('english', 'french'),
+                      parallel=True, prefetch=0)
+
 
 class TestMultiprocessing(object):
     def setUp(self):
@@ -685,3 +1048,94 @@ class TestExpectsAxisLabels(object):
     def test_exception(self):
         assert_raises(ValueError, self.obj.verify_axis_labels, ('a', 'b', 'c'),
                       ('b', 'c', 'd'), 'foo')
+
+
+class TestResume(object):
+    def check_resume(self, make_stream, steps):
+        stream = make_stream()
+        iterator = stream.get_epoch_iterator()
+        for _ in range(steps):
+            next(iterator)
+        state = cPickle.loads(cPickle.dumps(iterator.get_state()))
+        expected = list(iterator) + list(stream.get_epoch_iterator())
+        stream = make_stream()
+        iterator = stream.get_epoch_iterator()
+        iterator.set_state(state)
+        assert_equal(list(iterator) + list(stream.get_epoch_iterator()),
+                     expected)
+
+    def batches(self, batch_size=3):
+        return DataStream(IndexableDataset(numpy.arange(20)),
+                          iteration_scheme=ShuffledScheme(
+                              20, batch_size,
+                              rng=numpy.random.RandomState(1)))
+
+    def test_mapping(self):
+        self.check_resume(
+            lambda: Mapping(self.batches(), lambda d: (2 * d[0],)), 2)
+
+    def test_unpack(self):
+        self.check_resume(lambda: Unpack(self.batches()), 4)
+
+    def test_rebatch(self):
+        self.check_resume(
+            lambda: Batch(Unpack(self.batches()), ConstantScheme(2)), 3)
+
+    def test_cache(self):
+        self.check_resume(
+            lambda: Cache(self.batches(7), ConstantScheme(2)), 2)
+
+    def test_filter(self):
+        self.check_resume(
+            lambda: Filter(self.batches(), lambda d: d[0][0] % 2), 2)
+
+    def test_vectorized_filter(self):
+        self.check_resume(
+            lambda: Filter(self.batches(), lambda d: d[0] % 3 != 0,
+                           vectorized=True, batch_size=4), 2)
+        self.check_resume(
+            lambda: Filter(self.batches(10), lambda d: d[0] % 3 != 0,
+                           vectorized=True, batch_size=3), 2)
+
+    def test_merge(self):
+        def make_stream():
+            return Merge([DataStream(IterableDataset(range(5))),
+                          DataStream(IterableDataset(range(5, 10)))],
+                         ('a', 'b'))
+        stream = make_stream()
+        iterator = stream.get_epoch_iterator()
+        next(iterator)
+        state = iterator.get_state()
+        resumed = make_stream().get_epoch_iterator()
+        resumed.set_state(state)
+        assert_equal(next(resumed), next(iterator))
+
+    def test_not_implemented(self):
+        stream = Merge([DataStream(IterableDataset(range(5)))], ('a',),
+                       parallel=True)
+        iterator = stream.get_epoch_iterator()
+        assert_raises(NotImplementedError, iterator.get_state)
+        stream.close()
+
+    def test_state_attributes(self):
+        class Noise(Transformer):
+            state_attributes = ('rng',)
+
+            def __init__(self, data_stream):
+                super(Noise, self).__init__(data_stream,
+                                            produces_examples=False)
+                self.rng = numpy.random.RandomState(1)
+
+            def transform_batch(self, batch):
+                return (batch[0] + self.rng.uniform(size=len(batch[0])),)
+
+        self.check_resume(lambda: Noise(self.batches()), 2)
+
+    def test_unlisted_rng(self):
+        class Noise(Transformer):
+            def __init__(self, data_stream):
+                super(Noise, self).__init__(data_stream)
+                self.rng = numpy.random.RandomState(1)
+
+        iterator = Noise(self.batches()).get_epoch_iterator()
+        assert_raises(NotImplementedError, iterator.get_state)